@@ -1,36 +1,244 @@
 # Импорт необходимых библиотек
 import telebot
-import sqlite3
+from telebot import apihelper
 from config import TOKEN  # Импорт токена бота из отдельного файла config.py
-from telebot import types  # Для создания кнопок и разметки
-from datetime import datetime  # Для работы с датой и временем
+from datetime import datetime, timedelta  # Для работы с датой и временем
+import html
+import logging
+import os
+import tempfile
+import threading
 from config import ADMIN_ID  # ID администратора для специальных команд
+import config  # Необязательные настройки (режим запуска и т.д.)
+import totals  # Накопленные итоги по пользователям
+import shifts  # Активные (незавершенные) смены
+import schema  # Схема базы данных и миграции
+import views  # Тексты сообщений и клавиатуры
+import startup  # Подготовка базы данных при запуске
+import writer  # Запись в базу через один поток с групповым COMMIT
+import cache  # Кэш готовых экранов статистики
+import export  # Выгрузка зарплатной ведомости
+import rollups  # Итоги по дням, неделям и месяцам
+import archive  # Расчетные периоды и архив смен
+import metrics  # Время обработчиков, запросов к Telegram и SQL
+import routes  # Маршруты нажатий кнопок
+import keyboards  # Готовые клавиатуры
+import outbox  # Очередь исходящих сообщений с ограничением скорости
+import rates  # Ставки с датами начала действия
+import shards  # Распределение пользователей по процессам и файлам баз
+import state  # Состояние диалогов (ввод после /dell, подтверждения)
+
+logger = logging.getLogger(__name__)
+
+# Отчет о запуске: время этапов от подключения к базе до готовности бота
+startup_report = startup.Report()
+
+# Режим запуска: "polling" (по умолчанию) или "webhook"
+MODE = getattr(config, "MODE", "polling")
 
 # Создание объекта бота с использованием токена
-bot = telebot.TeleBot(TOKEN)
+# В режиме webhook обработчики запускает собственный пул потоков webhook.py,
+# поэтому встроенный пул потоков telebot не нужен
+bot = telebot.TeleBot(TOKEN, threaded=(MODE != "webhook"))
+
+# Адрес Bot API (например, собственного сервера telegram-bot-api)
+if getattr(config, "API_URL", None):
+    apihelper.API_URL = config.API_URL
+
+# Шард этого процесса: в обычном режиме один процесс и одна база,
+# при запуске через shards.py у каждого процесса свой файл базы
+cluster = shards.Cluster.from_env()
+
+# Путь к файлу базы данных (в многопроцессном режиме - файл шарда этого процесса)
+BASE_DB_PATH = 'ZenithTechTao.db'
+DB_PATH = shards.db_path(BASE_DB_PATH, cluster.shard, cluster.shards)
+
+# Порог медленного SQL-запроса, секунд
+metrics.SLOW_QUERY = getattr(config, "SLOW_QUERY", metrics.SLOW_QUERY)
 
-# Подключение к базе данных SQLite
-# check_same_thread=False позволяет использовать соединение из разных потоков
-dp = sqlite3.connect('ZenithTechTao.db', check_same_thread=False)
-
-# Создание курсора для выполнения SQL-запросов
-cursor = dp.cursor()
-
-# Создание таблицы для хранения данных о рабочих сменах
-# IF NOT EXISTS - создаем таблицу только если она еще не существует
-cursor.execute("""CREATE TABLE IF NOT EXISTS work (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,  
-    user_id INTEGER,                       
-    name TEXT,                            
-    start_time TEXT,                      
-    end_time TEXT,                       
-    hours REAL,                         
-    many REAL,                            
-    workout_date TEXT DEFAULT (DATETIME('now', 'localtime')) 
-)""")
-
-# Сохраняем изменения в базе данных
-dp.commit()
+# Миграции схемы (только новые), загрузка активных смен, ставок и состояния диалогов в память
+# Соединение нужно только для подготовки: дальше пишет поток-писатель, а читают
+# соединения потоков-обработчиков (read_cursor)
+startup_dp = metrics.connect(DB_PATH)
+startup.prepare_database(startup_dp, startup_report)
+startup_dp.close()
+
+# Все изменения базы идут через один поток-писатель (режим WAL):
+# операции, пришедшие за несколько миллисекунд, фиксируются одним COMMIT
+db_writer = writer.Writer(DB_PATH,
+                          batch_window=getattr(config, "WRITER_BATCH_WINDOW", writer.BATCH_WINDOW),
+                          connect=metrics.connect)
+
+# Кэш готовых экранов статистики (сбрасывается при изменении итогов)
+render_cache = cache.RenderCache(getattr(config, "CACHE_SIZE", cache.MAX_SIZE))
+
+# Соединения для чтения: у каждого потока-обработчика свое,
+# потому что один курсор нельзя одновременно использовать из нескольких потоков
+readers = threading.local()
+
+
+def read_cursor():
+    # Курсор для чтения из базы в текущем потоке
+    if not hasattr(readers, "cursor"):
+        readers.cursor = metrics.connect(DB_PATH, check_same_thread=False).cursor()
+    return readers.cursor
+
+
+def connect_read_only(path, **kwargs):
+    # Соединение только для чтения с файлом базы другого шарда (режим WAL допускает
+    # чтение, пока процесс шарда пишет); отсутствующий файл не создается, а дает ошибку
+    return metrics.connect(f"file:{path}?mode=ro", uri=True, **kwargs)
+
+
+def shard_cursors():
+    # Курсоры для чтения баз всех шардов в текущем потоке (в обычном режиме - только своей)
+    if not hasattr(readers, "shards"):
+        readers.shards = [read_cursor() if path == DB_PATH
+                          else connect_read_only(path, check_same_thread=False).cursor()
+                          for path in cluster.db_paths(BASE_DB_PATH)]
+    return readers.shards
+
+
+def user_cursor(user_id):
+    # Курсор для чтения базы шарда, в котором хранится пользователь
+    return shard_cursors()[cluster.shard_of(user_id)]
+
+
+# Ответы пользователям отправляются через очередь с лимитами Telegram:
+# обработчик ставит сообщение в очередь и сразу освобождается
+sender = outbox.Outbox(bot,
+                       workers=getattr(config, "OUTBOX_WORKERS", outbox.WORKERS),
+                       # Общий лимит бота делится между процессами
+                       global_rate=getattr(config, "OUTBOX_GLOBAL_RATE", outbox.GLOBAL_RATE) / cluster.shards,
+                       chat_rate=getattr(config, "OUTBOX_CHAT_RATE", outbox.CHAT_RATE))
+
+
+# Папка с архивами закрытых расчетных периодов (у каждого шарда своя)
+ARCHIVE_DIR = getattr(config, "ARCHIVE_DIR", archive.ARCHIVE_DIR)
+if cluster.shards > 1:
+    ARCHIVE_DIR = os.path.join(ARCHIVE_DIR, f"shard{cluster.shard}")
+
+
+# Удаление пользователя (выполняется в потоке-писателе): его смены текущего периода
+# и все итоги. Смены в архивах закрытых периодов остаются для ведомости /export,
+# но отмечаются удаленными и в итоги больше не попадают (даже при /totals rebuild)
+def remove_user(cursor, user_id):
+    cursor.execute("""DELETE FROM work WHERE user_id = ?""", (user_id,))
+    totals.remove_user(cursor, user_id)
+    rollups.remove_user(cursor, user_id)
+    archive.remove_user(cursor, user_id, int(datetime.now().timestamp()))
+    shifts.forget(user_id)
+
+
+# Пересчет всех итогов (выполняется монопольно в потоке-писателе)
+# Итоги по дням - по всей истории, включая архивы закрытых периодов,
+# итоги пользователей - по текущему периоду (таблица work)
+def rebuild_totals(dp):
+    cursor = dp.cursor()
+    buckets = {}
+    for table in archive.work_tables(dp):
+        rollups.collect(cursor, buckets, table, skip_removed=True)
+
+    cursor.execute("""BEGIN IMMEDIATE""")
+    rollups.store(cursor, buckets)
+    users_count = totals.rebuild(cursor)
+    cursor.execute("""COMMIT""")
+    return users_count
+
+
+# Экран по итогам всех пользователей (из кэша, если итоги не менялись)
+# В многопроцессном режиме итоги меняют и другие шарды, о чем кэш этого процесса
+# не узнает, поэтому такие экраны строятся заново (это одна страница из каждого шарда)
+def global_screen(key, render):
+    if cluster.shards > 1:
+        return render()
+    return render_cache.fetch(key, cache.GLOBAL, render)
+
+
+# Страница общей статистики или списка /dell - объединение страниц всех шардов
+# Личные ставки пользователей других шардов есть только в памяти их процессов,
+# поэтому для них ставки читаются из таблицы rates файла шарда
+def users_page_screen(kind, sort="i", key=None, backward=False):
+    def render():
+        pages = [totals.page(shard_cursor, sort, key, backward) for shard_cursor in shard_cursors()]
+        rows, has_prev, has_next = totals.merge_pages(pages, sort, key, backward)
+        personal_rates = {}
+        if kind == views.GLOBAL_STATS_PAGE:
+            shown = {row[0] for row in rows}
+            for shard, shard_cursor in enumerate(shard_cursors()):
+                if shard != cluster.shard:
+                    personal_rates.update(rates.read_personal(
+                        shard_cursor, [row[0] for row in pages[shard][0] if row[0] in shown]))
+        return views.users_page(kind, sort, rows, has_prev, has_next, personal_rates)
+
+    return global_screen(views.page_callback(kind, sort, key, backward), render)
+
+
+# Статистика за сегодня, неделю или месяц
+# Читаются только итоги по дням всех шардов; экран кэшируется до следующего изменения итогов
+def period_screen(period):
+    first_day, next_day = rollups.period_bounds(period)
+    return global_screen(
+        ("period", period, first_day, next_day),
+        lambda: views.period_stats(period, first_day, rollups.merge_period_stats(
+            [rollups.period_stats(shard_cursor, first_day, next_day) for shard_cursor in shard_cursors()])))
+
+
+# Прогрев кэша при запуске: первые страницы общей статистики (все сортировки)
+# и статистика за день, неделю и месяц - экраны, которые открывают чаще всего.
+# Заодно страницы итогов попадают в кэш SQLite и операционной системы.
+# В многопроцессном режиме экраны не кэшируются (а базы других шардов
+# могут быть еще не готовы), поэтому прогрев только в обычном режиме
+def warm_up():
+    if cluster.shards > 1:
+        return 0
+    for sort in totals.SORTS:
+        users_page_screen(views.GLOBAL_STATS_PAGE, sort)
+    for period in rollups.PERIODS:
+        period_screen(period)
+    return len(totals.SORTS) + len(rollups.PERIODS)
+
+
+# Команды, которые выполняются на шарде, где хранятся данные (вызываются через cluster)
+
+@cluster.command("close_period")
+def close_period_here(closed_ts, period_id):
+    # Закрываем расчетный период period_id в базе этого шарда
+    summary = db_writer.execute_exclusive(archive.close_period, ARCHIVE_DIR, closed_ts, period_id)
+    render_cache.clear()
+    return summary
+
+
+@cluster.command("remove_user")
+def remove_user_here(user_id):
+    # Удаляем пользователя из базы этого шарда
+    db_writer.execute(remove_user, user_id)
+    render_cache.invalidate(cache.user_tag(user_id), cache.GLOBAL)
+
+
+@cluster.command("rebuild_totals")
+def rebuild_totals_here():
+    # Пересчитываем итоги в базе этого шарда; возвращает количество пользователей
+    users_count = db_writer.execute_exclusive(rebuild_totals)
+    render_cache.clear()
+    return users_count
+
+
+@cluster.command("set_rate")
+def set_rate_here(user_id, rate, since_ts):
+    # Меняем ставку в базе этого шарда; количество пересчитанных смен или None без numpy
+    try:
+        changed = db_writer.execute(rates.set_rate, user_id, rate, since_ts)
+    except ImportError:
+        return None
+    render_cache.clear()
+    return changed
+
+
+@cluster.command("rates")
+def rates_here():
+    # Действующие ставки этого шарда
+    return rates.listing()
 
 
 # Обработчик команды /start - запуск бота
@@ -39,46 +247,30 @@ def start(message):
     # Получаем имя пользователя: сначала username, если нет - first_name
     name = message.from_user.username or message.from_user.first_name
 
-    # Создаем инлайн-клавиатуру с кнопками
-    markup = types.InlineKeyboardMarkup()
-    btn_1_start = types.InlineKeyboardButton("Начать работу", callback_data='start')
-    btn_2_end = types.InlineKeyboardButton("Закончить работу", callback_data='end')
-    btn_3_info = types.InlineKeyboardButton("Статистика", callback_data='stats')
-
-    # Располагаем кнопки в рядах
-    markup.row(btn_1_start, btn_2_end)
-    markup.row(btn_3_info)
-
     # Отправляем приветственное сообщение с клавиатурой
-    bot.send_message(message.chat.id,
-                     f"Здравствуйте, <b>{name}</b>.👋 \n\n"
-                     f"Это бот для счета отработанных часов и зарплаты.\n\n"
-                     f"Выберите действие:",
-                     reply_markup=markup,
-                     parse_mode='HTML')  # HTML для жирного текста
+    text, markup = views.start_screen(name)
+    sender.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')  # HTML для жирного текста
 
 
-# Обработчик команды очистки всей базы данных (только для админа)
+# Обработчик команды закрытия расчетного периода (только для админа)
+# Завершенные смены переносятся в архив, открытые остаются в базе
 @bot.message_handler(commands=["sekret"])
 def clear(message):
     # Проверяем, является ли отправитель администратором
     if message.from_user.id != ADMIN_ID:
-        bot.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
         return
 
-    # Создаем клавиатуру с подтверждением удаления
-    markup = types.InlineKeyboardMarkup()
-    btn_yes = types.InlineKeyboardButton('✅ Да, очистить', callback_data='clear_yes')
-    btn_no = types.InlineKeyboardButton('❌ Нет, отмена', callback_data='clear_no')
-    markup.row(btn_yes, btn_no)
-
-    # Запрос подтверждения на удаление всех данных
-    bot.reply_to(message,
-                 "⚠️ <b>Внимание! Вы собираетесь удалить ВСЕ данные из базы.</b>\n\n"
-                 "Это действие нельзя отменить!\n\n"
-                 "Вы уверены?",
-                 reply_markup=markup,
-                 parse_mode='HTML')
+    # Запрос подтверждения на закрытие периода (ожидание подтверждения сохраняется в базе)
+    db_writer.execute(state.put, message.chat.id, state.CLOSE_PERIOD)
+    sender.reply_to(message,
+                    "⚠️ <b>Внимание! Вы собираетесь закрыть расчетный период.</b>\n\n"
+                    "Все завершенные смены будут перенесены в архив, статистика сотрудников "
+                    "начнется с нуля. Незавершенные смены останутся активными.\n"
+                    "Архив доступен через /export и /periods.\n\n"
+                    "Вы уверены?",
+                    reply_markup=keyboards.CLOSE_PERIOD_CONFIRM,
+                    parse_mode='HTML')
 
 
 # Обработчик команды удаления конкретного пользователя (только для админа)
@@ -86,409 +278,590 @@ def clear(message):
 def dell(message):
     # Проверяем права администратора
     if message.from_user.id != ADMIN_ID:
-        bot.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
         return
 
-    # Создаем клавиатуру с кнопкой отмены
-    markup = types.InlineKeyboardMarkup()
-    btn_no = types.InlineKeyboardButton('❌ Отмена', callback_data='dell_no')
-    markup.row(btn_no)
+    # Если пользователей нет - показываем сообщение
+    if not any(totals.has_users(shard_cursor) for shard_cursor in shard_cursors()):
+        sender.reply_to(message, "📊 <b>Общая статистика:</b>\n\nНет данных о пользователях", parse_mode='HTML')
+        return
 
-    # Получаем список всех уникальных пользователей из базы
-    cursor.execute("""SELECT DISTINCT user_id, name FROM work""")
-    all_users = cursor.fetchall()
+    # Отправляем первую страницу списка пользователей (с кнопками листания и отмены) и ждем ввода ID
+    message_info, markup = users_page_screen(views.DELL_PAGE)
+    sender.reply_to(message, message_info, parse_mode='HTML', reply_markup=markup)
 
-    # Если пользователей нет - показываем сообщение
-    if not all_users:
-        bot.reply_to(message, "📊 <b>Общая статистика:</b>\n\nНет данных о пользователях", parse_mode='HTML')
+    # Следующее сообщение администратора - ID для удаления
+    # Ожидание ввода сохраняется в базе и переживает перезапуск бота
+    db_writer.execute(state.put, message.chat.id, state.DELL_INPUT)
+
+
+# Функция обработки введенного ID пользователя для удаления
+# Срабатывает на текст (не команду), если после /dell бот ждет ввода ID в этом чате
+@bot.message_handler(func=lambda message: not (message.text or "").startswith("/")
+                     and state.waiting(message.chat.id, state.DELL_INPUT))
+def process_user_id_for_deletion(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
         return
 
-    # Формируем сообщение со статистикой всех пользователей
-    message_info = "📋 <b>Список пользователей:</b>\n\n"
+    # Ввод ожидается один раз: забираем состояние (если его уже забрали - выходим)
+    found, _ = db_writer.execute(state.take, message.chat.id, state.DELL_INPUT)
+    if not found:
+        return
+
+    # Получаем и очищаем введенный текст (у фото или стикера текста нет)
+    id = (message.text or "").strip()
+
+    # Проверяем, что введено число
+    if not id.isdigit():
+        sender.reply_to(message, "❌ ID должен быть числом!\nПопробуйте снова: /dell")
+        return
+
+    # Преобразуем строку в число
+    user_id = int(id)
+
+    # Проверяем, существует ли пользователь с таким ID в итогах (его шарда) -
+    # там есть и сотрудники, все смены которых уже в архиве закрытых периодов
+    read = user_cursor(user_id)
+    read.execute("""SELECT name FROM user_totals WHERE user_id = ?""", (user_id,))
+    user_exists = read.fetchall()
+
+    if user_exists:
+        # Получаем имя пользователя
+        user_name = user_exists[0][0] if user_exists[0][0] else "Без имени"
+
+        # Запрос подтверждения удаления конкретного пользователя
+        db_writer.execute(state.put, message.chat.id, state.REMOVE_USER, user_id)
+        sender.send_message(message.chat.id,
+                            f"⚠️ <b>Подтвердите удаление:</b>\n\n"
+                            f"👤 Имя: {user_name}\n"
+                            f"🔢 ID: {id}\n\n"
+                            f"Смены текущего периода и вся статистика сотрудника будут удалены. "
+                            f"Архивы закрытых периодов (ведомость /export) не меняются.\n\n"
+                            f"Удалить этого пользователя?",
+                            reply_markup=keyboards.remove_confirm(user_id),
+                            parse_mode='HTML')
+    else:
+        # Если пользователь не найден
+        sender.send_message(message.chat.id,
+                            f"❌ Пользователь с ID {id} не найден.\n"
+                            f"Попробуйте снова: /dell")
 
-    # Для каждого пользователя рассчитываем его статистику
-    for user_id, user_name in all_users:
-        # Получаем все записи конкретного пользователя
-        cursor.execute("""SELECT * FROM work WHERE user_id = ?""", (user_id,))
-        user_records = cursor.fetchall()
 
-        # Инициализируем счетчики для пользователя
-        summa_sessions = 0
-        summa_hors = 0
-        summa_money = 0
+# Обработчик команды сверки накопленных итогов (только для админа)
+# /totals - показать расхождения,
+# /totals rebuild - пересчитать итоги (общие и по дням) из work и архивов периодов
+# Сверка и пересчет выполняются для баз всех шардов
+@bot.message_handler(commands=["totals"])
+def check_totals(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        return
 
-        # Считаем общую статистику по всем сессиям пользователя
-        for record in user_records:
-            if record[5] is not None:  # record[5] - это поле hours
-                summa_sessions += 1
-                summa_hors += round(record[5] or 0, 2)  # или 0 если значение None
-                summa_money += round(record[6] or 0, 2)  # record[6] - это поле many
+    # Если передан аргумент rebuild - пересчитываем итоги заново
+    if message.text.split()[1:2] == ["rebuild"]:
+        users_count = sum(cluster.call_all("rebuild_totals"))
+        sender.reply_to(message, f"✅ <b>Итоги пересчитаны</b> для {users_count} пользователей.", parse_mode='HTML')
+        return
 
-        # Округляем значения для красивого вывода
-        summa_hors = round(summa_hors, 2)
-        summa_money = round(summa_money, 2)
+    # Иначе сверяем итоги с таблицей work
+    drift = [row for shard_cursor in shard_cursors() for row in totals.verify(shard_cursor)]
+    if not drift:
+        sender.reply_to(message, "✅ <b>Итоги совпадают с базой.</b>", parse_mode='HTML')
+        return
 
-        # Форматируем информацию о пользователе
+    message_info = f"⚠️ <b>Найдено расхождений: {len(drift)}</b>\n\n"
+    for user_id, user_name, expected, actual in drift:
+        # Кортежи (сессии, часы, деньги); None - строки нет
         message_info += (
-            f"👤 <b>{user_name}</b>\n"
-            f"   🔢 ID: <code>{user_id}</code>\n"
-            f"   📊 Сессий: {summa_sessions}\n"
-            f"   ⏱️ Часов: {summa_hors:.2f}\n"
-            f"   💰 Заработано: {summa_money:.2f} руб.\n\n"
+            f"👤 <b>{user_name}</b> (<code>{user_id}</code>)\n"
+            f"   Ожидалось: {expected or '—'}\n"
+            f"   В итогах: {actual or '—'}\n\n"
         )
+    message_info += "Для пересчета: /totals rebuild"
+    sender.reply_to(message, message_info, parse_mode='HTML')
 
-    # Добавляем инструкцию для администратора
-    message_info += "\n👇 <b>Введите ID пользователя для удаления:</b>"
 
-    # Отправляем список пользователей и ждем ввода ID
-    msg = bot.reply_to(message, message_info, parse_mode='HTML', reply_markup=markup)
+# Обработчик команды изменения ставки (только для админа)
+# /rate - действующие ставки,
+# /rate 450 [ДД-ММ-ГГГГ] - общая ставка с даты (по умолчанию с сегодняшнего дня),
+# /rate ID 500 [ДД-ММ-ГГГГ] - личная ставка сотрудника с даты.
+# Дата может быть в прошлом: суммы смен, начатых с этой даты, пересчитываются
+@bot.message_handler(commands=["rate"])
+def change_rate(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        return
 
-    # Регистрируем следующий шаг обработки - функцию для обработки введенного ID
-    bot.register_next_step_handler(msg, process_user_id_for_deletion)
+    args = message.text.split()[1:]
+    if not args:
+        # Общая ставка одинакова во всех шардах, личные - у шарда сотрудника
+        listings = cluster.call_all("rates")
+        default_rate = listings[0][0]
+        personal = sorted(item for _, shard_personal in listings for item in shard_personal)
+        message_info = f"💵 <b>Общая ставка:</b> {default_rate:g} руб./час\n"
+        if personal:
+            message_info += "\n<b>Личные ставки:</b>\n"
+            for user_id, rate in personal:
+                message_info += f"   🔢 <code>{user_id}</code>: {rate:g} руб./час\n"
+        message_info += ("\nИзменить: <code>/rate [ID] СТАВКА [ДД-ММ-ГГГГ]</code>")
+        sender.reply_to(message, message_info, parse_mode='HTML')
+        return
 
+    # Разбираем аргументы: дата (если есть) - последним, перед ставкой - ID сотрудника
+    try:
+        if "-" in args[-1]:
+            since = datetime.strptime(args.pop(), "%d-%m-%Y")
+        else:
+            since = datetime.combine(datetime.now().date(), datetime.min.time())
+        if len(args) == 2 and args[0].isdigit():
+            user_id = int(args[0])
+        elif len(args) == 1:
+            user_id = rates.ALL_USERS
+        else:
+            raise ValueError(args)
+        rate = float(args[-1].replace(",", "."))
+        if not 0 <= rate < 1e6:
+            raise ValueError(rate)
+    except ValueError:
+        sender.reply_to(message,
+                        "❌ Формат: <code>/rate [ID] СТАВКА [ДД-ММ-ГГГГ]</code>\n"
+                        "Например: <code>/rate 450 01-09-2026</code> - общая ставка с 1 сентября,\n"
+                        "<code>/rate 123456789 500</code> - личная ставка сотрудника с сегодняшнего дня",
+                        parse_mode='HTML')
+        return
 
-# Функция обработки введенного ID пользователя для удаления
-def process_user_id_for_deletion(message):
+    # Записываем ставку и пересчитываем суммы затронутых смен в потоке-писателе
+    # (общую ставку - во всех шардах, личную - в шарде сотрудника)
+    since_ts = int(since.timestamp())
+    if user_id == rates.ALL_USERS:
+        results = cluster.call_all("set_rate", user_id, rate, since_ts)
+    else:
+        results = [cluster.call_shard(cluster.shard_of(user_id), "set_rate", user_id, rate, since_ts)]
+    if None in results:
+        sender.reply_to(message, "❌ Для пересчета смен установите библиотеку: pip install numpy")
+        return
+    changed = sum(results)
+
+    who = "Общая ставка" if user_id == rates.ALL_USERS else f"Ставка сотрудника <code>{user_id}</code>"
+    sender.reply_to(message,
+                    f"✅ {who}: {rate:g} руб./час с {since:%d.%m.%Y}\n"
+                    f"Пересчитано смен: {changed}",
+                    parse_mode='HTML')
+
+
+# Обработчик команды выгрузки зарплатной ведомости (только для админа)
+# /export 01-09-2026 30-09-2026 [csv|xlsx] - смены и итоги по сотрудникам за период
+@bot.message_handler(commands=["export"])
+def export_payroll(message):
     # Проверяем права администратора
     if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
         return
 
-    # Получаем и очищаем введенный текст
-    id = message.text.strip()
+    # Разбираем период и формат файла
+    args = message.text.split()[1:]
+    file_format = args[2].lower() if len(args) > 2 else "csv"
+    try:
+        date_from = datetime.strptime(args[0], "%d-%m-%Y")
+        date_to = datetime.strptime(args[1], "%d-%m-%Y")
+    except (IndexError, ValueError):
+        date_from = date_to = None
+    if date_from is None or date_to < date_from or file_format not in export.FORMATS:
+        sender.reply_to(message,
+                        "❌ Формат: <code>/export ДД-ММ-ГГГГ ДД-ММ-ГГГГ [csv|xlsx]</code>\n"
+                        "Например: <code>/export 01-09-2026 30-09-2026 xlsx</code>",
+                        parse_mode='HTML')
+        return
 
-    # Проверяем, что введено число
-    if not id.isdigit():
-        bot.reply_to(message, "❌ ID должен быть числом!\nПопробуйте снова: /dell")
+    # Период по времени окончания смены, последний день включительно
+    since = int(date_from.timestamp())
+    until = int((date_to + timedelta(days=1)).timestamp())
+
+    # Отдельные соединения только для чтения (по одному на файл базы каждого шарда):
+    # долгая выгрузка не мешает остальным обработчикам и потокам-писателям (режим WAL)
+    export_dps = [connect_read_only(shard_path) for shard_path in cluster.db_paths(BASE_DB_PATH)]
+    file_descriptor, path = tempfile.mkstemp(suffix="." + file_format)
+    os.close(file_descriptor)
+    try:
+        try:
+            count = export.export(path, export_dps, since, until, file_format)
+        except ImportError:
+            sender.reply_to(message, "❌ Для выгрузки в XLSX установите библиотеку: pip install openpyxl")
+            return
+
+        file_name = f"payroll_{date_from:%Y-%m-%d}_{date_to:%Y-%m-%d}.{file_format}"
+        with open(path, "rb") as document:
+            bot.send_document(message.chat.id, document,
+                              visible_file_name=file_name,
+                              caption=f"📄 Ведомость за {args[0]} — {args[1]}\nСмен: {count}")
+    finally:
+        for export_dp in export_dps:
+            export_dp.close()
+        os.remove(path)
+
+
+# Обработчик команды списка закрытых расчетных периодов (только для админа)
+@bot.message_handler(commands=["periods"])
+def pay_periods(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
         return
 
-    # Преобразуем строку в число
-    user_id = int(id)
+    # Периоды из баз всех шардов (в обычном режиме - только своей)
+    rows = archive.merge_periods([archive.periods(shard_cursor) for shard_cursor in shard_cursors()])
+    if not rows:
+        sender.reply_to(message, "📭 Закрытых расчетных периодов пока нет")
+        return
 
-    # Проверяем, существует ли пользователь с таким ID в базе
-    cursor.execute("""SELECT name FROM work WHERE user_id = ?""", (user_id,))
-    user_exists = cursor.fetchall()
+    message_info = "🗄 <b>Закрытые расчетные периоды:</b>\n\n"
+    for period_id, closed_ts, first_ts, last_ts, shifts_count, users_count, hours, money in rows:
+        first = schema.to_str(first_ts) if first_ts is not None else "—"
+        last = schema.to_str(last_ts) if last_ts is not None else "—"
+        message_info += (f"№{period_id}, закрыт {schema.to_str(closed_ts)}\n"
+                         f"   📅 Смены: {first} — {last}\n"
+                         f"   👥 Сотрудников: {users_count}, смен: {shifts_count}\n"
+                         f"   ⏱️ {hours:.2f} ч., 💰 {money:.2f} руб.\n\n")
+    message_info += "Ведомость за любые даты: /export ДД-ММ-ГГГГ ДД-ММ-ГГГГ"
+    sender.reply_to(message, message_info, parse_mode='HTML')
+
+
+# Обработчик команды статистики записи в базу (только для админа)
+@bot.message_handler(commands=["dbstats"])
+def db_stats(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        return
 
-    if user_exists:
-        # Получаем имя пользователя (первая запись)
-        user_name = user_exists[0][0] if user_exists[0][0] else "Без имени"
+    writer_stats = db_writer.stats()
+    sender.reply_to(message,
+                    f"💾 <b>Запись в базу</b>\n\n"
+                    f"Транзакций: {writer_stats['batches']}\n"
+                    f"Операций: {writer_stats['operations']}\n"
+                    f"Операций в транзакции: {writer_stats['avg_batch_size']:.1f} в среднем, "
+                    f"{writer_stats['max_batch_size']} максимум\n"
+                    f"COMMIT: {writer_stats['avg_commit_ms']:.1f} мс в среднем, "
+                    f"{writer_stats['max_commit_ms']:.1f} мс максимум\n"
+                    f"Ошибок: {writer_stats['errors']}\n"
+                    f"В очереди: {writer_stats['queued']}\n\n"
+                    f"🚀 <b>Запуск</b>\n\n"
+                    f"Версия схемы: {startup.schema_version(read_cursor())}\n"
+                    f"Готов за {html.escape(startup_report.summary())}",
+                    parse_mode='HTML')
+
+
+# Обработчик команды метрик бота (только для админа)
+# Полные гистограммы - на HTTP-адресе METRICS_PORT в формате Prometheus
+@bot.message_handler(commands=["metrics"])
+def show_metrics(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        return
 
-        # Создаем клавиатуру подтверждения удаления
-        markup = types.InlineKeyboardMarkup()
-        btn_yes = types.InlineKeyboardButton('✅ Да, удалить', callback_data=f'remove_yes_{user_id}')
-        btn_no = types.InlineKeyboardButton('❌ Нет, отмена', callback_data='cancel_remove')
-        markup.row(btn_yes, btn_no)
+    def table(histogram, limit=10):
+        # Строки "метка: количество, среднее / p95 / максимум в мс"
+        return "".join(f"<code>{value}</code>: {count}, {avg * 1000:.1f} / {p95 * 1000:.1f} / {maximum * 1000:.1f}\n"
+                       for value, count, avg, p95, maximum in histogram.summary()[:limit]) or "нет данных\n"
+
+    message_info = ("📈 <b>Метрики</b> (количество, мс: среднее / p95 / максимум)\n\n"
+                    "<b>Обработчики:</b>\n" + table(metrics.handler_seconds) +
+                    f"Ошибок: {metrics.handler_errors.total()}\n\n"
+                    "<b>Запросы к Telegram:</b>\n" + table(metrics.api_seconds) +
+                    f"Ошибок: {metrics.api_errors.total()}\n\n"
+                    "<b>SQL:</b>\n" + table(metrics.sql_seconds) +
+                    f"Медленных (дольше {metrics.SLOW_QUERY * 1000:.0f} мс): {metrics.slow_queries.total()}\n")
+    for seconds, sql in list(metrics.slow_log)[-3:]:
+        message_info += f"   {seconds * 1000:.0f} мс: <code>{html.escape(sql[:100])}</code>\n"
+
+    outbox_stats = sender.stats()
+    message_info += (f"\n<b>Очередь отправки:</b>\n"
+                     f"В очереди: {outbox_stats['queued']} (чатов: {outbox_stats['chats']})\n"
+                     f"Отправлено: {outbox_stats['sent']}, ожидание {outbox_stats['avg_wait_ms']:.1f} мс в среднем\n"
+                     f"Заменено изменений: {outbox_stats['coalesced']}\n"
+                     f"Повторов (429 и сеть): {outbox_stats['retries']}, ошибок: {outbox_stats['errors']}\n")
+    sender.reply_to(message, message_info, parse_mode='HTML')
+
+
+# Обработчик команды статистики кэша экранов (только для админа)
+@bot.message_handler(commands=["cachestats"])
+def cache_stats(message):
+    # Проверяем права администратора
+    if message.from_user.id != ADMIN_ID:
+        sender.reply_to(message, "⛔ У вас нет прав для этой команды!")
+        return
 
-        # Запрос подтверждения удаления конкретного пользователя
-        bot.send_message(message.chat.id,
-                         f"⚠️ <b>Подтвердите удаление:</b>\n\n"
-                         f"👤 Имя: {user_name}\n"
-                         f"🔢 ID: {id}\n\n"
-                         f"Удалить этого пользователя?",
-                         reply_markup=markup,
-                         parse_mode='HTML')
+    stats_info = render_cache.stats()
+    sender.reply_to(message,
+                    f"🗂 <b>Кэш экранов статистики</b>\n\n"
+                    f"Экранов: {stats_info['size']} из {stats_info['max_size']}\n"
+                    f"Попаданий: {stats_info['hits']}\n"
+                    f"Промахов: {stats_info['misses']}\n"
+                    f"Вытеснений: {stats_info['evictions']}\n"
+                    f"Сбросов: {stats_info['invalidations']}",
+                    parse_mode='HTML')
+
+
+# Маршруты нажатий кнопок: каждое нажатие обрабатывает своя небольшая функция
+router = routes.Router()
+
+
+def edit_screen(callback, text, markup=None, parse_mode="HTML"):
+    # Заменяем сообщение с нажатой кнопкой новым экраном
+    sender.edit_message_text(text,
+                             chat_id=callback.message.chat.id,
+                             message_id=callback.message.message_id,
+                             parse_mode=parse_mode,
+                             reply_markup=markup)
+
+
+# === НАЧАТЬ РАБОТУ ===
+@router.route("start")
+def on_start(callback):
+    # Получаем данные пользователя
+    user_id = callback.from_user.id
+    name = callback.from_user.username or callback.from_user.first_name
+    # Текущее время в секундах и в формате "день-месяц-год, час:минута"
+    start_ts = int(datetime.now().timestamp())
+    start_time = schema.to_str(start_ts)
+
+    # Если смена уже идет - новую не создаем, а продолжаем текущую (без записи в базу)
+    # Иначе сохраняем начало работы через поток-писатель
+    current = shifts.get(user_id)
+    if current:
+        start_ts, created = current[1], False
     else:
-        # Если пользователь не найден
-        bot.send_message(message.chat.id,
-                         f"❌ Пользователь с ID {id} не найден.\n"
-                         f"Попробуйте снова: /dell")
+        work_id, start_ts, created, new_user = db_writer.execute(shifts.open_shift, user_id, name,
+                                                                 start_ts, start_time)
+        # Новый пользователь появляется в общей статистике
+        if new_user:
+            render_cache.invalidate(cache.GLOBAL)
+
+    # Меняем сообщение на подтверждение начала работы
+    text, markup = views.shift_started(schema.to_str(start_ts), created)
+    edit_screen(callback, text, markup)
+
+
+# === ЗАКОНЧИТЬ РАБОТУ ===
+@router.route("end")
+def on_end(callback):
+    user_id = callback.from_user.id
+    name = callback.from_user.username or callback.from_user.first_name
+    # Запоминаем время окончания работы в секундах
+    end_ts = int(datetime.now().timestamp())
+
+    # Завершаем активную смену из памяти (без поиска по базе) одной записью
+    result = None
+    if shifts.get(user_id):
+        result = db_writer.execute(shifts.finish_shift, user_id, name, end_ts)
+
+    if result:
+        # Итоги пользователя изменились - сбрасываем его статистику и общую
+        render_cache.invalidate(cache.user_tag(user_id), cache.GLOBAL)
+        hours, many = result
+        text, markup = views.shift_ended(schema.to_str(end_ts), name, hours, many)
+    else:
+        # Если нет активной смены
+        text, markup = views.no_active_shift(name)
+
+    # Отправляем результат пользователю
+    sender.send_message(callback.message.chat.id, text, reply_markup=markup, parse_mode="HTML")
+
+
+# === ГЛАВНОЕ МЕНЮ ===
+@router.route("menu")
+def on_menu(callback):
+    # Подробное описание функций бота
+    text, markup = views.main_menu()
+    sender.send_message(callback.message.chat.id, text, reply_markup=markup, parse_mode="HTML")
+
+
+# === МЕНЮ СТАТИСТИКИ ===
+@router.route("stats")
+def on_stats(callback):
+    text, markup = views.stats_menu()
+    edit_screen(callback, text, markup, parse_mode=None)
+
+
+# === МОЯ СТАТИСТИКА ===
+@router.route("me_stats")
+def on_me_stats(callback):
+    user_id = callback.from_user.id
+    name = callback.from_user.username or callback.from_user.first_name
+
+    # Берем накопленные итоги пользователя по первичному ключу (или готовый экран из кэша)
+    rate = rates.current(user_id)
+    text, _ = render_cache.fetch(("me_stats", user_id, name, rate), cache.user_tag(user_id),
+                                 lambda: views.me_stats(name, totals.get(read_cursor(), user_id), rate))
+    edit_screen(callback, text)
+
+
+# === ОБЩАЯ СТАТИСТИКА ===
+@router.route("global_stats")
+def on_global_stats(callback):
+    # Первая страница общей статистики (читается только одна страница пользователей)
+    text, markup = users_page_screen(views.GLOBAL_STATS_PAGE)
+    edit_screen(callback, text, markup)
+
+
+# === СТАТИСТИКА ЗА СЕГОДНЯ / НЕДЕЛЮ / МЕСЯЦ ===
+@router.prefix(views.PERIOD_PREFIX)
+def on_period_stats(callback, period):
+    if period not in views.PERIOD_TITLES:
+        return
+    text, markup = period_screen(period)
+    edit_screen(callback, text, markup)
+
+
+# === ЛИСТАНИЕ И СОРТИРОВКА ОБЩЕЙ СТАТИСТИКИ ===
+@router.prefix(views.GLOBAL_STATS_PAGE + ":")
+def on_global_stats_page(callback, _):
+    kind, sort, key, backward = views.parse_page_callback(callback.data)
+    text, markup = users_page_screen(kind, sort, key, backward)
+    edit_screen(callback, text, markup)
+
+
+# === ЛИСТАНИЕ И СОРТИРОВКА СПИСКА /dell ===
+@router.prefix(views.DELL_PAGE + ":")
+def on_dell_page(callback, _):
+    # Список /dell с ID пользователей доступен только администратору
+    if callback.from_user.id != ADMIN_ID:
+        return
+    kind, sort, key, backward = views.parse_page_callback(callback.data)
+    text, markup = users_page_screen(kind, sort, key, backward)
+    edit_screen(callback, text, markup)
+
+
+# === ПОДТВЕРЖДЕНИЕ ЗАКРЫТИЯ РАСЧЕТНОГО ПЕРИОДА ===
+@router.route("clear_yes")
+def on_close_period(callback):
+    # Только администратор может закрыть период
+    if callback.from_user.id != ADMIN_ID:
+        return
+
+    # Подтверждение действует один раз и только после /sekret (в том числе до перезапуска бота)
+    found, _ = db_writer.execute(state.take, callback.message.chat.id, state.CLOSE_PERIOD)
+    if not found:
+        edit_screen(callback, "⌛ <b>Подтверждение устарело.</b>\nПовторите: /sekret")
+        return
+
+    # Переносим завершенные смены в архив во всех шардах под одним номером периода -
+    # следующим после наибольшего номера во всех базах (открытые смены остаются в памяти и в базе)
+    cursors = shard_cursors()
+    if not sum(archive.finished_shifts(shard_cursor) for shard_cursor in cursors):
+        text = "📭 <b>Нет завершенных смен</b> - закрывать нечего."
+    else:
+        period_id = max(archive.next_period_id(shard_cursor) for shard_cursor in cursors)
+        # Итог (номер периода, смены, сотрудники, часы, деньги, файл) по каждому шарду
+        summaries = cluster.call_all("close_period", int(datetime.now().timestamp()), period_id)
+        archives = ", ".join(f"<code>{summary[5]}</code>" for summary in summaries if summary[1])
+        text = (f"✅ <b>Расчетный период №{period_id} закрыт!</b>\n\n"
+                f"👥 Сотрудников: {sum(summary[2] for summary in summaries)}\n"
+                f"📋 Смен: {sum(summary[1] for summary in summaries)}\n"
+                f"⏱️ Часов: {sum(summary[3] for summary in summaries):.2f}\n"
+                f"💰 К выплате: {sum(summary[4] for summary in summaries):.2f} руб.\n\n"
+                f"🗄 Архив: {archives}")
+    edit_screen(callback, text)
+
+
+# === ОТМЕНА ЗАКРЫТИЯ ПЕРИОДА ===
+@router.route("clear_no")
+def on_close_period_cancel(callback):
+    db_writer.execute(state.take, callback.message.chat.id, state.CLOSE_PERIOD)
+    edit_screen(callback, "❌ <b>Закрытие периода отменено.</b>")
+
+
+# === ОТМЕНА УДАЛЕНИЯ ПОЛЬЗОВАТЕЛЯ (КНОПКА ОТМЕНЫ) ===
+@router.route("dell_no")
+def on_dell_cancel(callback):
+    # Больше не ждем ввода ID
+    db_writer.execute(state.take, callback.message.chat.id, state.DELL_INPUT)
+    edit_screen(callback, "❌ <b>Действие отменено.</b>")
+
+
+# === ПОДТВЕРЖДЕНИЕ УДАЛЕНИЯ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ ===
+@router.prefix("remove_yes_")
+def on_remove_user(callback, param):
+    # ID пользователя из callback_data (формат: remove_yes_123456)
+    if not param.isdigit():
+        return
+    user_id = int(param)
+
+    # Удаляем только пользователя, удаление которого запрашивали через /dell в этом чате
+    found, pending_id = db_writer.execute(state.take, callback.message.chat.id, state.REMOVE_USER)
+    if not found or pending_id != user_id:
+        edit_screen(callback, "⌛ <b>Подтверждение устарело.</b>\nПовторите: /dell")
+        return
+
+    # Удаляем все записи пользователя из базы (в шарде, где он хранится)
+    cluster.call_shard(cluster.shard_of(user_id), "remove_user", user_id)
+
+    # Сообщаем об успешном удалении
+    edit_screen(callback,
+                f"✅ <b>Пользователь удален!</b>\n\n"
+                f"ID: {user_id}\n"
+                f"Смены текущего периода и статистика удалены, "
+                f"архивы закрытых периодов сохранены для /export.")
+
+
+# === ОТМЕНА УДАЛЕНИЯ ПОЛЬЗОВАТЕЛЯ (КОНКРЕТНОГО) ===
+@router.route("cancel_remove")
+def on_remove_cancel(callback):
+    db_writer.execute(state.take, callback.message.chat.id, state.REMOVE_USER)
+    edit_screen(callback, "❌ <b>Удаление отменено.</b>")
 
 
 # Основной обработчик callback-запросов от кнопок
 @bot.callback_query_handler(func=lambda callback: True)
 def btn(callback):
     # Подтверждаем получение callback (убирает часики на кнопке)
-    bot.answer_callback_query(callback.id)
-
-    # === НАЧАТЬ РАБОТУ ===
-    if callback.data == "start":
-        # Получаем данные пользователя
-        user_id = callback.from_user.id
-        name = callback.from_user.username or callback.from_user.first_name
-        # Текущее время в формате "день-месяц-год, час:минута"
-        start_time = datetime.now().strftime("%d-%m-%Y, %H:%M")
-
-        # Сохраняем начало работы в базу данных
-        cursor.execute("""INSERT INTO work (user_id, name, start_time) VALUES (?,?,?) """,
-                       (user_id, name, start_time))
-        dp.commit()
-
-        # Меняем сообщение на подтверждение начала работы
-        markup = types.InlineKeyboardMarkup()
-        btn_2_end = types.InlineKeyboardButton("Закончить работу", callback_data='end')
-        markup.row(btn_2_end)
-
-        bot.edit_message_text(f"✅ <b>Работа начата!</b>\n\n"
-                              f"🕐 {start_time}\n\n"
-                              f"Не забудь нажать 'Закончить' когда закончите!",
-                              chat_id=callback.message.chat.id,
-                              message_id=callback.message.message_id,
-                              parse_mode="HTML",
-                              reply_markup=markup)
-
-    # === ЗАКОНЧИТЬ РАБОТУ ===
-    elif callback.data == "end":
-        user_id = callback.from_user.id
-        name = callback.from_user.username or callback.from_user.first_name
-        # Запоминаем время окончания работы
-        end_time = datetime.now()
-
-        # Ищем последнюю незавершенную смену пользователя
-        cursor.execute("""
-            SELECT id, start_time 
-            FROM work
-            WHERE user_id = ? AND end_time IS NULL
-            ORDER BY id DESC
-            LIMIT 1
-        """, (user_id,))
-        last_work = cursor.fetchone()
-
-        if last_work:
-            # Подготовка меню для возврата
-            markup = types.InlineKeyboardMarkup()
-            btn_menu = types.InlineKeyboardButton('Главное меню', callback_data='menu')
-            markup.row(btn_menu)
-
-            work_id, start_time_str = last_work
-
-            # Преобразуем строку времени в объект datetime для расчетов
-            start_time_obj = datetime.strptime(start_time_str, "%d-%m-%Y, %H:%M")
-
-            # Вычисляем разницу во времени
-            time_difference = end_time - start_time_obj
-
-            # Переводим секунды в часы
-            info_time = time_difference.total_seconds()
-            hours = round(info_time / 3600, 2)  # Округляем до 2 знаков
-
-            # Рассчитываем зарплату: 400 руб/час
-            many = round(hours * 400, 2)
-            end_time_str = end_time.strftime("%d-%m-%Y, %H:%M")
-
-            # Обновляем запись в базе данных
-            cursor.execute("""UPDATE work SET end_time = ?, hours = ?, many = ? WHERE id = ?""",
-                           (end_time_str, hours, many, work_id))
-            dp.commit()
-
-            # Отправляем результат пользователю
-            bot.send_message(callback.message.chat.id,
-                             f"✅ <b>Работа завершена</b> в {end_time_str}!\n\n"
-                             f"👤 Пользователь: <b>{name}</b>\n"
-                             f"⏱️ Отработано: {hours} часов\n"
-                             f"💰 Заработано: {many} руб.",
-                             reply_markup=markup,
-                             parse_mode="HTML")
-        else:
-            # Если нет активной смены
-            bot.send_message(
-                callback.message.chat.id,
-                f"❌ <b>{name}</b>, у вас <b>нет активных смен!</b>\n"
-                "Нажми 'Начать' чтобы начать новую.",
-                parse_mode="HTML"
-            )
-
-    # === ГЛАВНОЕ МЕНЮ ===
-    elif callback.data == "menu":
-        markup = types.InlineKeyboardMarkup()
-        btn1_start = types.InlineKeyboardButton('Начать', callback_data='start')
-        btn2_end = types.InlineKeyboardButton('Закончить', callback_data='end')
-        btn3_stats = types.InlineKeyboardButton('Статистика', callback_data='stats')
-
-        markup.row(btn1_start, btn2_end)
-        markup.row(btn3_stats)
-
-        # Подробное описание функций бота
-        bot.send_message(callback.message.chat.id,
-                         "👷 <b>ГББ: Центр управления работой</b> 👷\n\n"
-                         '"<b>Начать</b>" — Начинает новую рабочую смену.\n'
-                         '"<b>Закончить</b>" — Завершает текущую активную смену.\n'
-                         '"<b>Статистика</b>" — Показывает вашу персональную или общую статистику.\n\n'
-                         'Выберите действия:',
-                         reply_markup=markup,
-                         parse_mode="HTML")
-
-    # === МЕНЮ СТАТИСТИКИ ===
-    elif callback.data == "stats":
-        markup = types.InlineKeyboardMarkup()
-        btn1_me_stats = types.InlineKeyboardButton('Моя статистика', callback_data='me_stats')
-        btn2_global_stats = types.InlineKeyboardButton('Общая статистика', callback_data='global_stats')
-
-        markup.row(btn1_me_stats, btn2_global_stats)
-
-        bot.edit_message_text("Выбери подходящую статистику:",
-                              chat_id=callback.message.chat.id,
-                              message_id=callback.message.message_id,
-                              reply_markup=markup)
-
-    # === МОЯ СТАТИСТИКА ===
-    elif callback.data == "me_stats":
-        user_id = callback.from_user.id
-        name = callback.from_user.username or callback.from_user.first_name
-
-        # Получаем ВСЕ записи пользователя из базы
-        cursor.execute("""SELECT * FROM work WHERE user_id = ?""", (user_id,))
-        all_records = cursor.fetchall()
-
-        # Инициализируем счетчики
-        summa_sessions = 0
-        summa_hors = 0
-        summa_money = 0
-
-        # Считаем статистику вручную
-        for record in all_records:
-            # record[5] = hours, record[6] = many
-            if record[5] is not None:  # Если есть часы - значит сессия завершена
-                summa_sessions += 1
-                summa_hors += round(record[5] or 0, 2)  # or 0 на случай если значение None
-                summa_money += round(record[6] or 0, 2)
-
-        # Округляем итоговые значения
-        summa_hors = round(summa_hors, 2)
-        summa_money = round(summa_money, 2)
-
-        # Формируем сообщение в зависимости от наличия данных
-        if summa_sessions > 0:
-            message_text = (
-                f'Статистика пользователя: <b>{name}</b>\n\n'
-                f'📅 Всего: {summa_hors:.2f} часов\n'
-                f'💰 Заработано: {summa_money:.2f} руб\n\n'
-                f'📋 Всего рабочих сессий: {summa_sessions}\n'
-                f'💵 Ставка: 400 руб./час'
-            )
-        else:
-            message_text = (
-                f'📊 Статистика пользователя: {name}\n\n'
-                f'📅 Всего: 0 часов\n'
-                f'💰 Заработано: 0 руб\n\n'
-                f'📋 Всего рабочих сессий: 0\n'
-                f'💵 Ставка: 400 руб./час'
-            )
-
-        bot.edit_message_text(
-            message_text,
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            parse_mode="HTML"
-        )
+    sender.answer_callback(callback)
 
-    # === ОБЩАЯ СТАТИСТИКА ===
-    elif callback.data == "global_stats":
-        # Получаем уникальных пользователей из базы
-        cursor.execute("""SELECT DISTINCT user_id, name FROM work""")
-        all_users = cursor.fetchall()
+    # Находим обработчик по callback_data (неизвестные кнопки игнорируются)
+    router.dispatch(callback)
 
-        if not all_users:
-            bot.edit_message_text("📊 <b>Общая статистика:</b>\n\nНет данных о пользователях",
-                                  chat_id=callback.message.chat.id,
-                                  message_id=callback.message.message_id)
-            return
 
-        message_info = "📊 <b>Общая статистика:</b>\n\n"
-
-        # Для каждого пользователя считаем статистику отдельно
-        for user_id, user_name in all_users:
-            cursor.execute("""SELECT * FROM work WHERE user_id = ?""", (user_id,))
-            user_records = cursor.fetchall()
-
-            summa_sessions = 0
-            summa_hors = 0
-            summa_money = 0
-
-            for record in user_records:
-                if record[5] is not None:
-                    summa_sessions += 1
-                    summa_hors += round(record[5] or 0, 2)
-                    summa_money += round(record[6] or 0, 2)
-
-            # Округляем значения
-            summa_hors = round(summa_hors, 2)
-            summa_money = round(summa_money, 2)
-
-            # Добавляем статистику пользователя в общее сообщение
-            message_info += (
-                f"👤 <b>{user_name}</b>:\n"
-                f"   📅 Всего: {summa_hors:.2f} ч.\n"
-                f"   💰 Зарплата: {summa_money:.2f} руб.\n"
-                f"   📋 Всего рабочих сессий: {summa_sessions}\n"
-                f"   💵 Ставка: 400 руб./час\n\n"
-            )
-
-        bot.edit_message_text(
-            message_info,
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            parse_mode="HTML"
-        )
+# Замер времени всех обработчиков и запросов к Telegram
+metrics.instrument_bot(bot)
+metrics.instrument_api()
 
-    # === ПОДТВЕРЖДЕНИЕ ОЧИСТКИ ВСЕЙ БАЗЫ ===
-    elif callback.data == "clear_yes":
-        # 1. Удаляем все записи из таблицы
-        cursor.execute("DELETE FROM work")
-        dp.commit()
-
-        # 2. Удаляем саму таблицу
-        cursor.execute("DROP TABLE IF EXISTS work")
-
-        # 3. Создаем таблицу заново
-        cursor.execute("""CREATE TABLE IF NOT EXISTS work (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            name TEXT,
-            start_time TEXT,
-            end_time TEXT,
-            hours REAL,
-            many REAL,
-            workout_date TEXT DEFAULT (DATETIME('now', 'localtime'))
-        )""")
-        dp.commit()
-
-        # Сообщаем об успешной очистке
-        bot.edit_message_text("✅ <b>База данных полностью очищена!</b> Все данные удалены.",
-                              chat_id=callback.message.chat.id,
-                              message_id=callback.message.message_id,
-                              parse_mode="HTML")
-
-    # === ОТМЕНА ОЧИСТКИ БАЗЫ ===
-    elif callback.data == 'clear_no':
-        bot.edit_message_text("❌ <b>Очистка базы данных отменена.</b>",
-                              chat_id=callback.message.chat.id,
-                              message_id=callback.message.message_id,
-                              parse_mode="HTML")
-
-    # === ОТМЕНА УДАЛЕНИЯ ПОЛЬЗОВАТЕЛЯ (КНОПКА ОТМЕНЫ) ===
-    elif callback.data == 'dell_no':
-        bot.edit_message_text("❌ <b>Действие отменено.</b>",
-                              chat_id=callback.message.chat.id,
-                              message_id=callback.message.message_id,
-                              parse_mode="HTML")
-
-    # === ПОДТВЕРЖДЕНИЕ УДАЛЕНИЯ КОНКРЕТНОГО ПОЛЬЗОВАТЕЛЯ ===
-    elif callback.data.startswith('remove_yes_'):
-        # Извлекаем ID пользователя из callback_data (формат: remove_yes_123456)
-        user_id = int(callback.data.split('_')[2])
-
-        # Удаляем все записи пользователя из базы
-        cursor.execute("""DELETE FROM work WHERE user_id = ?""", (user_id,))
-        dp.commit()
-
-        # Сообщаем об успешном удалении
-        bot.edit_message_text(
-            f"✅ <b>Пользователь удален!</b>\n\n"
-            f"ID: {user_id}\n"
-            f"Все данные удалены из базы.",
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            parse_mode="HTML"
-        )
+# Бот готов: время этапов запуска - в метрики (worktime_startup_seconds) и в /dbstats
+startup_report.phase("прогрев кэша", warm_up)
+startup_report.ready()
+for phase_name, phase_seconds in startup_report.phases:
+    metrics.startup_seconds.set(phase_name, phase_seconds)
+metrics.startup_seconds.set("ready", startup_report.ready_seconds)
 
-    # === ОТМЕНА УДАЛЕНИЯ ПОЛЬЗОВАТЕЛЯ (КОНКРЕТНОГО) ===
-    elif callback.data == 'cancel_remove':
-        bot.edit_message_text(
-            "❌ <b>Удаление отменено.</b>",
-            chat_id=callback.message.chat.id,
-            message_id=callback.message.message_id,
-            parse_mode="HTML"
-        )
 
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Бот готов к работе за %s", startup_report.summary())
+
+    # Метрики в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics
+    METRICS_PORT = getattr(config, "METRICS_PORT", None)
+    if METRICS_PORT:
+        metrics.start_server(getattr(config, "METRICS_HOST", "127.0.0.1"), METRICS_PORT)
 
-# Запуск бота в режиме опроса сервера Telegram
-bot.polling()
+    if MODE == "webhook":
+        # Запуск бота в режиме webhook: Telegram сам присылает обновления на наш сервер
+        import webhook
+
+        WEBHOOK_SECRET = getattr(config, "WEBHOOK_SECRET", None)
+        if not WEBHOOK_SECRET:
+            raise SystemExit("Для режима webhook укажите WEBHOOK_SECRET в config.py")
+
+        webhook.run(bot,
+                    host=getattr(config, "WEBHOOK_HOST", "127.0.0.1"),
+                    port=getattr(config, "WEBHOOK_PORT", 8443),
+                    secret=WEBHOOK_SECRET,
+                    url=getattr(config, "WEBHOOK_URL", None),
+                    path=getattr(config, "WEBHOOK_PATH", "/webhook"),
+                    workers=getattr(config, "WEBHOOK_WORKERS", 4),
+                    queue_size=getattr(config, "WEBHOOK_QUEUE_SIZE", 100))
+    else:
+        # Запуск бота в режиме опроса сервера Telegram
+        bot.polling()
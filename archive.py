@@ -0,0 +1,196 @@
+# Модуль расчетных периодов и архива смен
+# Закрытие периода переносит завершенные смены из таблицы work в отдельный файл
+# архива (archive/period_<номер>.db), а в таблицу pay_periods пишет итог периода.
+# Открытые смены остаются в work, поэтому горячая таблица не растет бесконечно.
+# Запросы за прошлые периоды (выгрузка, пересчет итогов по дням) подключают
+# нужные архивы через ATTACH только тогда, когда они действительно нужны
+import os
+
+import schema
+import totals
+
+
+# Папка с файлами архивов по умолчанию
+ARCHIVE_DIR = "archive"
+
+# Итоги закрытых периодов: границы по времени окончания смен и сумма за период
+PERIODS_TABLE_SQL = """CREATE TABLE IF NOT EXISTS pay_periods (
+    id INTEGER PRIMARY KEY,
+    closed_ts INTEGER NOT NULL,
+    first_ts INTEGER,
+    last_ts INTEGER,
+    shifts INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    hours REAL NOT NULL,
+    money REAL NOT NULL,
+    file TEXT NOT NULL
+)"""
+
+# Сотрудники, удаленные через /dell. Их смены в архивах закрытых периодов остаются
+# (это уже выплаченная ведомость для /export), но в статистику больше не попадают,
+# в том числе при пересчете итогов по дням из архивов (/totals rebuild).
+# removed_ts - момент удаления: смены вернувшегося сотрудника после него учитываются
+REMOVED_TABLE_SQL = """CREATE TABLE IF NOT EXISTS removed_users (
+    user_id INTEGER PRIMARY KEY,
+    removed_ts INTEGER NOT NULL
+)"""
+
+# Колонки таблицы смен (одинаковые в work и в архиве)
+COLUMNS = "id, user_id, name, start_time, end_time, hours, many, workout_date, start_ts, end_ts"
+
+# Какие смены переносятся в архив - все, кроме открытых
+FINISHED = "(end_ts IS NOT NULL OR hours IS NOT NULL)"
+
+# Итог периода по таблице смен архива: смены, сотрудники, первая и последняя смена, часы, деньги
+SUMMARY_SQL = """
+    SELECT COUNT(*), COUNT(DISTINCT user_id), MIN(end_ts), MAX(end_ts),
+           ROUND(COALESCE(SUM(ROUND(hours, 2)), 0), 2), ROUND(COALESCE(SUM(ROUND(many, 2)), 0), 2)
+    FROM {table}
+"""
+
+
+def create_table(cursor):
+    # Создаем таблицу итогов закрытых периодов
+    cursor.execute(PERIODS_TABLE_SQL)
+
+
+def create_removed_table(cursor):
+    # Создаем таблицу удаленных сотрудников
+    cursor.execute(REMOVED_TABLE_SQL)
+
+
+def remove_user(cursor, user_id, removed_ts):
+    # Отмечаем сотрудника удаленным: его архивные смены до removed_ts не учитываются в итогах
+    cursor.execute("""
+        INSERT INTO removed_users (user_id, removed_ts) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET removed_ts = excluded.removed_ts
+    """, (user_id, removed_ts))
+
+
+def create_archive_table(cursor, alias):
+    # Таблица смен и индексы по времени в подключенном архиве alias
+    cursor.execute(schema.WORK_TABLE_SQL.replace("EXISTS work", f"EXISTS {alias}.work", 1))
+    for index_sql in schema.TIME_INDEXES_SQL:
+        cursor.execute(index_sql.replace("EXISTS ", f"EXISTS {alias}.", 1))
+
+
+def finished_shifts(cursor):
+    # Количество завершенных смен текущего периода (их перенесет закрытие периода)
+    cursor.execute(f"""SELECT COUNT(*) FROM work WHERE {FINISHED}""")
+    return cursor.fetchone()[0]
+
+
+def next_period_id(cursor):
+    # Номер следующего расчетного периода в этой базе
+    cursor.execute("""SELECT COALESCE(MAX(id), 0) + 1 FROM pay_periods""")
+    return cursor.fetchone()[0]
+
+
+def close_period(dp, archive_dir, closed_ts, period_id=None):
+    # Закрываем расчетный период (выполняется монопольно в потоке-писателе)
+    # 1. Копируем завершенные смены в файл архива и фиксируем его (COMMIT)
+    # 2. Удаляем их из work, пишем итог периода и пересчитываем итоги текущего периода
+    # Если процесс упадет между шагами, повторное закрытие с тем же номером возьмет
+    # тот же файл - уже скопированные смены не задвоятся (INSERT OR IGNORE)
+    # period_id - номер периода, общий для всех шардов (его выбирает тот, кто закрывает
+    # период, по всем базам). С заданным номером итог записывается и без завершенных
+    # смен (нулевой), чтобы у всех шардов были строки всех периодов под одними номерами.
+    # None - следующий номер этой базы
+    # Возвращает (номер периода, смены, сотрудники, часы, деньги, файл) или None,
+    # если номер не задан и завершенных смен нет
+    cursor = dp.cursor()
+    if period_id is None:
+        if not finished_shifts(cursor):
+            return None
+        period_id = next_period_id(cursor)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"period_{period_id}.db")
+
+    # ATTACH и DETACH возможны только вне транзакции
+    cursor.execute("""ATTACH DATABASE ? AS archive""", (path,))
+    try:
+        cursor.execute("""BEGIN IMMEDIATE""")
+        create_archive_table(cursor, "archive")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO archive.work ({COLUMNS})
+            SELECT {COLUMNS} FROM main.work WHERE {FINISHED}
+        """)
+        cursor.execute("""COMMIT""")
+
+        cursor.execute("""BEGIN IMMEDIATE""")
+        cursor.execute(f"""DELETE FROM main.work WHERE {FINISHED} AND id IN (SELECT id FROM archive.work)""")
+        cursor.execute(SUMMARY_SQL.format(table="archive.work"))
+        shifts_count, users_count, first_ts, last_ts, hours, money = cursor.fetchone()
+        cursor.execute("""
+            INSERT INTO pay_periods (id, closed_ts, first_ts, last_ts, shifts, users, hours, money, file)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (period_id, closed_ts, first_ts, last_ts, shifts_count, users_count, hours, money, path))
+
+        # Итоги пользователей теперь считаются только по текущему периоду (строки
+        # сотрудников остаются с нулями), итоги по дням (daily_totals) сохраняются -
+        # неделя и месяц не обнуляются
+        totals.rebuild(cursor)
+        cursor.execute("""COMMIT""")
+    finally:
+        if dp.in_transaction:
+            cursor.execute("""ROLLBACK""")
+        cursor.execute("""DETACH DATABASE archive""")
+    return period_id, shifts_count, users_count, hours, money, path
+
+
+def periods(cursor, limit=10):
+    # Последние закрытые периоды (новые сверху)
+    # Возвращает список (номер, закрыт, первая смена, последняя смена, смены, сотрудники, часы, деньги)
+    cursor.execute("""
+        SELECT id, closed_ts, first_ts, last_ts, shifts, users, hours, money
+        FROM pay_periods
+        ORDER BY id DESC
+        LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+
+def merge_periods(results, limit=10):
+    # Закрытые периоды нескольких шардов (результаты periods()) в одном списке:
+    # период закрывается во всех шардах сразу под одним номером (close_period с period_id),
+    # поэтому строки с одинаковым номером складываются. Возвращает то же, что periods()
+    merged = {}
+    for rows in results:
+        for period_id, closed_ts, first_ts, last_ts, shifts_count, users_count, hours, money in rows:
+            row = merged.get(period_id)
+            if row is None:
+                merged[period_id] = [period_id, closed_ts, first_ts, last_ts, shifts_count, users_count, hours, money]
+                continue
+            row[1] = max(row[1], closed_ts)
+            row[2] = min((value for value in (row[2], first_ts) if value is not None), default=None)
+            row[3] = max((value for value in (row[3], last_ts) if value is not None), default=None)
+            row[4] += shifts_count
+            row[5] += users_count
+            row[6] = round(row[6] + hours, 2)
+            row[7] = round(row[7] + money, 2)
+    return [tuple(merged[period_id]) for period_id in sorted(merged, reverse=True)[:limit]]
+
+
+def work_tables(dp, since=None, until=None):
+    # Генератор таблиц смен за период [since, until) по времени окончания:
+    # сначала архивы подходящих периодов (по порядку), затем текущая таблица work.
+    # Архив подключается перед тем, как отдать его имя, и отключается, когда
+    # запрошена следующая таблица, - одновременно подключен только один архив.
+    # Перед переходом к следующей таблице все строки предыдущей должны быть прочитаны
+    cursor = dp.cursor()
+    cursor.execute("""
+        SELECT id, file FROM pay_periods
+        WHERE (? IS NULL OR last_ts >= ?) AND (? IS NULL OR first_ts < ?)
+        ORDER BY id
+    """, (since, since, until, until))
+    for period_id, path in cursor.fetchall():
+        if not os.path.exists(path):
+            # Файл архива удален или перенесен - пропускаем его
+            continue
+        alias = f"period_{period_id}"
+        cursor.execute(f"""ATTACH DATABASE ? AS {alias}""", (path,))
+        try:
+            yield f"{alias}.work"
+        finally:
+            cursor.execute(f"""DETACH DATABASE {alias}""")
+    yield "main.work"
@@ -0,0 +1,177 @@
+# Асинхронный вариант бота на AsyncTeleBot
+# Сетевые запросы к Telegram выполняются в цикле событий asyncio,
+# чтение из SQLite - в отдельном пуле потоков (db_executor.py), где у каждого
+# потока свое соединение с базой, а изменения - через поток-писатель (writer.py).
+# Перенесены обработчики /start, начала и окончания смены, меню и статистики;
+# административные команды (/sekret, /dell, /totals) работают в Tg_Bot_Work.py
+# Запуск: python async_bot.py
+import asyncio
+import sqlite3
+from datetime import datetime
+
+from telebot.async_telebot import AsyncTeleBot
+
+import config
+from config import TOKEN
+import schema
+import shifts
+import startup
+import totals
+import views
+import writer
+import cache
+import rollups
+import rates
+from db_executor import DBExecutor
+
+
+# Путь к базе данных (та же база, что и у обычного бота)
+DB_PATH = 'ZenithTechTao.db'
+
+# Создание асинхронного объекта бота
+bot = AsyncTeleBot(TOKEN)
+
+# Пул потоков для чтения из базы
+db = DBExecutor(DB_PATH, workers=getattr(config, "DB_WORKERS", 4))
+
+# Поток-писатель для изменений (создается при запуске, после миграций)
+db_writer = None
+
+# Кэш готовых экранов статистики (сбрасывается при изменении итогов)
+render_cache = cache.RenderCache(getattr(config, "CACHE_SIZE", cache.MAX_SIZE))
+
+
+async def cached_screen(key, tag, func, *args, render):
+    # Экран из кэша, а если его нет - чтение func(cursor, *args) из базы и render(результат)
+    value = render_cache.get(key)
+    if value is None:
+        version = render_cache.version(tag)
+        value = render(await db.run(func, *args))
+        render_cache.put(key, value, tag, version)
+    return value
+
+
+async def write(func, *args):
+    # Выполнить изменение через поток-писатель и дождаться COMMIT, не блокируя цикл событий
+    return await asyncio.wrap_future(db_writer.submit(func, *args))
+
+
+# Обработчик команды /start - запуск бота
+@bot.message_handler(commands=["start"])
+async def start(message):
+    # Получаем имя пользователя: сначала username, если нет - first_name
+    name = message.from_user.username or message.from_user.first_name
+
+    text, markup = views.start_screen(name)
+    await bot.send_message(message.chat.id, text, reply_markup=markup, parse_mode='HTML')
+
+
+# Основной обработчик callback-запросов от кнопок
+@bot.callback_query_handler(func=lambda callback: True)
+async def btn(callback):
+    # Подтверждаем получение callback (убирает часики на кнопке)
+    await bot.answer_callback_query(callback.id)
+
+    user_id = callback.from_user.id
+    name = callback.from_user.username or callback.from_user.first_name
+    chat_id = callback.message.chat.id
+    message_id = callback.message.message_id
+
+    # === НАЧАТЬ РАБОТУ ===
+    if callback.data == "start":
+        start_ts = int(datetime.now().timestamp())
+        current = shifts.get(user_id)
+        if current:
+            start_ts, created = current[1], False
+        else:
+            work_id, start_ts, created, new_user = await write(shifts.open_shift, user_id, name,
+                                                               start_ts, schema.to_str(start_ts))
+            # Новый пользователь появляется в общей статистике
+            if new_user:
+                render_cache.invalidate(cache.GLOBAL)
+
+        text, markup = views.shift_started(schema.to_str(start_ts), created)
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                    parse_mode="HTML", reply_markup=markup)
+
+    # === ЗАКОНЧИТЬ РАБОТУ ===
+    elif callback.data == "end":
+        end_ts = int(datetime.now().timestamp())
+        result = None
+        if shifts.get(user_id):
+            result = await write(shifts.finish_shift, user_id, name, end_ts)
+
+        if result:
+            # Итоги пользователя изменились - сбрасываем его статистику и общую
+            render_cache.invalidate(cache.user_tag(user_id), cache.GLOBAL)
+            hours, many = result
+            text, markup = views.shift_ended(schema.to_str(end_ts), name, hours, many)
+        else:
+            text, markup = views.no_active_shift(name)
+        await bot.send_message(chat_id, text, reply_markup=markup, parse_mode="HTML")
+
+    # === ГЛАВНОЕ МЕНЮ ===
+    elif callback.data == "menu":
+        text, markup = views.main_menu()
+        await bot.send_message(chat_id, text, reply_markup=markup, parse_mode="HTML")
+
+    # === МЕНЮ СТАТИСТИКИ ===
+    elif callback.data == "stats":
+        text, markup = views.stats_menu()
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=markup)
+
+    # === МОЯ СТАТИСТИКА ===
+    elif callback.data == "me_stats":
+        rate = rates.current(user_id)
+        text, _ = await cached_screen(("me_stats", user_id, name, rate), cache.user_tag(user_id),
+                                      totals.get, user_id,
+                                      render=lambda user_totals: views.me_stats(name, user_totals, rate))
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, parse_mode="HTML")
+
+    # === ОБЩАЯ СТАТИСТИКА ===
+    elif callback.data == "global_stats":
+        text, markup = await cached_screen(views.page_callback(views.GLOBAL_STATS_PAGE, "i"), cache.GLOBAL,
+                                           totals.page,
+                                           render=lambda page: views.users_page(views.GLOBAL_STATS_PAGE, "i", *page))
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                    parse_mode="HTML", reply_markup=markup)
+
+    # === СТАТИСТИКА ЗА СЕГОДНЯ / НЕДЕЛЮ / МЕСЯЦ ===
+    # Неизвестный период (устаревшая или подделанная кнопка) пропускаем
+    elif (callback.data.startswith(views.PERIOD_PREFIX)
+          and callback.data[len(views.PERIOD_PREFIX):] in views.PERIOD_TITLES):
+        period = callback.data[len(views.PERIOD_PREFIX):]
+        first_day, next_day = rollups.period_bounds(period)
+        text, markup = await cached_screen(("period", period, first_day, next_day), cache.GLOBAL,
+                                           rollups.period_stats, first_day, next_day,
+                                           render=lambda rows: views.period_stats(period, first_day, rows))
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                    parse_mode="HTML", reply_markup=markup)
+
+    # === ЛИСТАНИЕ И СОРТИРОВКА ОБЩЕЙ СТАТИСТИКИ ===
+    elif callback.data.startswith(views.GLOBAL_STATS_PAGE + ":"):
+        kind, sort, key, backward = views.parse_page_callback(callback.data)
+        text, markup = await cached_screen(views.page_callback(kind, sort, key, backward), cache.GLOBAL,
+                                           totals.page, sort, key, backward,
+                                           render=lambda page: views.users_page(kind, sort, *page))
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                    parse_mode="HTML", reply_markup=markup)
+
+
+async def main():
+    try:
+        await bot.polling()
+    finally:
+        await bot.close_session()
+        db.close()
+        db_writer.close()
+
+
+if __name__ == "__main__":
+    # Миграции и загрузка активных смен - один раз, до запуска цикла событий
+    setup_dp = sqlite3.connect(DB_PATH)
+    startup.prepare_database(setup_dp)
+    setup_dp.close()
+
+    db_writer = writer.Writer(DB_PATH, batch_window=getattr(config, "WRITER_BATCH_WINDOW", writer.BATCH_WINDOW))
+    asyncio.run(main())
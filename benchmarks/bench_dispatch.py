@@ -0,0 +1,107 @@
+# Микро-бенчмарк разбора нажатий кнопок: накладные расходы на одно нажатие
+# "цепочка" - прежний btn(): if/elif по callback_data и сборка клавиатуры с переводом
+# в JSON на каждое нажатие; "маршруты" - routes.Router и готовые клавиатуры из keyboards.py.
+# Обращения к базе и Telegram не измеряются - только выбор обработчика и клавиатура
+# Запуск: python benchmarks/bench_dispatch.py [кол-во нажатий]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import types  # noqa: E402
+
+import keyboards  # noqa: E402
+import routes  # noqa: E402
+
+
+# Смесь нажатий: в основном смены и статистика, иногда листание и команды администратора
+CALLBACKS = ["start", "end", "stats", "me_stats", "global_stats", "menu", "period_week",
+             "gs:h:n:12.5:123", "remove_yes_123456", "cancel_remove", "clear_no", "start", "end", "stats"]
+
+
+def markup(*rows):
+    # Клавиатура, как ее собирал прежний код, с сериализацией (как telebot при отправке)
+    keyboard = types.InlineKeyboardMarkup()
+    for row in rows:
+        keyboard.row(*[types.InlineKeyboardButton(title, callback_data=data) for title, data in row])
+    return keyboard.to_json()
+
+
+def chain(data):
+    # Прежний btn(): проверки по порядку, клавиатура собирается заново
+    if data == "start":
+        return markup([("Закончить работу", "end")])
+    elif data == "end":
+        return markup([("Главное меню", "menu")])
+    elif data == "menu":
+        return markup([("Начать", "start"), ("Закончить", "end")], [("Статистика", "stats")])
+    elif data == "stats":
+        return markup([("Моя статистика", "me_stats"), ("Общая статистика", "global_stats")],
+                      [(title, keyboards.PERIOD_PREFIX + period) for period, title in keyboards.PERIOD_TITLES.items()])
+    elif data == "me_stats":
+        return None
+    elif data == "global_stats":
+        return None
+    elif data.startswith("period_"):
+        return markup([("⬅️ К статистике", "stats")])
+    elif data.startswith(("gs:", "dl:")):
+        return None
+    elif data == "clear_yes":
+        return None
+    elif data == "clear_no":
+        return None
+    elif data == "dell_no":
+        return None
+    elif data.startswith("remove_yes_"):
+        return int(data.split("_")[2])
+    elif data == "cancel_remove":
+        return None
+
+
+def make_router():
+    # Те же маршруты через Router; обработчики возвращают готовые клавиатуры
+    router = routes.Router()
+    router.route("start")(lambda callback: keyboards.END_ONLY)
+    router.route("end")(lambda callback: keyboards.MENU_ONLY)
+    router.route("menu")(lambda callback: keyboards.MAIN_MENU)
+    router.route("stats")(lambda callback: keyboards.STATS_MENU)
+    for data in ("me_stats", "global_stats", "clear_yes", "clear_no", "dell_no", "cancel_remove"):
+        router.route(data)(lambda callback: None)
+    router.prefix(keyboards.PERIOD_PREFIX)(lambda callback, period: keyboards.BACK_TO_STATS)
+    router.prefix("gs:")(lambda callback, param: None)
+    router.prefix("dl:")(lambda callback, param: None)
+    router.prefix("remove_yes_")(lambda callback, param: int(param))
+    return router
+
+
+def measure(func, presses):
+    # Среднее время одного нажатия, в микросекундах
+    started = time.perf_counter()
+    for index in range(presses):
+        func(CALLBACKS[index % len(CALLBACKS)])
+    return (time.perf_counter() - started) / presses * 1e6
+
+
+def main():
+    presses = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    router = make_router()
+
+    def dispatch(data):
+        handler, param = router.resolve(data)
+        return handler(None) if param is None else handler(None, param)
+
+    # Проверяем, что оба способа выбирают одинаковые клавиатуры
+    for data in CALLBACKS:
+        assert chain(data) == dispatch(data), data
+
+    before = measure(chain, presses)
+    after = measure(dispatch, presses)
+    print(f"Нажатий: {presses}")
+    print(f"цепочка if/elif + сборка клавиатур: {before:.2f} мкс на нажатие")
+    print(f"маршруты + готовые клавиатуры:      {after:.2f} мкс на нажатие")
+    print(f"Ускорение: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Бенчмарк выгрузки ведомости: строк в секунду и пиковая память (RSS)
+# Каждая выгрузка выполняется в отдельном процессе, чтобы память мерилась честно
+# Запуск: python benchmarks/bench_export.py [кол-во смен]
+import csv
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import archive  # noqa: E402
+import export  # noqa: E402
+import schema  # noqa: E402
+
+
+def make_db(path, rows, users=300):
+    # Создаем файл базы со случайными завершенными сменами за год
+    dp = sqlite3.connect(path)
+    cursor = dp.cursor()
+    schema.create_work_table(cursor)
+    archive.create_table(cursor)
+    year_start = 1767225600  # 01-01-2026
+    data = []
+    for work_id in range(1, rows + 1):
+        user_id = random.randint(1, users)
+        start_ts = year_start + random.randint(0, 365 * 86400)
+        seconds = random.randint(3600, 12 * 3600)
+        hours = round(seconds / 3600, 2)
+        data.append((work_id, user_id, f"user{user_id}", start_ts, start_ts + seconds, hours,
+                     round(seconds / 3600 * 400, 2)))
+        if len(data) == 100_000:
+            cursor.executemany("""INSERT INTO work (id, user_id, name, start_ts, end_ts, hours, many)
+                                  VALUES (?,?,?,?,?,?,?)""", data)
+            data = []
+    cursor.executemany("""INSERT INTO work (id, user_id, name, start_ts, end_ts, hours, many)
+                          VALUES (?,?,?,?,?,?,?)""", data)
+    dp.commit()
+    dp.close()
+
+
+def naive_csv(path, cursor, since, until):
+    # Для сравнения: все строки сразу загружаются в память через fetchall()
+    cursor.execute("""SELECT id, user_id, name, start_ts, end_ts, hours, many FROM work
+                      WHERE end_ts >= ? AND end_ts < ? ORDER BY end_ts""", (since, until))
+    rows = cursor.fetchall()
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(export.SHIFT_HEADER)
+        for work_id, user_id, name, start_ts, end_ts, hours, many in rows:
+            writer.writerow([work_id, user_id, name, schema.to_str(start_ts), schema.to_str(end_ts), hours, many])
+    return len(rows)
+
+
+def child(db_path, mode):
+    # Выполняется в отдельном процессе: одна выгрузка, вывод "строк секунд пиковый_RSS_КБ"
+    dp = sqlite3.connect(db_path)
+    file_descriptor, out_path = tempfile.mkstemp()
+    os.close(file_descriptor)
+    started = time.perf_counter()
+    if mode == "naive":
+        count = naive_csv(out_path, dp.cursor(), 0, 2 ** 40)
+    else:
+        count = export.export(out_path, [dp], 0, 2 ** 40, mode)
+    elapsed = time.perf_counter() - started
+    os.remove(out_path)
+    print(count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"Создаем базу на {rows} смен...")
+        make_db(db_path, rows)
+
+        print(f"{'режим':>8} {'строк':>10} {'сек':>8} {'строк/сек':>11} {'пик RSS, МБ':>12}")
+        for mode in ("naive", "csv", "xlsx"):
+            output = subprocess.run([sys.executable, __file__, "--child", db_path, mode],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            count, elapsed, max_rss = int(output[0]), float(output[1]), int(output[2])
+            print(f"{mode:>8} {count:>10} {elapsed:>8.1f} {count / elapsed:>11.0f} {max_rss / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,219 @@
+# Нагрузочный тест бота: тысячи синтетических пользователей нажимают кнопки
+# Настоящий бот (Tg_Bot_Work.py) опрашивает локальную замену Bot API (fake_bot_api.py),
+# интернет не нужен. Каждый пользователь ждет ответа на нажатие, прежде чем нажать
+# следующую кнопку. Отчет: задержка обработчиков (p50/p95/p99) по кнопкам,
+# пропускная способность и рост файла базы.
+# Для проверки регрессий: --max-p95 МС завершает тест с кодом 1, если p95 больше порога,
+# --json ФАЙЛ сохраняет результаты для сравнения между запусками
+# Запуск: python benchmarks/bench_load.py [--users 1000] [--rounds 2]
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+
+# Один круг пользователя: начать смену, посмотреть статистику, закончить смену
+ROUND = ("start", "stats", "me_stats", "global_stats", "end")
+
+# ID синтетических пользователей начинаются отсюда (ADMIN_ID в тесте - 1)
+FIRST_USER_ID = 1000
+
+
+def make_update(user_id, action):
+    # Обновление Telegram: команда /start или нажатие кнопки с callback_data=action
+    user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    if action == "/start":
+        return {"message": {"message_id": 1, "date": int(time.time()), "from": user, "chat": chat,
+                            "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}]}}
+    return {"callback_query": {"id": f"{user_id}-{time.monotonic_ns()}", "from": user,
+                               "chat_instance": str(user_id), "data": action,
+                               "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": ""}}}
+
+
+def update_user_id(update):
+    # ID пользователя, от которого пришло обновление
+    if "message" in update:
+        return update["message"]["from"]["id"]
+    return update["callback_query"]["from"]["id"]
+
+
+def percentile(values, percent):
+    # Перцентиль по отсортированному списку (метод ближайшего ранга)
+    if not values:
+        return 0.0
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def db_size(path):
+    # Размеры основного файла базы и журнала WAL в байтах
+    # Сначала переносим журнал в базу (checkpoint): соединения бота еще открыты, поэтому
+    # сам журнал не очищается, и без этого в размер попали бы неперенесенные страницы
+    dp = sqlite3.connect(path)
+    dp.execute("""PRAGMA wal_checkpoint(TRUNCATE)""")
+    dp.close()
+    wal_path = path + "-wal"
+    return os.path.getsize(path), os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+
+class LoadTest:
+    def __init__(self, api, users, rounds):
+        self.api = api
+        self.script = ["/start"] + list(ROUND) * rounds
+        self.lock = threading.Lock()
+        self.steps = {user_id: 0 for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users)}
+        # Когда обновление пользователя было передано боту (getUpdates)
+        self.delivered = {}
+        # Задержки по действиям, в секундах
+        self.latencies = {action: [] for action in self.script}
+        self.unexpected = 0
+        self.remaining = users
+        self.done = threading.Event()
+
+    def begin(self):
+        # Первое действие всех пользователей
+        for user_id in self.steps:
+            self.api.push(make_update(user_id, self.script[0]))
+
+    def on_deliver(self, updates):
+        now = time.perf_counter()
+        with self.lock:
+            for update in updates:
+                self.delivered.setdefault(update_user_id(update), now)
+
+    def on_reply(self, chat_id, method):
+        # Ответ бота пользователю: записываем задержку и отправляем следующее нажатие
+        now = time.perf_counter()
+        with self.lock:
+            started = self.delivered.pop(chat_id, None)
+            if started is None:
+                self.unexpected += 1
+                return
+            step = self.steps[chat_id]
+            self.latencies[self.script[step]].append(now - started)
+            step += 1
+            self.steps[chat_id] = step
+            if step == len(self.script):
+                self.remaining -= 1
+                if not self.remaining:
+                    self.done.set()
+                return
+        self.api.push(make_update(chat_id, self.script[step]))
+
+
+def summary(latencies):
+    # (количество, p50, p95, p99) в миллисекундах
+    values = sorted(latencies)
+    return (len(values),
+            percentile(values, 50) * 1000, percentile(values, 95) * 1000, percentile(values, 99) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с локальной заменой Bot API")
+    parser.add_argument("--users", type=int, default=1000, help="количество синтетических пользователей")
+    parser.add_argument("--rounds", type=int, default=2, help="сколько смен проводит каждый пользователь")
+    parser.add_argument("--timeout", type=float, default=600, help="предельное время теста, секунд")
+    parser.add_argument("--max-p95", type=float, help="порог p95 в миллисекундах (для проверки регрессий)")
+    parser.add_argument("--json", help="куда сохранить результаты в формате JSON")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="оставить лимиты Telegram в очереди отправки (по умолчанию сняты, "
+                             "чтобы измерять сам бот)")
+    args = parser.parse_args()
+
+    # Запросы к локальному серверу не должны идти через прокси
+    os.environ["NO_PROXY"] = os.environ["no_proxy"] = "127.0.0.1,localhost"
+
+    api = FakeBotApi()
+    api.start()
+    test = LoadTest(api, args.users, args.rounds)
+    api.on_deliver = test.on_deliver
+    api.on_reply = test.on_reply
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Бот создает базу в текущей папке и читает настройки из config.py
+        with open(os.path.join(tmp, "config.py"), "w", encoding="utf-8") as file:
+            file.write('TOKEN = "1:load-test"\nADMIN_ID = 1\n')
+            if not args.rate_limits:
+                file.write("OUTBOX_GLOBAL_RATE = 1000000\nOUTBOX_CHAT_RATE = 1000000\n")
+        sys.path.insert(0, tmp)
+        os.chdir(tmp)
+
+        from telebot import apihelper
+        apihelper.API_URL = api.api_url
+
+        import Tg_Bot_Work
+        db_path = os.path.join(tmp, Tg_Bot_Work.DB_PATH)
+        size_before, _ = db_size(db_path)
+
+        polling = threading.Thread(target=Tg_Bot_Work.bot.polling, daemon=True,
+                                   kwargs={"non_stop": True, "interval": 0, "long_polling_timeout": 1})
+        started = time.perf_counter()
+        polling.start()
+        test.begin()
+        finished = test.done.wait(args.timeout)
+        elapsed = time.perf_counter() - started
+
+        Tg_Bot_Work.bot.stop_polling()
+        polling.join(5)
+        Tg_Bot_Work.sender.close()
+        Tg_Bot_Work.db_writer.close()
+        counter = sqlite3.connect(db_path)
+        shifts_count = counter.execute("""SELECT COUNT(*) FROM work WHERE end_ts IS NOT NULL""").fetchone()[0]
+        counter.close()
+        size_after, wal_after = db_size(db_path)
+        os.chdir(ROOT)
+    api.stop()
+
+    all_latencies = [value for values in test.latencies.values() for value in values]
+    presses = len(all_latencies)
+    results = {
+        "users": args.users,
+        "rounds": args.rounds,
+        "completed": finished,
+        "presses": presses,
+        "seconds": elapsed,
+        "throughput": presses / elapsed if elapsed else 0,
+        "latency_ms": {action: dict(zip(("count", "p50", "p95", "p99"), summary(values)))
+                       for action, values in [("all", all_latencies)] + list(test.latencies.items())},
+        "shifts": shifts_count,
+        "db_bytes_before": size_before,
+        "db_bytes_after": size_after,
+        "wal_bytes_after": wal_after,
+        "api_calls": dict(api.calls),
+        "unexpected_replies": test.unexpected,
+    }
+
+    print(f"Пользователей: {args.users}, нажатий: {presses} за {elapsed:.1f} с"
+          + ("" if finished else " (тест прерван по времени!)"))
+    print(f"Пропускная способность: {results['throughput']:.0f} нажатий/с")
+    print(f"{'действие':>14} {'кол-во':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for action, values in results["latency_ms"].items():
+        print(f"{action:>14} {values['count']:>8} {values['p50']:>9.1f} {values['p95']:>9.1f} {values['p99']:>9.1f}")
+    growth = size_after - size_before
+    print(f"База: {size_before / 1024:.0f} КБ -> {size_after / 1024:.0f} КБ "
+          f"(+{growth / 1024:.0f} КБ, {growth / max(shifts_count, 1):.0f} байт на смену, смен: {shifts_count}), "
+          f"журнал WAL: {wal_after / 1024:.0f} КБ")
+    print("Вызовы API: " + ", ".join(f"{method}={count}" for method, count in sorted(api.calls.items())))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+    p95 = results["latency_ms"]["all"]["p95"]
+    if not finished or (args.max_p95 is not None and p95 > args.max_p95):
+        print(f"❌ Регрессия: p95 = {p95:.1f} мс, порог {args.max_p95} мс" if finished else "❌ Тест не завершился")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Бенчмарк постраничной общей статистики: время одной страницы при разном числе пользователей
+# Запуск: python benchmarks/bench_pages.py
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import totals  # noqa: E402
+
+
+def make_db(users):
+    # Создаем таблицу итогов в памяти и заполняем ее случайными пользователями
+    dp = sqlite3.connect(':memory:')
+    cursor = dp.cursor()
+    cursor.execute(totals.CREATE_TABLE_SQL)
+    for index_sql in totals.INDEXES_SQL:
+        cursor.execute(index_sql)
+    cursor.executemany("""INSERT INTO user_totals (user_id, name, sessions, hours, money) VALUES (?,?,?,?,?)""",
+                       [(user_id, f"user{user_id}", random.randint(1, 300),
+                         round(random.uniform(0, 2000), 2), round(random.uniform(0, 800000), 2))
+                        for user_id in range(1, users + 1)])
+    dp.commit()
+    return dp, cursor
+
+
+def measure_page(cursor, sort, key, repeat=200):
+    # Среднее время получения одной страницы, в миллисекундах
+    started = time.perf_counter()
+    for _ in range(repeat):
+        totals.page(cursor, sort, key)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    print(f"{'пользователей':>14} {'сорт.':>6} {'первая, мс':>11} {'середина, мс':>13}")
+    for users in (100, 10_000, 100_000, 1_000_000):
+        dp, cursor = make_db(users)
+        for sort in totals.SORTS:
+            # Ключ строки из середины списка - как если бы пролистали половину страниц
+            column, descending = totals.SORTS[sort]
+            cursor.execute(f"""SELECT user_id, name, sessions, hours, money FROM user_totals
+                               ORDER BY {column}, user_id LIMIT 1 OFFSET ?""", (users // 2,))
+            middle = totals.sort_key(sort, cursor.fetchone())
+            print(f"{users:>14} {sort:>6} {measure_page(cursor, sort, None):>11.3f} "
+                  f"{measure_page(cursor, sort, middle):>13.3f}")
+        dp.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Бенчмарк изменения ставки задним числом: пересчет сумм смен и итогов
+# Сравниваются пересчет по одной смене (ставка, UPDATE work, итоги пользователя
+# и итоги по дням для каждой строки) и векторный пересчет rates.set_rate() (NumPy).
+# Каждый способ работает со своей копией базы
+# Запуск: python benchmarks/bench_rates.py [кол-во смен]
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rates  # noqa: E402
+import rollups  # noqa: E402
+import schema  # noqa: E402
+import totals  # noqa: E402
+
+YEAR_START = 1767225600  # 01-01-2026
+
+
+def make_db(path, rows, users=1000):
+    # Создаем файл базы со случайными завершенными сменами за год и итогами по ним
+    dp = sqlite3.connect(path)
+    cursor = dp.cursor()
+    schema.create_work_table(cursor)
+    data = []
+    for work_id in range(1, rows + 1):
+        user_id = random.randint(1, users)
+        start_ts = YEAR_START + random.randint(0, 365 * 86400)
+        seconds = random.randint(3600, 12 * 3600)
+        data.append((work_id, user_id, f"user{user_id}", start_ts, start_ts + seconds,
+                     round(seconds / 3600, 2), round(seconds / 3600 * rates.DEFAULT_RATE, 2)))
+        if len(data) == 100_000:
+            cursor.executemany("""INSERT INTO work (id, user_id, name, start_ts, end_ts, hours, many)
+                                  VALUES (?,?,?,?,?,?,?)""", data)
+            data = []
+    cursor.executemany("""INSERT INTO work (id, user_id, name, start_ts, end_ts, hours, many)
+                          VALUES (?,?,?,?,?,?,?)""", data)
+    rates.create_index(cursor)
+    totals.create_table(cursor)
+    rollups.create_table(cursor)
+    rates.create_table(cursor)
+    dp.commit()
+    dp.close()
+
+
+def row_by_row(cursor, since_ts, user_id):
+    # Для сравнения: ставка и сумма считаются в Python для каждой смены,
+    # и каждая измененная смена отдельно обновляет work, user_totals и daily_totals
+    sql, params = """SELECT id, user_id, start_ts, end_ts, hours, many FROM work
+                     WHERE start_ts >= ? AND end_ts IS NOT NULL""", (since_ts,)
+    if user_id != rates.ALL_USERS:
+        sql, params = sql + " AND user_id = ?", (since_ts, user_id)
+    cursor.execute(sql, params)
+    changed = 0
+    for work_id, shift_user_id, start_ts, end_ts, hours, many in cursor.fetchall():
+        new = round((end_ts - start_ts) / 3600 * rates.rate_for(shift_user_id, start_ts), 2)
+        if abs(new - many) < 0.005:
+            continue
+        changed += 1
+        cursor.execute("""UPDATE work SET many = ? WHERE id = ?""", (new, work_id))
+        cursor.execute("""UPDATE user_totals SET money = ROUND(money + ?, 2) WHERE user_id = ?""",
+                       (new - many, shift_user_id))
+        old_pieces = rollups.split_shift(start_ts, end_ts, hours, many)
+        new_pieces = rollups.split_shift(start_ts, end_ts, hours, new)
+        for (day, _, _, old_money), (_, _, _, new_money) in zip(old_pieces, new_pieces):
+            cursor.execute("""UPDATE daily_totals SET money = ROUND(money + ?, 2)
+                              WHERE day = ? AND user_id = ?""", (new_money - old_money, day, shift_user_id))
+    return changed
+
+
+def run(path, mode, changes):
+    # Применяем изменения ставок одним из способов; возвращает (смен пересчитано, секунд)
+    dp = sqlite3.connect(path, isolation_level=None)
+    cursor = dp.cursor()
+    rates.load(cursor)
+    started = time.perf_counter()
+    cursor.execute("""BEGIN IMMEDIATE""")
+    changed = 0
+    for user_id, rate, since_ts in changes:
+        if mode == "numpy":
+            changed += rates.set_rate(cursor, user_id, rate, since_ts)
+        else:
+            cursor.execute("""DELETE FROM rates WHERE user_id = ? AND since_ts >= ?""", (user_id, since_ts))
+            cursor.execute("""INSERT INTO rates (user_id, since_ts, rate) VALUES (?, ?, ?)""",
+                           (user_id, since_ts, rate))
+            rates.load(cursor)
+            changed += row_by_row(cursor, since_ts, user_id)
+    cursor.execute("""COMMIT""")
+    elapsed = time.perf_counter() - started
+    drift = totals.verify(cursor)
+    dp.close()
+    return changed, elapsed, len(drift)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(1)
+    # Общая ставка меняется с начала года (пересчет всех смен),
+    # затем личные ставки 20 сотрудников - с середины года
+    scenarios = {
+        "общая ставка с 01.01": [(rates.ALL_USERS, 450, YEAR_START)],
+        "20 личных ставок с 01.07": [(user_id, 500 + user_id, YEAR_START + 181 * 86400)
+                                     for user_id in range(1, 21)],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"Создаем базу на {rows} смен...")
+        started = time.perf_counter()
+        make_db(db_path, rows)
+        print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+        print(f"{'сценарий':>26} {'способ':>10} {'смен':>9} {'время, с':>9} {'смен/с':>10} {'расхожд.':>9}")
+        for title, changes in scenarios.items():
+            for mode in ("row", "numpy"):
+                copy_path = os.path.join(tmp, f"{mode}.db")
+                shutil.copy(db_path, copy_path)
+                changed, elapsed, drift = run(copy_path, mode, changes)
+                print(f"{title:>26} {mode:>10} {changed:>9} {elapsed:>9.2f} "
+                      f"{changed / elapsed:>10.0f} {drift:>9}")
+                os.remove(copy_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Бенчмарк многопроцессного режима: пропускная способность в зависимости от числа шардов
+# Для каждого числа шардов запускается диспетчер (shards.py) с процессами-обработчиками,
+# которые работают с локальной заменой Bot API (fake_bot_api.py), и тот же сценарий
+# синтетических пользователей, что в bench_load.py. Лимиты Telegram в очереди отправки сняты
+# Запуск: python benchmarks/bench_shards.py [--shards 1,2,4] [--users 1000] [--rounds 2]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_load import LoadTest, summary  # noqa: E402
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+
+def run(shards_count, users, rounds, timeout):
+    # Один прогон; возвращает (нажатий в секунду, p50, p95 в миллисекундах, завершен ли, запуск в секундах)
+    import shards
+    from telebot import apihelper
+
+    api = FakeBotApi()
+    api.start()
+    test = LoadTest(api, users, rounds)
+    api.on_deliver = test.on_deliver
+    api.on_reply = test.on_reply
+    apihelper.API_URL = api.api_url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Процессы-обработчики создают базы в текущей папке и читают настройки из config.py
+        with open(os.path.join(tmp, "config.py"), "w", encoding="utf-8") as file:
+            file.write(f'TOKEN = "1:load-test"\nADMIN_ID = 1\nAPI_URL = "{api.api_url}"\n'
+                       "OUTBOX_GLOBAL_RATE = 1000000\nOUTBOX_CHAT_RATE = 1000000\n")
+        sys.path.insert(0, tmp)
+        os.chdir(tmp)
+
+        shards.POLL_TIMEOUT = 1
+        dispatcher = shards.Dispatcher("1:load-test", shards_count)
+        startup = dispatcher.start(timeout=120)
+        polling = threading.Thread(target=dispatcher.poll, daemon=True)
+
+        started = time.perf_counter()
+        polling.start()
+        test.begin()
+        finished = test.done.wait(timeout)
+        elapsed = time.perf_counter() - started
+
+        dispatcher.stop()
+        polling.join(5)
+        os.chdir(ROOT)
+        sys.path.remove(tmp)
+    api.stop()
+
+    latencies = [value for values in test.latencies.values() for value in values]
+    _, p50, p95, _ = summary(latencies)
+    return len(latencies) / elapsed, p50, p95, finished, startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность в зависимости от числа шардов")
+    parser.add_argument("--shards", default="1,2,4", help="числа шардов через запятую")
+    parser.add_argument("--users", type=int, default=1000, help="количество синтетических пользователей")
+    parser.add_argument("--rounds", type=int, default=2, help="сколько смен проводит каждый пользователь")
+    parser.add_argument("--timeout", type=float, default=600, help="предельное время прогона, секунд")
+    args = parser.parse_args()
+
+    # Запросы к локальному серверу не должны идти через прокси
+    os.environ["NO_PROXY"] = os.environ["no_proxy"] = "127.0.0.1,localhost"
+
+    print(f"Ядер: {os.cpu_count()}, пользователей: {args.users}, кругов: {args.rounds}")
+    print(f"{'шардов':>7} {'нажатий/с':>10} {'p50, мс':>9} {'p95, мс':>9} {'запуск, с':>10}")
+    baseline = None
+    for shards_count in [int(value) for value in args.shards.split(",")]:
+        throughput, p50, p95, finished, startup = run(shards_count, args.users, args.rounds, args.timeout)
+        baseline = baseline or throughput
+        print(f"{shards_count:>7} {throughput:>10.0f} {p50:>9.1f} {p95:>9.1f} {startup:>10.1f}"
+              f"   x{throughput / baseline:.2f}" + ("" if finished else " (прерван по времени!)"))
+
+
+if __name__ == "__main__":
+    main()
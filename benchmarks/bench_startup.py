@@ -0,0 +1,77 @@
+# Бенчмарк перезапуска бота: время подготовки базы до готовности
+# Сравниваются перезапуск, при котором каждый раз выполняются все шаги схемы
+# (как было до версий схемы: CREATE ... IF NOT EXISTS, проверка колонок и
+# поиск незаполненных start_ts/end_ts по всей таблице work), и перезапуск
+# с версией схемы (PRAGMA user_version), когда выполненные миграции пропускаются.
+# Отдельно - сколько стоят экраны, которые бот прогревает при запуске: без прогрева
+# это время добавилось бы к первым нажатиям пользователей после перезапуска
+# Запуск: python benchmarks/bench_startup.py [кол-во смен]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rollups  # noqa: E402
+import startup  # noqa: E402
+import totals  # noqa: E402
+import views  # noqa: E402
+from bench_rates import make_db  # noqa: E402
+
+# Сколько раз перезапускать каждым способом
+RESTARTS = 5
+
+
+def restart(path, all_steps):
+    # Один запуск: подготовка базы; all_steps - выполнять все миграции заново
+    # Возвращает время до готовности в секундах
+    dp = sqlite3.connect(path)
+    if all_steps:
+        dp.execute("""PRAGMA user_version = 0""")
+        dp.commit()
+    report = startup.prepare_database(dp)
+    elapsed = report.ready()
+    dp.close()
+    return elapsed
+
+
+def warm_screens(path):
+    # Экраны прогрева (как Tg_Bot_Work.warm_up) на новом соединении; возвращает секунды
+    dp = sqlite3.connect(path)
+    cursor = dp.cursor()
+    started = time.perf_counter()
+    for sort in totals.SORTS:
+        views.users_page(views.GLOBAL_STATS_PAGE, sort, *totals.page(cursor, sort))
+    for period in rollups.PERIODS:
+        first_day, next_day = rollups.period_bounds(period)
+        views.period_stats(period, first_day, rollups.period_stats(cursor, first_day, next_day))
+    elapsed = time.perf_counter() - started
+    dp.close()
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"Создаем базу на {rows} смен...")
+        make_db(db_path, rows)
+
+        # Первый запуск на базе без версии схемы выполняет все миграции и записывает версию
+        print(f"Первый запуск: {restart(db_path, False) * 1000:.0f} мс\n")
+
+        print(f"{'способ':>20} {'мин, мс':>9} {'медиана, мс':>12}")
+        for title, all_steps in (("все шаги", True), ("по версии схемы", False)):
+            times = sorted(restart(db_path, all_steps) for _ in range(RESTARTS))
+            print(f"{title:>20} {times[0] * 1000:>9.0f} {times[len(times) // 2] * 1000:>12.0f}")
+
+        times = sorted(warm_screens(db_path) for _ in range(RESTARTS))
+        print(f"\nЭкраны прогрева ({len(totals.SORTS) + len(rollups.PERIODS)} шт.): "
+              f"{times[len(times) // 2] * 1000:.0f} мс без кэша, из кэша - без запросов к базе")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Бенчмарк итогов по сотрудникам (stats.all_users_stats, итоги ведомости /export):
+# старый N+1 подход против одного GROUP BY запроса по таблице смен
+# Запуск: python benchmarks/bench_stats.py [кол-во пользователей]
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema  # noqa: E402
+import stats  # noqa: E402
+
+# Начало периода, в котором создаются смены: 01.01.2024 (секунды epoch)
+START_TS = 1_704_067_200
+
+
+def make_db(rows, users):
+    # Создаем базу в памяти (таблица смен как в боте) и заполняем ее случайными сменами
+    dp = sqlite3.connect(':memory:')
+    cursor = dp.cursor()
+    schema.create_work_table(cursor)
+    data = []
+    for i in range(rows):
+        user_id = random.randint(1, users)
+        start_ts = START_TS + random.randrange(365 * 86400)
+        end_ts = start_ts + random.randint(3600, 12 * 3600)
+        hours = round((end_ts - start_ts) / 3600, 2)
+        data.append((user_id, f"user{user_id}", schema.to_str(start_ts), schema.to_str(end_ts),
+                     hours, round(hours * 400, 2), start_ts, end_ts))
+    cursor.executemany("""INSERT INTO work (user_id, name, start_time, end_time, hours, many, start_ts, end_ts)
+                          VALUES (?,?,?,?,?,?,?,?)""", data)
+    dp.commit()
+    return dp, cursor
+
+
+def old_stats(cursor):
+    # Прежняя реализация: отдельный запрос на каждого пользователя
+    cursor.execute("""SELECT DISTINCT user_id, name FROM work""")
+    result = []
+    for user_id, user_name in cursor.fetchall():
+        cursor.execute("""SELECT * FROM work WHERE user_id = ?""", (user_id,))
+        summa_sessions, summa_hors, summa_money = 0, 0, 0
+        for record in cursor.fetchall():
+            if record[5] is not None:
+                summa_sessions += 1
+                summa_hors += round(record[5] or 0, 2)
+                summa_money += round(record[6] or 0, 2)
+        result.append((user_id, user_name, summa_sessions, round(summa_hors, 2), round(summa_money, 2)))
+    return result
+
+
+def measure(func, cursor, repeat=3):
+    # Лучшее время из нескольких запусков, в миллисекундах
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(cursor)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print(f"Пользователей: {users}")
+    print(f"{'строк':>10} {'N+1, мс':>12} {'GROUP BY, мс':>14}")
+    for rows in (1_000, 10_000, 100_000, 1_000_000):
+        dp, cursor = make_db(rows, users)
+        old_ms = measure(old_stats, cursor)
+        new_ms = measure(stats.all_users_stats, cursor)
+        print(f"{rows:>10} {old_ms:>12.1f} {new_ms:>14.1f}")
+        dp.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Локальная замена Telegram Bot API для нагрузочных тестов (работает без интернета)
+# Отдает getUpdates из очереди и принимает sendMessage / editMessageText /
+# answerCallbackQuery. Для ответов бота в чат вызывается on_reply(chat_id, method),
+# чтобы тест мог измерить задержку и отправить следующее нажатие
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+# Методы, которыми бот отвечает пользователю в чат
+REPLY_METHODS = ("sendMessage", "editMessageText", "sendDocument")
+
+
+class Server(ThreadingHTTPServer):
+    # Очередь входящих соединений побольше: к серверу одновременно подключаются
+    # потоки-отправители нескольких процессов бота
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeBotApi:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.lock = threading.Condition()
+        # Обновления, еще не подтвержденные ботом (offset в getUpdates)
+        self.pending = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        # Количество вызовов каждого метода
+        self.calls = Counter()
+        # Вызывается, когда обновления переданы боту: on_deliver(список обновлений)
+        self.on_deliver = None
+        # Вызывается на каждый ответ бота в чат: on_reply(chat_id, method)
+        self.on_reply = None
+
+        self.server = Server((host, port), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-bot-api", daemon=True)
+
+    @property
+    def api_url(self):
+        # Шаблон адреса для telebot.apihelper.API_URL
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push(self, update):
+        # Поставить обновление в очередь getUpdates (update_id назначается здесь)
+        with self.lock:
+            update["update_id"] = self.next_update_id
+            self.next_update_id += 1
+            self.pending.append(update)
+            self.lock.notify_all()
+
+    def get_updates(self, offset, limit, timeout):
+        # Длинный опрос: ждем обновлений не дольше timeout секунд
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if offset:
+                self.pending = [update for update in self.pending if update["update_id"] >= offset]
+            while not self.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.lock.wait(remaining)
+            updates = self.pending[:limit]
+        if self.on_deliver:
+            self.on_deliver(updates)
+        return updates
+
+    def call(self, method, params):
+        # Ответ на вызов метода API: поле result
+        with self.lock:
+            self.calls[method] += 1
+        if method == "getUpdates":
+            return self.get_updates(int(params.get("offset", 0) or 0),
+                                    int(params.get("limit", 100) or 100),
+                                    float(params.get("timeout", 0) or 0))
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "load_test_bot"}
+        if method in ("answerCallbackQuery", "deleteWebhook", "setWebhook"):
+            return True
+
+        chat_id = int(params.get("chat_id", 0) or 0)
+        with self.lock:
+            message_id = int(params.get("message_id", 0) or 0) or self.next_message_id
+            self.next_message_id += 1
+        if method in REPLY_METHODS and self.on_reply:
+            self.on_reply(chat_id, method)
+        return {"message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = self.rfile.read(length)
+                    if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                        params.update({key: values[-1]
+                                       for key, values in parse_qs(body.decode("utf-8")).items()})
+
+                payload = json.dumps({"ok": True, "result": api.call(method, params)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _serve
+            do_POST = _serve
+
+            def log_message(self, format, *args):
+                # Не засоряем вывод теста журналом запросов
+                pass
+
+        return Handler
@@ -0,0 +1,109 @@
+# Модуль кэша готовых экранов статистики (текст + клавиатура)
+# Повторное нажатие "Статистика" не делает запросов к базе, пока данные не изменились.
+# Каждая запись кэша привязана к тегу: ("user", user_id) - личная статистика,
+# GLOBAL - страницы общей статистики и списка /dell.
+# Когда смена завершается или пользователи удаляются, соответствующие теги сбрасываются
+import threading
+from collections import OrderedDict
+
+
+# Тег страниц, которые зависят от итогов всех пользователей
+GLOBAL = "global"
+
+# Максимальное количество экранов в кэше
+MAX_SIZE = 512
+
+
+def user_tag(user_id):
+    # Тег личной статистики пользователя
+    return ("user", user_id)
+
+
+class RenderCache:
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Ключ -> (тег, готовый экран); порядок - от давно использованных к недавним
+        self.entries = OrderedDict()
+        # Ключи по тегам, чтобы сбрасывать их без перебора всего кэша
+        self.keys_by_tag = {}
+        # Версии тегов: увеличиваются при каждом сбросе
+        self.versions = {}
+        # Общая версия: увеличивается при полной очистке
+        self.epoch = 0
+
+        # Счетчики для мониторинга
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def version(self, tag):
+        # Версия тега; запоминается до чтения из базы и передается в put()
+        with self.lock:
+            return self.epoch, self.versions.get(tag, 0)
+
+    def get(self, key):
+        # Готовый экран по ключу или None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, tag, version):
+        # Сохраняем экран, если тег не сбрасывался с момента version()
+        # Иначе экран мог быть построен по устаревшим данным - не кэшируем его
+        with self.lock:
+            if (self.epoch, self.versions.get(tag, 0)) != version:
+                return
+            self.entries[key] = (tag, value)
+            self.entries.move_to_end(key)
+            self.keys_by_tag.setdefault(tag, set()).add(key)
+
+            # Вытесняем давно не использованные экраны
+            while len(self.entries) > self.max_size:
+                old_key, (old_tag, _) = self.entries.popitem(last=False)
+                self.keys_by_tag[old_tag].discard(old_key)
+                self.evictions += 1
+
+    def fetch(self, key, tag, render):
+        # Экран из кэша, а если его нет - render() и сохранение результата
+        value = self.get(key)
+        if value is None:
+            version = self.version(tag)
+            value = render()
+            self.put(key, value, tag, version)
+        return value
+
+    def invalidate(self, *tags):
+        # Сбрасываем все экраны с указанными тегами
+        with self.lock:
+            for tag in tags:
+                self.versions[tag] = self.versions.get(tag, 0) + 1
+                for key in self.keys_by_tag.pop(tag, ()):
+                    self.entries.pop(key, None)
+                self.invalidations += 1
+
+    def clear(self):
+        # Сбрасываем весь кэш (при полной очистке базы или пересчете итогов)
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+            self.keys_by_tag.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        # Счетчики кэша для мониторинга
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
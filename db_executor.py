@@ -0,0 +1,57 @@
+# Модуль выполнения запросов к SQLite вне цикла событий asyncio
+# Запросы выполняются в отдельном пуле потоков, у каждого потока свое соединение,
+# поэтому обращения к базе не блокируют сетевой ввод-вывод бота
+# и не делят между собой один курсор
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from writer import BUSY_TIMEOUT
+
+
+class DBExecutor:
+    def __init__(self, path, workers=4):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="db",
+                                           initializer=self._connect)
+
+    def _connect(self):
+        # Открываем соединение для текущего потока пула
+        # check_same_thread=False нужен только для закрытия соединений в close()
+        dp = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.local.dp = dp
+        with self.connections_lock:
+            self.connections.append(dp)
+
+    def _call(self, func, args):
+        # Выполняем func(cursor, *args) в одной транзакции соединения этого потока
+        dp = self.local.dp
+        cursor = dp.cursor()
+        try:
+            result = func(cursor, *args)
+            dp.commit()
+            return result
+        except Exception:
+            dp.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    async def run(self, func, *args):
+        # Выполнить func(cursor, *args) в пуле и дождаться результата, не блокируя цикл событий
+        # Изменения фиксируются (commit), если func завершилась без ошибки
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, func, args)
+
+    def close(self):
+        # Дожидаемся выполнения запросов и закрываем все соединения
+        self.executor.shutdown(wait=True)
+        with self.connections_lock:
+            for dp in self.connections:
+                dp.close()
+            self.connections.clear()
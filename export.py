@@ -0,0 +1,125 @@
+# Модуль выгрузки зарплатной ведомости за период (CSV и XLSX)
+# Смены читаются из базы порциями и сразу пишутся в файл,
+# поэтому выгрузка сотен тысяч смен не держит их все в памяти.
+# Смены закрытых расчетных периодов читаются из архивов (archive.work_tables).
+# В многопроцессном режиме ведомость собирается из файлов баз всех шардов
+import csv
+import heapq
+
+import archive
+import schema
+import stats
+
+
+# Сколько строк читать из базы за один раз
+FETCH_SIZE = 1000
+
+# Заголовки колонок
+SHIFT_HEADER = ["ID смены", "ID сотрудника", "Имя", "Начало", "Окончание", "Часы", "Заработано, руб."]
+TOTALS_HEADER = ["ID сотрудника", "Имя", "Смен", "Часы", "Заработано, руб."]
+
+# Поддерживаемые форматы файла
+FORMATS = ("csv", "xlsx")
+
+
+def shift_rows(cursor, since, until, table="work"):
+    # Генератор завершенных смен таблицы table за период [since, until) по времени окончания
+    # Поиск по индексу idx_work_end_ts, строки читаются порциями по FETCH_SIZE
+    # Возвращает пары (время окончания, строка ведомости)
+    cursor.execute(f"""
+        SELECT id, user_id, name, start_ts, end_ts, hours, many
+        FROM {table}
+        WHERE end_ts >= ? AND end_ts < ?
+        ORDER BY end_ts
+    """, (since, until))
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        for work_id, user_id, name, start_ts, end_ts, hours, many in rows:
+            yield end_ts, [work_id, user_id, name,
+                           schema.to_str(start_ts) if start_ts is not None else "",
+                           schema.to_str(end_ts), hours, many]
+
+
+def database_shift_rows(dp, since, until):
+    # Смены за период из архивов и текущей таблицы одной базы
+    # Периоды не пересекаются по времени, поэтому смены идут по порядку окончания
+    for table in archive.work_tables(dp, since, until):
+        yield from shift_rows(dp.cursor(), since, until, table)
+
+
+def all_shift_rows(dps, since, until):
+    # Смены за период из всех баз dps (файлов шардов), по порядку окончания
+    for _, row in heapq.merge(*(database_shift_rows(dp, since, until) for dp in dps),
+                              key=lambda item: item[0]):
+        yield row
+
+
+def totals_rows(dps, since, until):
+    # Итоги по сотрудникам за тот же период (одна строка на сотрудника)
+    # Итоги по каждой таблице складываются, имя берется из последней таблицы
+    merged = {}
+    for dp in dps:
+        for table in archive.work_tables(dp, since, until):
+            for user_id, name, sessions, hours, money in stats.all_users_stats(dp.cursor(), since, until, table):
+                row = merged.setdefault(user_id, [user_id, name, 0, 0.0, 0.0])
+                row[1] = name
+                row[2] += sessions
+                row[3] = round(row[3] + hours, 2)
+                row[4] = round(row[4] + money, 2)
+    for user_id in sorted(merged):
+        yield merged[user_id]
+
+
+def write_csv(path, dps, since, until):
+    # Ведомость в CSV: сначала смены, после пустой строки - итоги по сотрудникам
+    # Разделитель ";" и BOM, чтобы файл сразу открывался в русском Excel
+    # Возвращает количество выгруженных смен
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(SHIFT_HEADER)
+        for row in all_shift_rows(dps, since, until):
+            writer.writerow(row)
+            count += 1
+
+        writer.writerow([])
+        writer.writerow(TOTALS_HEADER)
+        writer.writerows(totals_rows(dps, since, until))
+    return count
+
+
+def write_xlsx(path, dps, since, until):
+    # Ведомость в XLSX: лист "Смены" и лист "Итого"
+    # Режим write_only пишет строки в файл по мере поступления
+    # Требуется библиотека openpyxl (pip install openpyxl)
+    # Возвращает количество выгруженных смен
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    count = 0
+
+    shifts_sheet = workbook.create_sheet("Смены")
+    shifts_sheet.append(SHIFT_HEADER)
+    for row in all_shift_rows(dps, since, until):
+        shifts_sheet.append(row)
+        count += 1
+
+    totals_sheet = workbook.create_sheet("Итого")
+    totals_sheet.append(TOTALS_HEADER)
+    for row in totals_rows(dps, since, until):
+        totals_sheet.append(row)
+
+    workbook.save(path)
+    return count
+
+
+def export(path, dps, since, until, file_format="csv"):
+    # Выгрузка ведомости за период [since, until) в файл нужного формата
+    # dps - отдельные соединения для чтения, по одному на файл базы (шард):
+    # к ним подключаются архивы периодов
+    # Возвращает количество выгруженных смен
+    if file_format == "xlsx":
+        return write_xlsx(path, dps, since, until)
+    return write_csv(path, dps, since, until)
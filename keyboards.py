@@ -0,0 +1,49 @@
+# Модуль готовых клавиатур
+# Неизменяемые клавиатуры собираются и переводятся в JSON один раз при запуске:
+# telebot передает строку reply_markup в Telegram как есть, без повторной сериализации.
+# Клавиатуры, зависящие от данных (подтверждение удаления, страницы списков), тоже
+# отдаются строкой JSON, чтобы одинаково передаваться и храниться в кэше экранов
+from telebot import types
+
+
+# Префикс callback_data кнопок статистики за период и их названия
+PERIOD_PREFIX = "period_"
+PERIOD_TITLES = {"day": "📆 Сегодня", "week": "🗓 Неделя", "month": "📅 Месяц"}
+
+
+def build(*rows):
+    # Клавиатура из рядов кнопок [(название, callback_data), ...] -> строка JSON
+    markup = types.InlineKeyboardMarkup()
+    for row in rows:
+        markup.row(*[types.InlineKeyboardButton(title, callback_data=data) for title, data in row])
+    return markup.to_json()
+
+
+# Приветствие по /start
+START = build([("Начать работу", "start"), ("Закончить работу", "end")],
+              [("Статистика", "stats")])
+
+# Под сообщением о начале смены
+END_ONLY = build([("Закончить работу", "end")])
+
+# Под итогом смены
+MENU_ONLY = build([("Главное меню", "menu")])
+
+# Главное меню
+MAIN_MENU = build([("Начать", "start"), ("Закончить", "end")],
+                  [("Статистика", "stats")])
+
+# Меню статистики: личная, общая и за период
+STATS_MENU = build([("Моя статистика", "me_stats"), ("Общая статистика", "global_stats")],
+                   [(title, PERIOD_PREFIX + period) for period, title in PERIOD_TITLES.items()])
+
+# Возврат к меню статистики
+BACK_TO_STATS = build([("⬅️ К статистике", "stats")])
+
+# Подтверждение закрытия расчетного периода (/sekret)
+CLOSE_PERIOD_CONFIRM = build([("✅ Да, закрыть", "clear_yes"), ("❌ Нет, отмена", "clear_no")])
+
+
+def remove_confirm(user_id):
+    # Подтверждение удаления пользователя (/dell)
+    return build([("✅ Да, удалить", f"remove_yes_{user_id}"), ("❌ Нет, отмена", "cancel_remove")])
@@ -0,0 +1,304 @@
+# Модуль метрик: время обработчиков, запросов к Telegram и SQL-запросов
+# Гистограммы задержек считаются по маршрутам (callback.data без чисел, команды),
+# по методам Bot API и по видам SQL-запросов (SELECT, INSERT, COMMIT...).
+# Метрики отдаются в текстовом формате Prometheus на локальном HTTP-адресе
+# (METRICS_PORT в config.py) и кратко - командой администратора /metrics
+import bisect
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import apihelper
+
+
+# Границы корзин гистограмм, в секундах
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SQL-запрос медленнее этого порога (секунд) считается медленным
+SLOW_QUERY = 0.05
+
+# Сколько последних медленных запросов хранить для /metrics
+SLOW_LOG_SIZE = 10
+
+# Максимум разных значений метки в одной метрике: остальные попадают в "other"
+# (callback_data присылает клиент, и в ней может оказаться что угодно)
+MAX_LABELS = 100
+
+
+class Histogram:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.lock = threading.Lock()
+        # Значение метки -> [количество в каждой корзине, сумма, количество, максимум]
+        self.series = {}
+
+    def observe(self, value, seconds):
+        # Записываем одно измерение
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            series = self.series.get(value)
+            if series is None:
+                if len(self.series) >= MAX_LABELS:
+                    value = "other"
+                series = self.series.setdefault(value, [[0] * (len(BUCKETS) + 1), 0.0, 0, 0.0])
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+            series[3] = max(series[3], seconds)
+
+    def quantile(self, buckets, count, percent):
+        # Оценка перцентиля по корзинам (линейно внутри корзины, как histogram_quantile)
+        rank = count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(buckets):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return 0.0
+
+    def summary(self):
+        # Список (метка, количество, среднее, p95, максимум) по убыванию количества
+        with self.lock:
+            items = [(value, list(buckets), total, count, maximum)
+                     for value, (buckets, total, count, maximum) in self.series.items()]
+        return sorted(((value, count, total / count, min(self.quantile(buckets, count, 95), maximum), maximum)
+                       for value, buckets, total, count, maximum in items),
+                      key=lambda row: -row[1])
+
+    def render(self):
+        # Строки в текстовом формате Prometheus
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((value, list(buckets), total, count)
+                           for value, (buckets, total, count, _) in self.series.items())
+        for value, buckets, total, count in items:
+            label = f'{self.label}="{escape(value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, value):
+        with self.lock:
+            if value not in self.values and len(self.values) >= MAX_LABELS:
+                value = "other"
+            self.values[value] = self.values.get(value, 0) + 1
+
+    def total(self):
+        with self.lock:
+            return sum(self.values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for value, count in items:
+            lines.append(f'{self.name}{{{self.label}="{escape(value)}"}} {count}')
+        return lines
+
+
+class Gauge:
+    # Значение, которое задается целиком (например, время этапов запуска)
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def set(self, value, amount):
+        with self.lock:
+            self.values[value] = amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for value, amount in items:
+            lines.append(f'{self.name}{{{self.label}="{escape(value)}"}} {amount}')
+        return lines
+
+
+def escape(value):
+    # Экранирование значения метки для формата Prometheus
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Метрики бота
+handler_seconds = Histogram("worktime_handler_seconds", "Время обработчиков сообщений и кнопок", "route")
+handler_errors = Counter("worktime_handler_errors_total", "Ошибки в обработчиках", "route")
+api_seconds = Histogram("worktime_api_call_seconds", "Время запросов к Telegram Bot API", "method")
+api_errors = Counter("worktime_api_errors_total", "Ошибки запросов к Telegram Bot API", "method")
+sql_seconds = Histogram("worktime_sql_seconds", "Время выполнения SQL-запросов", "statement")
+slow_queries = Counter("worktime_sql_slow_queries_total", "SQL-запросы медленнее порога", "statement")
+startup_seconds = Gauge("worktime_startup_seconds", "Время этапов запуска бота (ready - до готовности)", "phase")
+
+METRICS = (handler_seconds, handler_errors, api_seconds, api_errors, sql_seconds, slow_queries, startup_seconds)
+
+# Последние медленные запросы: (секунды, текст запроса)
+slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+# Числа в callback_data (ID пользователей, ключи страниц) заменяются на "*"
+NUMBER_RE = re.compile(r"-?\d+(\.\d+)?(e[-+]?\d+)?")
+
+
+def callback_route(callback):
+    # Маршрут нажатия кнопки: "remove_yes_123" -> "remove_yes_*", "gs:h:n:12.5:7" -> "gs:h:n:*:*"
+    return "cb:" + NUMBER_RE.sub("*", callback.data or "")
+
+
+def message_route(message):
+    # Маршрут сообщения: команда без аргументов и имени бота ("/dell") или "message"
+    text = message.text or ""
+    if text.startswith("/"):
+        return text.split()[0].split("@")[0]
+    return "message"
+
+
+def timed(func, route):
+    # Обертка обработчика: время выполнения по маршруту route(update) и количество ошибок
+    def wrapper(update, *args, **kwargs):
+        name = route(update)
+        started = time.perf_counter()
+        try:
+            return func(update, *args, **kwargs)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_seconds.observe(name, time.perf_counter() - started)
+
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def instrument_bot(bot):
+    # Оборачиваем все зарегистрированные обработчики сообщений и кнопок
+    # Вызывается после объявления всех обработчиков
+    for handler in bot.message_handlers:
+        handler["function"] = timed(handler["function"], message_route)
+    for handler in bot.callback_query_handlers:
+        handler["function"] = timed(handler["function"], callback_route)
+
+
+def instrument_api():
+    # Засекаем время каждого запроса к Bot API (все методы telebot идут через _make_request)
+    original = apihelper._make_request
+    if getattr(original, "instrumented", False):
+        return
+
+    def make_request(token, method_name, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(token, method_name, *args, **kwargs)
+        except Exception:
+            api_errors.inc(method_name)
+            raise
+        finally:
+            api_seconds.observe(method_name, time.perf_counter() - started)
+
+    make_request.instrumented = True
+    apihelper._make_request = make_request
+
+
+def observe_sql(sql, seconds):
+    # Записываем время SQL-запроса; вид запроса - первое слово (SELECT, INSERT, COMMIT...)
+    words = sql.split(None, 1)
+    statement = words[0].upper() if words else ""
+    sql_seconds.observe(statement, seconds)
+    if seconds >= SLOW_QUERY:
+        slow_queries.inc(statement)
+        slow_log.append((seconds, " ".join(sql.split())[:200]))
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Курсор, который засекает время execute/executemany
+    # (время чтения строк через fetch* не учитывается)
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    # Соединение, все курсоры которого - TimedCursor
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(path, **kwargs):
+    # sqlite3.connect() с замером времени всех запросов
+    return sqlite3.connect(path, factory=TimedConnection, **kwargs)
+
+
+def render():
+    # Все метрики в текстовом формате Prometheus
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def create_server(host, port):
+    # HTTP-сервер метрик: GET /metrics в формате Prometheus
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Опрос метрик каждые несколько секунд не пишем в журнал
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(host, port):
+    # Запускаем сервер метрик в фоновом потоке
+    server = create_server(host, port)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,306 @@
+# Модуль очереди исходящих сообщений с ограничением скорости
+# Обработчики не ждут ответа Telegram: send_message / edit_message_text / reply_to
+# ставят запрос в очередь и сразу возвращаются. Запросы отправляют потоки-отправители.
+# Скорость ограничена "ведрами токенов": общим для бота и отдельным для каждого чата
+# (лимиты Telegram - около 30 сообщений в секунду на бота, 1 в секунду в личный чат
+# и 20 в минуту в группу). Если Telegram все же ответил 429, чат ставится на паузу
+# на retry_after секунд, и запрос повторяется.
+# Запросы одного чата отправляются строго по очереди. Если в очереди уже есть
+# неотправленное изменение того же сообщения, новое изменение заменяет его.
+# Ответы на нажатия кнопок идут отдельной очередью без лимитов и пауз: Telegram
+# принимает ответ только несколько секунд после нажатия
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from telebot.apihelper import ApiTelegramException
+
+
+logger = logging.getLogger(__name__)
+
+# Количество потоков-отправителей
+WORKERS = 4
+
+# Общий лимит бота: сообщений в секунду
+GLOBAL_RATE = 30
+
+# Лимит личного чата: сообщений в секунду и запас для коротких всплесков
+CHAT_RATE = 1
+CHAT_BURST = 3
+
+# Лимит группы (chat_id < 0): 20 сообщений в минуту
+GROUP_RATE = 20 / 60
+
+# Сколько раз повторять запрос после 429 или ошибки сети
+MAX_RETRIES = 5
+
+# Пауза перед повтором после ошибки сети, секунд
+RETRY_DELAY = 1
+
+# Когда ведер чатов становится больше, неактивные полные ведра удаляются
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        # Сколько секунд ждать до свободного токена (0 - можно отправлять)
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class Job:
+    def __init__(self, method, args, kwargs, limited, key):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        # limited=False - запрос не расходует токены
+        self.limited = limited
+        # Ключ изменяемого сообщения для замены устаревших изменений или None
+        self.key = key
+        self.attempts = 0
+        self.queued = time.monotonic()
+
+
+class Outbox:
+    def __init__(self, bot, workers=WORKERS, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, group_rate=GROUP_RATE):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+
+        self.lock = threading.Condition()
+        # chat_id -> очередь запросов чата
+        self.queues = {}
+        # chat_id -> ведро токенов чата
+        self.buckets = {}
+        # chat_id -> до какого времени чат на паузе после 429
+        self.paused = {}
+        # Чаты, готовые к отправке: куча (когда можно отправлять, порядковый номер, chat_id)
+        self.ready = []
+        self.scheduled = set()
+        # Чаты, запрос которых сейчас отправляется
+        self.busy = set()
+        self.order = itertools.count()
+        # Ответы на нажатия кнопок: отправляются раньше запросов чатов, без лимитов
+        self.answers = deque()
+        self.stopping = False
+
+        # Статистика для мониторинга
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+        self.wait_total = 0.0
+
+        self.threads = [threading.Thread(target=self._run, name=f"outbox-{index}", daemon=True)
+                        for index in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    # send_message, reply_to и edit_message_text - с теми же аргументами, что и у telebot.TeleBot
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.submit(chat_id, "send_message", (chat_id, text), kwargs)
+
+    def reply_to(self, message, text, **kwargs):
+        self.submit(message.chat.id, "reply_to", (message, text), kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.submit(chat_id, "edit_message_text", (text,),
+                    dict(kwargs, chat_id=chat_id, message_id=message_id), key=message_id)
+
+    def answer_callback(self, callback, **kwargs):
+        # Ответ на нажатие не считается сообщением: он не ждет очереди чата, лимитов
+        # и паузы после 429, иначе при длинной очереди чата опоздает ("query is too old")
+        # и кнопка так и останется с часиками
+        with self.lock:
+            self.answers.append(Job("answer_callback_query", (callback.id,), kwargs, False, None))
+            self.lock.notify()
+
+    def submit(self, chat_id, method, args, kwargs, limited=True, key=None):
+        # Поставить вызов bot.<method>(*args, **kwargs) в очередь чата chat_id
+        job = Job(method, args, kwargs, limited, key)
+        with self.lock:
+            queue = self.queues.setdefault(chat_id, deque())
+            if key is not None:
+                # Неотправленное изменение того же сообщения уже не нужно - заменяем его
+                for index, queued in enumerate(queue):
+                    if queued.key == key and queued.method == method:
+                        job.queued = queued.queued
+                        queue[index] = job
+                        self.coalesced += 1
+                        return
+            queue.append(job)
+            if chat_id not in self.busy and chat_id not in self.scheduled:
+                self._schedule(chat_id, time.monotonic())
+            if len(self.buckets) > MAX_BUCKETS:
+                self._prune(time.monotonic())
+
+    def close(self):
+        # Дожидаемся отправки всех запросов и останавливаем потоки
+        with self.lock:
+            self.stopping = True
+            self.lock.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        # Статистика очереди для мониторинга
+        with self.lock:
+            return {
+                "queued": sum(len(queue) for queue in self.queues.values()) + len(self.answers),
+                "chats": len(self.queues),
+                "sent": self.sent,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "errors": self.errors,
+                "avg_wait_ms": self.wait_total / self.sent * 1000 if self.sent else 0,
+            }
+
+    def _bucket(self, chat_id):
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id is not None and chat_id < 0 else self.chat_rate
+            bucket = self.buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _schedule(self, chat_id, now):
+        # Ставим чат в кучу готовых: когда первый запрос очереди можно будет отправить
+        ready_at = max(now, self.paused.get(chat_id, 0))
+        if self.queues[chat_id][0].limited:
+            ready_at = max(ready_at, now + self._bucket(chat_id).delay(now))
+        heapq.heappush(self.ready, (ready_at, next(self.order), chat_id))
+        self.scheduled.add(chat_id)
+        self.lock.notify()
+
+    def _prune(self, now):
+        # Удаляем ведра и паузы неактивных чатов, чьи ведра уже полностью пополнились
+        for chat_id in [chat_id for chat_id, bucket in self.buckets.items()
+                        if chat_id not in self.queues and bucket.full(now)]:
+            del self.buckets[chat_id]
+        for chat_id in [chat_id for chat_id, until in self.paused.items() if until <= now]:
+            del self.paused[chat_id]
+
+    def _take(self):
+        # Ждем чат, запрос которого можно отправить, и забираем этот запрос
+        # Возвращает (chat_id, запрос) или None при остановке; для ответа на нажатие chat_id - None
+        with self.lock:
+            while True:
+                if self.answers:
+                    return None, self.answers.popleft()
+                if not self.ready:
+                    if self.stopping and not self.busy:
+                        return None
+                    self.lock.wait(1 if self.stopping else None)
+                    continue
+
+                ready_at, _, chat_id = self.ready[0]
+                job = self.queues[chat_id][0]
+                now = time.monotonic()
+                wait = ready_at - now
+                if job.limited:
+                    wait = max(wait, self.global_bucket.delay(now))
+                if wait > 0:
+                    self.lock.wait(wait)
+                    continue
+
+                heapq.heappop(self.ready)
+                self.scheduled.discard(chat_id)
+                if job.limited:
+                    # Токен чата мог закончиться после постановки в кучу
+                    bucket = self._bucket(chat_id)
+                    if bucket.delay(now) > 0:
+                        self._schedule(chat_id, now)
+                        continue
+                    bucket.take(now)
+                    self.global_bucket.take(now)
+                self.queues[chat_id].popleft()
+                self.busy.add(chat_id)
+                return chat_id, job
+
+    def _done(self, chat_id, job, retry_after=None):
+        # Запрос отправлен (или повторится позже) - ставим чат в очередь снова
+        with self.lock:
+            self.busy.discard(chat_id)
+            now = time.monotonic()
+            if retry_after is not None:
+                self.queues[chat_id].appendleft(job)
+                self.paused[chat_id] = now + retry_after
+            if self.queues[chat_id]:
+                self._schedule(chat_id, now)
+            else:
+                del self.queues[chat_id]
+            self.lock.notify_all()
+
+    def _answered(self, job, retry_after=None):
+        # Ответ на нажатие отправлен или повторится - сразу, без паузы после 429:
+        # позже он уже не нужен
+        if retry_after is not None:
+            with self.lock:
+                self.answers.append(job)
+                self.lock.notify()
+
+    def _run(self):
+        while True:
+            taken = self._take()
+            if taken is None:
+                return
+            chat_id, job = taken
+            retry_after = None
+            try:
+                getattr(self.bot, job.method)(*job.args, **job.kwargs)
+                with self.lock:
+                    self.sent += 1
+                    self.wait_total += time.monotonic() - job.queued
+            except ApiTelegramException as error:
+                job.attempts += 1
+                if error.error_code == 429 and job.attempts < MAX_RETRIES:
+                    # Слишком много запросов: ждем столько, сколько сказал Telegram
+                    retry_after = error.result_json.get("parameters", {}).get("retry_after", RETRY_DELAY)
+                    with self.lock:
+                        self.retries += 1
+                elif "message is not modified" in error.description:
+                    # Тот же текст и клавиатура (повторное нажатие) - не ошибка
+                    pass
+                else:
+                    with self.lock:
+                        self.errors += 1
+                    logger.warning("Не удалось выполнить %s для чата %s: %s", job.method, chat_id, error)
+            except Exception:
+                job.attempts += 1
+                if job.attempts < MAX_RETRIES:
+                    # Ошибка сети - повторим после паузы
+                    retry_after = RETRY_DELAY
+                    with self.lock:
+                        self.retries += 1
+                else:
+                    with self.lock:
+                        self.errors += 1
+                    logger.exception("Не удалось выполнить %s для чата %s", job.method, chat_id)
+            if chat_id is None:
+                self._answered(job, retry_after)
+            else:
+                self._done(chat_id, job, retry_after)
@@ -0,0 +1,271 @@
+# Модуль ставок: рублей в час с датой начала действия (таблица rates)
+# Ставка бывает общей (user_id = 0) и личной для сотрудника. Личная ставка
+# действует с даты ее начала и важнее общей. Смена оплачивается по ставке,
+# действовавшей в момент ее начала.
+# Ставки хранятся в памяти (словарь user_id -> списки дат и ставок), поэтому
+# "Закончить" не читает таблицу rates. Изменение ставки задним числом
+# пересчитывает many всех затронутых смен одним векторным проходом NumPy.
+# Если изменение ставки не будет зафиксировано в базе, словарь возвращается
+# к прежним ставкам (writer.on_rollback)
+import bisect
+import threading
+from datetime import datetime
+
+import writer
+
+
+# Ставка по умолчанию: рублей в час
+DEFAULT_RATE = 400
+
+# user_id общей ставки
+ALL_USERS = 0
+
+# Ставки: первичный ключ (user_id, since_ts) - история ставок сотрудника по порядку
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS rates (
+    user_id INTEGER NOT NULL,
+    since_ts INTEGER NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (user_id, since_ts)
+) WITHOUT ROWID"""
+
+# Индекс смен по сотруднику и началу смены: личная ставка пересчитывает только смены
+# этого сотрудника (AFFECTED_SQL + user_id). start_ts записывается один раз при начале смены,
+# поэтому окончание смены и пересчет many индекс не обновляют
+INDEX_SQL = """CREATE INDEX IF NOT EXISTS idx_work_user_start_ts ON work (user_id, start_ts)"""
+
+# Смены, которые пересчитываются при изменении ставки: завершенные, начатые не раньше даты
+AFFECTED_SQL = """
+    SELECT id, user_id, start_ts, end_ts, many
+    FROM work
+    WHERE start_ts >= ? AND end_ts IS NOT NULL
+"""
+
+# Ставки в памяти: user_id -> (список since_ts по возрастанию, список ставок)
+history = {}
+
+# Блокировка словаря: его заменяет поток-писатель при изменении ставки (set_rate -> load),
+# а читают обработчики (current, listing) и расчет оплаты смены (rate_for)
+lock = threading.Lock()
+
+
+def create_table(cursor):
+    # Создаем таблицу ставок; при первом запуске - с общей ставкой по умолчанию
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute("""INSERT OR IGNORE INTO rates (user_id, since_ts, rate) VALUES (?, 0, ?)""",
+                   (ALL_USERS, DEFAULT_RATE))
+
+
+def create_index(cursor):
+    # Создаем индекс смен по сотруднику и началу смены
+    cursor.execute(INDEX_SQL)
+
+
+def load(cursor):
+    # Заполняем словарь ставок из базы (при запуске бота и после изменения ставок)
+    cursor.execute("""SELECT user_id, since_ts, rate FROM rates ORDER BY user_id, since_ts""")
+    loaded = {}
+    for user_id, since_ts, rate in cursor.fetchall():
+        dates, values = loaded.setdefault(user_id, ([], []))
+        dates.append(since_ts)
+        values.append(rate)
+    with lock:
+        previous = dict(history)
+        history.clear()
+        history.update(loaded)
+        count = len(history)
+    writer.on_rollback(lambda: _replace(previous))
+    return count
+
+
+def _replace(loaded):
+    # Заменяем ставки в памяти на loaded (отмена load, если запись не зафиксирована)
+    with lock:
+        history.clear()
+        history.update(loaded)
+
+
+def _lookup(user_id, ts):
+    # Ставка из истории user_id на момент ts или None (вызывается под блокировкой)
+    dates, values = history.get(user_id, ((), ()))
+    index = bisect.bisect_right(dates, ts) - 1
+    return values[index] if index >= 0 else None
+
+
+def rate_for(user_id, ts):
+    # Ставка сотрудника на момент ts (секунды epoch): личная, иначе общая
+    with lock:
+        rate = _lookup(user_id, ts)
+        if rate is None:
+            rate = _lookup(ALL_USERS, ts)
+    return DEFAULT_RATE if rate is None else rate
+
+
+def current(user_id):
+    # Действующая сейчас ставка сотрудника
+    return rate_for(user_id, int(datetime.now().timestamp()))
+
+
+def listing():
+    # Действующие сейчас ставки: (общая ставка, список (user_id, ставка) личных ставок)
+    now = int(datetime.now().timestamp())
+    with lock:
+        users = sorted(user_id for user_id in history if user_id != ALL_USERS)
+    personal = [(user_id, rate_for(user_id, now)) for user_id in users]
+    return rate_for(ALL_USERS, now), personal
+
+
+def read_personal(cursor, user_ids):
+    # Действующие сейчас личные ставки сотрудников user_ids из таблицы rates базы cursor:
+    # словарь user_id -> ставка (сотрудники без личной ставки не попадают в словарь)
+    # Нужна для пользователей другого шарда - их ставок нет в памяти этого процесса
+    if not user_ids:
+        return {}
+    placeholders = ", ".join("?" * len(user_ids))
+    cursor.execute(f"""
+        SELECT user_id, rate FROM rates
+        WHERE user_id IN ({placeholders}) AND since_ts <= ?
+        ORDER BY user_id, since_ts
+    """, (*user_ids, int(datetime.now().timestamp())))
+    # Строки идут по возрастанию since_ts - последняя для сотрудника действует сейчас
+    return dict(cursor.fetchall())
+
+
+def calculate(user_ids, start_ts, seconds):
+    # Векторный расчет денег за смены: массивы NumPy user_id, начала смены и длительности
+    # Ставка каждой смены ищется двоичным поиском (np.searchsorted) по истории ставок:
+    # сначала общая ставка для всех смен, затем личные ставки для смен этих сотрудников
+    # Возвращает массив денег, округленных до копеек
+    import numpy as np
+
+    with lock:
+        snapshot = {user_id: (np.array(dates, dtype=np.int64), np.array(values, dtype=np.float64))
+                    for user_id, (dates, values) in history.items()}
+
+    rate = np.full(len(start_ts), float(DEFAULT_RATE))
+    if ALL_USERS in snapshot:
+        dates, values = snapshot.pop(ALL_USERS)
+        index = np.searchsorted(dates, start_ts, side="right") - 1
+        rate = np.where(index >= 0, values[np.maximum(index, 0)], rate)
+
+    if snapshot:
+        # Смены по сотрудникам: после сортировки смены одного сотрудника идут подряд
+        order = np.argsort(user_ids, kind="stable")
+        sorted_users = user_ids[order]
+        for user_id, (dates, values) in snapshot.items():
+            first = np.searchsorted(sorted_users, user_id, side="left")
+            last = np.searchsorted(sorted_users, user_id, side="right")
+            if first == last:
+                continue
+            positions = order[first:last]
+            index = np.searchsorted(dates, start_ts[positions], side="right") - 1
+            rate[positions] = np.where(index >= 0, values[np.maximum(index, 0)], rate[positions])
+
+    return np.round(seconds / 3600 * rate, 2)
+
+
+def recompute(cursor, since_ts, user_id=None):
+    # Пересчитываем many завершенных смен, начатых с since_ts (только текущий период -
+    # архивы закрытых периодов уже выплачены и не меняются), и итоги по ним
+    # user_id - только смены этого сотрудника, None - смены всех
+    # Вызывается в транзакции потока-писателя после изменения ставок в памяти
+    # Возвращает количество смен, у которых изменилась сумма
+    import numpy as np
+
+    sql, params = AFFECTED_SQL, (since_ts,)
+    if user_id is not None:
+        sql, params = sql + " AND user_id = ?", (since_ts, user_id)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    ids, user_ids, start_ts, end_ts, many = zip(*rows)
+    ids = np.array(ids, dtype=np.int64)
+    user_ids = np.array(user_ids, dtype=np.int64)
+    start_ts = np.array(start_ts, dtype=np.int64)
+    end_ts = np.array(end_ts, dtype=np.int64)
+    old = np.nan_to_num(np.array(many, dtype=np.float64))
+
+    # Деньги - по точному времени смены, как при ее завершении
+    new = calculate(user_ids, start_ts, end_ts - start_ts)
+    changed = np.flatnonzero(np.abs(new - old) >= 0.005)
+    if not len(changed):
+        return 0
+    ids, user_ids, start_ts, end_ts = ids[changed], user_ids[changed], start_ts[changed], end_ts[changed]
+    old, new = old[changed], new[changed]
+
+    cursor.executemany("""UPDATE work SET many = ? WHERE id = ?""", zip(new.tolist(), ids.tolist()))
+
+    # Итоги пользователей: сумма разниц по сотруднику
+    users, inverse = np.unique(user_ids, return_inverse=True)
+    sums = np.bincount(inverse, weights=new - old)
+    cursor.executemany("""UPDATE user_totals SET money = ROUND(money + ?, 2) WHERE user_id = ?""",
+                       zip(sums.tolist(), users.tolist()))
+
+    # Итоги по дням: сумма разниц кусков смен по (день, сотрудник)
+    days, piece_users, deltas = split_deltas(user_ids, start_ts, end_ts, old, new)
+    users, user_index = np.unique(piece_users, return_inverse=True)
+    keys, inverse = np.unique(days * len(users) + user_index, return_inverse=True)
+    sums = np.bincount(inverse, weights=deltas)
+    day_names = (keys // len(users)).astype("datetime64[D]").astype(str)
+    cursor.executemany("""UPDATE daily_totals SET money = ROUND(money + ?, 2) WHERE day = ? AND user_id = ?""",
+                       zip(sums.tolist(), day_names.tolist(), users[keys % len(users)].tolist()))
+    return len(changed)
+
+
+def utc_offsets(ts):
+    # Смещение местного времени от UTC (секунды) для массива моментов времени
+    # Переход на летнее время бывает на границе часа, поэтому смещение
+    # узнается один раз для каждого часа, а не для каждой смены
+    import numpy as np
+
+    hours, inverse = np.unique(ts // 3600, return_inverse=True)
+    offsets = np.array([datetime.fromtimestamp(hour * 3600).astimezone().utcoffset().total_seconds()
+                        for hour in hours.tolist()], dtype=np.int64)
+    return offsets[inverse]
+
+
+def split_deltas(user_ids, start_ts, end_ts, old, new):
+    # Векторный вариант rollups.split_shift для разницы старой и новой суммы смен:
+    # смены делятся по местным суткам, деньги - пропорционально времени в каждом дне,
+    # последний день получает остаток. За один проход цикла от всех еще не разделенных
+    # смен отрезается по одному дню, поэтому проходов столько, сколько дней в самой длинной смене
+    # Возвращает массивы (номер дня от 1970-01-01, user_id, разница денег) по кускам смен
+    import numpy as np
+
+    days, users, deltas = [], [], []
+    index = np.arange(len(start_ts))
+    current = start_ts
+    old_left, new_left = old, new
+    while len(index):
+        end = end_ts[index]
+        offset = utc_offsets(current)
+        day = (current + offset) // 86400
+        next_day = (day + 1) * 86400
+        midnight = next_day - utc_offsets(next_day - offset)
+        piece_end = np.minimum(midnight, end)
+        last = piece_end >= end
+
+        share = (piece_end - current) / np.maximum(end - start_ts[index], 1)
+        old_piece = np.where(last, np.round(old_left, 2), np.round(old[index] * share, 2))
+        new_piece = np.where(last, np.round(new_left, 2), np.round(new[index] * share, 2))
+        days.append(day)
+        users.append(user_ids[index])
+        deltas.append(new_piece - old_piece)
+
+        keep = ~last
+        index, current = index[keep], piece_end[keep]
+        old_left, new_left = (old_left - old_piece)[keep], (new_left - new_piece)[keep]
+    return np.concatenate(days), np.concatenate(users), np.concatenate(deltas)
+
+
+def set_rate(cursor, user_id, rate, since_ts):
+    # Ставка rate для user_id (ALL_USERS - общая) с момента since_ts, в том числе задним числом
+    # Более поздние изменения ставки того же сотрудника отменяются: с since_ts действует rate.
+    # Для общей ставки личные ставки сотрудников не меняются.
+    # Выполняется в потоке-писателе; возвращает количество пересчитанных смен
+    cursor.execute("""DELETE FROM rates WHERE user_id = ? AND since_ts >= ?""", (user_id, since_ts))
+    cursor.execute("""INSERT INTO rates (user_id, since_ts, rate) VALUES (?, ?, ?)""",
+                   (user_id, since_ts, rate))
+    load(cursor)
+    return recompute(cursor, since_ts, None if user_id == ALL_USERS else user_id)
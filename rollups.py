@@ -0,0 +1,170 @@
+# Модуль итогов по дням (таблица daily_totals)
+# Для каждого пользователя и каждого дня хранятся смены, часы и деньги.
+# Итоги за неделю и месяц считаются суммой по дням, без чтения таблицы work.
+# Смена, которая переходит через полночь, делится между днями пропорционально времени
+from datetime import date, datetime, time, timedelta
+
+
+# Итоги по дням: день в формате ГГГГ-ММ-ДД (по локальному времени)
+# Первичный ключ начинается с дня, чтобы итоги за период читались поиском по диапазону
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    hours REAL NOT NULL DEFAULT 0,
+    money REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+) WITHOUT ROWID"""
+
+# Периоды для кнопок статистики
+PERIODS = ("day", "week", "month")
+
+# Сколько смен читать из базы за один раз при пересчете
+FETCH_SIZE = 1000
+
+
+def create_table(cursor):
+    # Создаем таблицу итогов по дням
+    # Если таблицы еще не было - сразу заполняем ее по истории из work
+    cursor.execute("""SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_totals'""")
+    existed = cursor.fetchone() is not None
+    cursor.execute(CREATE_TABLE_SQL)
+    if not existed:
+        rebuild(cursor)
+
+
+def split_shift(start_ts, end_ts, hours, money):
+    # Делим смену по календарным дням (граница - полночь по локальному времени)
+    # Часы и деньги делятся пропорционально времени в каждом дне,
+    # последний день получает остаток, чтобы сумма точно совпала с итогом смены.
+    # Смена засчитывается в день, когда она началась.
+    # Возвращает список (день, смены, часы, деньги)
+    pieces = []
+    current = start_ts
+    while True:
+        day = datetime.fromtimestamp(current).date()
+        midnight = int(datetime.combine(day + timedelta(days=1), time()).timestamp())
+        piece_end = min(midnight, end_ts)
+        pieces.append((day.isoformat(), piece_end - current))
+        if piece_end >= end_ts:
+            break
+        current = piece_end
+
+    total_seconds = end_ts - start_ts
+    result = []
+    hours_left, money_left = hours, money
+    for index, (day, seconds) in enumerate(pieces):
+        if index == len(pieces) - 1:
+            piece_hours, piece_money = round(hours_left, 2), round(money_left, 2)
+        else:
+            share = seconds / total_seconds
+            piece_hours, piece_money = round(hours * share, 2), round(money * share, 2)
+            hours_left -= piece_hours
+            money_left -= piece_money
+        result.append((day, 1 if index == 0 else 0, piece_hours, piece_money))
+    return result
+
+
+def add_shift(cursor, user_id, start_ts, end_ts, hours, money):
+    # Добавляем завершенную смену к итогам по дням
+    # Вызывается в той же транзакции, что и UPDATE work SET end_ts...
+    cursor.executemany("""
+        INSERT INTO daily_totals (day, user_id, sessions, hours, money)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (day, user_id) DO UPDATE SET
+            sessions = sessions + excluded.sessions,
+            hours = ROUND(hours + excluded.hours, 2),
+            money = ROUND(money + excluded.money, 2)
+    """, [(day, user_id, sessions, piece_hours, piece_money)
+          for day, sessions, piece_hours, piece_money in split_shift(start_ts, end_ts, hours, money)])
+
+
+def remove_user(cursor, user_id):
+    # Удаляем итоги пользователя по дням
+    cursor.execute("""DELETE FROM daily_totals WHERE user_id = ?""", (user_id,))
+
+
+def clear(cursor):
+    # Удаляем итоги по дням всех пользователей
+    cursor.execute("""DELETE FROM daily_totals""")
+
+
+def rebuild(cursor):
+    # Пересчитываем итоги по дням из всей истории смен в таблице work
+    # Возвращает количество учтенных смен
+    buckets = {}
+    count = collect(cursor, buckets)
+    store(cursor, buckets)
+    return count
+
+
+def collect(cursor, buckets, table="work", skip_removed=False):
+    # Добавляем завершенные смены из таблицы table к итогам buckets
+    # ((день, user_id) -> [смены, часы, деньги]); table может быть архивом периода
+    # skip_removed - пропускать смены, завершенные до удаления сотрудника через /dell
+    # (таблица removed_users, см. archive.py)
+    # Смены читаются порциями, в памяти - только итоги (пользователей x дней)
+    # Возвращает количество учтенных смен
+    count = 0
+    removed = ""
+    if skip_removed:
+        removed = """AND NOT EXISTS (SELECT 1 FROM main.removed_users r
+                                     WHERE r.user_id = w.user_id AND w.end_ts <= r.removed_ts)"""
+    cursor.execute(f"""
+        SELECT user_id, start_ts, end_ts, hours, many
+        FROM {table} AS w
+        WHERE end_ts IS NOT NULL AND start_ts IS NOT NULL AND hours IS NOT NULL
+        {removed}
+    """)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for user_id, start_ts, end_ts, hours, many in rows:
+            count += 1
+            for day, sessions, piece_hours, piece_money in split_shift(start_ts, end_ts, hours, many or 0):
+                bucket = buckets.setdefault((day, user_id), [0, 0.0, 0.0])
+                bucket[0] += sessions
+                bucket[1] += piece_hours
+                bucket[2] += piece_money
+    return count
+
+
+def store(cursor, buckets):
+    # Заменяем содержимое daily_totals итогами из collect()
+    cursor.execute("""DELETE FROM daily_totals""")
+    cursor.executemany("""INSERT INTO daily_totals (day, user_id, sessions, hours, money) VALUES (?, ?, ?, ?, ?)""",
+                       [(day, user_id, sessions, round(hours, 2), round(money, 2))
+                        for (day, user_id), (sessions, hours, money) in buckets.items()])
+
+
+def period_bounds(period, today=None):
+    # Границы периода: (первый день, день после последнего) в формате ГГГГ-ММ-ДД
+    # day - сегодня, week - с понедельника текущей недели, month - с 1 числа
+    today = today or date.today()
+    if period == "week":
+        first = today - timedelta(days=today.weekday())
+    elif period == "month":
+        first = today.replace(day=1)
+    else:
+        first = today
+    return first.isoformat(), (today + timedelta(days=1)).isoformat()
+
+
+def period_stats(cursor, first_day, next_day):
+    # Итоги всех пользователей за период [first_day, next_day) - только из daily_totals
+    # Возвращает список (user_id, name, смены, часы, деньги) по убыванию часов
+    cursor.execute("""
+        SELECT d.user_id, t.name, SUM(d.sessions), ROUND(SUM(d.hours), 2), ROUND(SUM(d.money), 2)
+        FROM daily_totals d
+        LEFT JOIN user_totals t ON t.user_id = d.user_id
+        WHERE d.day >= ? AND d.day < ?
+        GROUP BY d.user_id
+        ORDER BY 4 DESC, d.user_id
+    """, (first_day, next_day))
+    return cursor.fetchall()
+
+
+def merge_period_stats(results):
+    # Итоги за период нескольких шардов в одном списке (по убыванию часов, как period_stats)
+    return sorted((row for rows in results for row in rows), key=lambda row: (-row[3], row[0]))
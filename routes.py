@@ -0,0 +1,66 @@
+# Модуль маршрутизации нажатий кнопок: callback_data -> обработчик
+# Маршрут - либо точное значение ("start"), либо префикс с параметром:
+# "gs:" (параметр - все после первого ":") или "remove_yes_" (параметр - после последнего "_").
+# Поиск обработчика - не больше трех обращений к словарям, без перебора всех маршрутов
+
+
+class Router:
+    def __init__(self):
+        # callback_data -> обработчик(callback)
+        self.exact = {}
+        # Префикс (заканчивается на ":" или "_") -> обработчик(callback, параметр)
+        self.prefixes = {}
+
+    def route(self, data):
+        # Декоратор обработчика для точного значения callback_data
+        def register(handler):
+            if data in self.exact:
+                raise ValueError(f"Маршрут {data!r} уже зарегистрирован")
+            self.exact[data] = handler
+            return handler
+
+        return register
+
+    def prefix(self, prefix):
+        # Декоратор обработчика для callback_data вида префикс + параметр
+        if not prefix.endswith((":", "_")):
+            raise ValueError(f"Префикс {prefix!r} должен заканчиваться на ':' или '_'")
+
+        def register(handler):
+            if prefix in self.prefixes:
+                raise ValueError(f"Префикс {prefix!r} уже зарегистрирован")
+            self.prefixes[prefix] = handler
+            return handler
+
+        return register
+
+    def resolve(self, data):
+        # (обработчик, параметр) для callback_data; параметр None - точный маршрут
+        # Возвращает (None, None), если маршрута нет
+        handler = self.exact.get(data)
+        if handler is not None:
+            return handler, None
+
+        head, separator, _ = data.partition(":")
+        if separator:
+            handler = self.prefixes.get(head + ":")
+            if handler is not None:
+                return handler, data[len(head) + 1:]
+
+        head, separator, param = data.rpartition("_")
+        if separator:
+            handler = self.prefixes.get(head + "_")
+            if handler is not None:
+                return handler, param
+        return None, None
+
+    def dispatch(self, callback):
+        # Вызываем обработчик нажатия; возвращает False, если маршрут не найден
+        handler, param = self.resolve(callback.data or "")
+        if handler is None:
+            return False
+        if param is None:
+            handler(callback)
+        else:
+            handler(callback, param)
+        return True
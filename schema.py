@@ -0,0 +1,116 @@
+# Модуль схемы базы данных и ее миграций
+# Время смен хранится в целых секундах (unix epoch) в колонках start_ts и end_ts.
+# Строки start_time/end_time ("день-месяц-год, час:минута") остаются только для отображения
+from datetime import datetime
+
+
+# Формат строкового времени в колонках start_time и end_time
+TIME_FORMAT = "%d-%m-%Y, %H:%M"
+
+# Таблица для хранения данных о рабочих сменах
+# IF NOT EXISTS - создаем таблицу только если она еще не существует
+WORK_TABLE_SQL = """CREATE TABLE IF NOT EXISTS work (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    name TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    hours REAL,
+    many REAL,
+    workout_date TEXT DEFAULT (DATETIME('now', 'localtime')),
+    start_ts INTEGER,
+    end_ts INTEGER
+)"""
+
+# Индексы по времени для выборок за период (поиск по диапазону, а не полный перебор)
+TIME_INDEXES_SQL = [
+    """CREATE INDEX IF NOT EXISTS idx_work_start_ts ON work (start_ts)""",
+    """CREATE INDEX IF NOT EXISTS idx_work_end_ts ON work (end_ts)""",
+]
+
+# Индексы, построенные по строковым колонкам времени - заменены индексами по *_ts
+OBSOLETE_INDEXES = ["idx_work_user_end", "idx_work_open"]
+
+# Сколько строк переводим в epoch за одну транзакцию
+BATCH_SIZE = 1000
+
+
+def to_ts(time_str):
+    # Строка "день-месяц-год, час:минута" -> секунды epoch (по локальному времени)
+    # Возвращает None, если строка пустая или в неверном формате
+    if not time_str:
+        return None
+    try:
+        return int(datetime.strptime(time_str, TIME_FORMAT).timestamp())
+    except ValueError:
+        return None
+
+
+def to_str(ts):
+    # Секунды epoch -> строка "день-месяц-год, час:минута" для сообщений
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT)
+
+
+def create_work_table(cursor):
+    # Создаем таблицу смен и индексы по времени
+    cursor.execute(WORK_TABLE_SQL)
+    for index_sql in TIME_INDEXES_SQL:
+        cursor.execute(index_sql)
+
+
+def migrate(dp):
+    # Переводим старую базу на колонки start_ts/end_ts
+    # Возвращает количество заполненных строк
+    cursor = dp.cursor()
+    cursor.execute(WORK_TABLE_SQL)
+
+    # 1. Добавляем новые колонки, если их нет
+    cursor.execute("""PRAGMA table_info(work)""")
+    columns = [row[1] for row in cursor.fetchall()]
+    for column in ("start_ts", "end_ts"):
+        if column not in columns:
+            cursor.execute(f"""ALTER TABLE work ADD COLUMN {column} INTEGER""")
+
+    # 2. Удаляем индексы по строковым колонкам времени
+    for index_name in OBSOLETE_INDEXES:
+        cursor.execute(f"""DROP INDEX IF EXISTS {index_name}""")
+
+    # 3. В итогах last_shift раньше была строкой - итоги пересчитаются заново
+    cursor.execute("""PRAGMA table_info(user_totals)""")
+    if any(row[1] == "last_shift" and row[2] == "TEXT" for row in cursor.fetchall()):
+        cursor.execute("""DROP TABLE user_totals""")
+    dp.commit()
+
+    # 4. Заполняем start_ts/end_ts пачками, каждая пачка - отдельная транзакция
+    # Идем по id (keyset), чтобы не перечитывать строки с неверным форматом
+    filled = backfill(dp)
+
+    # 5. Индексы по времени создаем после заполнения - так быстрее
+    create_work_table(cursor)
+    dp.commit()
+    return filled
+
+
+def backfill(dp, batch_size=BATCH_SIZE):
+    # Заполняем start_ts/end_ts из строк start_time/end_time
+    cursor = dp.cursor()
+    filled = 0
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT id, start_time, end_time
+            FROM work
+            WHERE id > ? AND (start_ts IS NULL OR (end_ts IS NULL AND end_time IS NOT NULL))
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return filled
+
+        cursor.executemany("""UPDATE work SET start_ts = ?, end_ts = ? WHERE id = ?""",
+                           [(to_ts(start_time), to_ts(end_time), work_id)
+                            for work_id, start_time, end_time in rows])
+        dp.commit()
+        filled += len(rows)
+        last_id = rows[-1][0]
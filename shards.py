@@ -0,0 +1,351 @@
+# Модуль шардирования: пользователи распределяются по нескольким процессам
+# Входной процесс (диспетчер) получает обновления Telegram и по хешу user_id
+# передает каждое обновление "своему" процессу-обработчику. У каждого процесса
+# свой файл базы (ZenithTechTao.shard<номер>.db), свой поток-писатель и своя
+# очередь отправки, поэтому процессы не мешают друг другу и работают на разных ядрах.
+# Все обновления одного пользователя (и шаги /dell администратора) попадают в один процесс.
+# Админские экраны читают файлы всех шардов (режим WAL допускает чтение из других
+# процессов), а изменения в чужом шарде выполняет его процесс по запросу через очередь
+# (Cluster.call_all / Cluster.call_shard)
+# Запуск: python shards.py (количество процессов - SHARDS в config.py)
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+import archive
+
+
+logger = logging.getLogger(__name__)
+
+# Переменные окружения, через которые процесс-обработчик узнает свой шард
+SHARD_ENV = "WORKTIME_SHARD"
+SHARDS_ENV = "WORKTIME_SHARDS"
+
+# Длинный опрос getUpdates в диспетчере, секунд
+POLL_TIMEOUT = 20
+
+# Сколько обновлений забирать за один запрос getUpdates
+POLL_LIMIT = 100
+
+# Сколько секунд ждать ответа другого шарда
+CALL_TIMEOUT = 300
+
+# Виды обновлений, в которых есть отправитель (поле from)
+SENDER_FIELDS = ("message", "edited_message", "callback_query", "inline_query",
+                 "chosen_inline_result", "shipping_query", "pre_checkout_query",
+                 "my_chat_member", "chat_member", "chat_join_request")
+
+
+def shard_of(user_id, shards):
+    # Номер шарда пользователя; crc32 не зависит от запуска (в отличие от hash() строк)
+    return zlib.crc32(str(user_id).encode()) % shards
+
+
+def db_path(base, shard, shards):
+    # Файл базы шарда: ZenithTechTao.db -> ZenithTechTao.shard0.db (один шард - base)
+    if shards == 1:
+        return base
+    root, ext = os.path.splitext(base)
+    return f"{root}.shard{shard}{ext}"
+
+
+def update_user_id(update):
+    # ID отправителя обновления (словарь из getUpdates) или None
+    for field in SENDER_FIELDS:
+        sender = update.get(field, {}).get("from")
+        if sender:
+            return sender["id"]
+    return None
+
+
+def remove_other_users(dp, table, shard, shards):
+    # Удаляем из таблицы table строки пользователей других шардов
+    dp.create_function("shard_of", 2, shard_of, deterministic=True)
+    dp.execute(f"""DELETE FROM {table} WHERE shard_of(user_id, ?) != ?""", (shards, shard))
+
+
+def split_archive(source, path, shard, shards):
+    # Архив периода для шарда: копия архива source в path без смен чужих пользователей
+    # Возвращает итог периода по копии (смены, сотрудники, первая и последняя смена, часы, деньги)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    shutil.copyfile(source, path)
+    dp = sqlite3.connect(path)
+    remove_other_users(dp, "work", shard, shards)
+    summary = dp.execute(archive.SUMMARY_SQL.format(table="work")).fetchone()
+    dp.commit()
+    dp.execute("""VACUUM""")
+    dp.close()
+    return summary
+
+
+def split_database(base, shards, archive_dir=archive.ARCHIVE_DIR):
+    # Разделяем существующую базу одного процесса на файлы шардов
+    # Каждый шард - копия базы, из которой удалены чужие пользователи.
+    # Архивы закрытых периодов делятся так же: у каждого шарда в archive_dir/shard<номер>
+    # свои копии без чужих смен, а итоги периодов в pay_periods пересчитываются по ним,
+    # поэтому пересчет итогов по дням и /periods в каждом шарде видят только своих сотрудников.
+    # Итоги периодов, файл архива которых не найден, остаются только в шарде 0
+    # Возвращает список созданных файлов
+    paths = []
+    for shard in range(shards):
+        path = db_path(base, shard, shards)
+        if os.path.exists(path):
+            raise FileExistsError(path)
+        shutil.copyfile(base, path)
+        paths.append(path)
+
+        dp = sqlite3.connect(path)
+        for table in ("work", "user_totals", "daily_totals"):
+            remove_other_users(dp, table, shard, shards)
+        dp.execute("""DELETE FROM rates WHERE user_id != 0 AND shard_of(user_id, ?) != ?""", (shards, shard))
+        for period_id, source in dp.execute("""SELECT id, file FROM pay_periods""").fetchall():
+            if not os.path.exists(source):
+                if shard:
+                    dp.execute("""DELETE FROM pay_periods WHERE id = ?""", (period_id,))
+                continue
+            archive_path = os.path.join(archive_dir, f"shard{shard}", os.path.basename(source))
+            shifts_count, users_count, first_ts, last_ts, hours, money = split_archive(source, archive_path,
+                                                                                      shard, shards)
+            dp.execute("""
+                UPDATE pay_periods
+                SET first_ts = ?, last_ts = ?, shifts = ?, users = ?, hours = ?, money = ?, file = ?
+                WHERE id = ?
+            """, (first_ts, last_ts, shifts_count, users_count, hours, money, archive_path, period_id))
+            paths.append(archive_path)
+        dp.commit()
+        dp.execute("""VACUUM""")
+        dp.close()
+    return paths
+
+
+class Cluster:
+    # Связь процесса-обработчика с остальными шардами
+    # В обычном режиме (один процесс) все вызовы выполняются на месте
+    def __init__(self, shard=0, shards=1):
+        self.shard = shard
+        self.shards = shards
+        # Команды, которые могут вызывать другие шарды: имя -> функция
+        self.commands = {}
+        self.inboxes = None
+        self.replies = None
+        self.calls = itertools.count()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        # Шард текущего процесса из переменных окружения (их задает диспетчер)
+        return cls(int(os.environ.get(SHARD_ENV, 0)), int(os.environ.get(SHARDS_ENV, 1)))
+
+    def shard_of(self, user_id):
+        return shard_of(user_id, self.shards)
+
+    def db_paths(self, base):
+        # Файлы баз всех шардов по порядку
+        return [db_path(base, shard, self.shards) for shard in range(self.shards)]
+
+    def command(self, name):
+        # Декоратор: функция, которую можно вызвать на любом шарде по имени
+        def decorator(func):
+            self.commands[name] = func
+            return func
+        return decorator
+
+    def call_shard(self, shard, name, *args):
+        # Выполнить команду name на шарде shard и вернуть результат
+        return self.submit(shard, name, *args).result(CALL_TIMEOUT)
+
+    def call_all(self, name, *args):
+        # Выполнить команду name на всех шардах (параллельно); список результатов по шардам
+        futures = [self.submit(shard, name, *args) for shard in range(self.shards)]
+        return [future.result(CALL_TIMEOUT) for future in futures]
+
+    def submit(self, shard, name, *args):
+        # Отправить команду шарду; возвращает Future с результатом
+        future = Future()
+        if shard == self.shard:
+            try:
+                future.set_result(self.commands[name](*args))
+            except Exception as error:
+                future.set_exception(error)
+            return future
+
+        call_id = next(self.calls)
+        with self.lock:
+            self.pending[call_id] = future
+        self.inboxes[shard].put(("call", call_id, self.shard, name, args))
+        return future
+
+    def connect(self, inboxes, replies):
+        # Подключаем очереди команд всех шардов (в процессе-обработчике)
+        self.inboxes = inboxes
+        self.replies = replies
+        threading.Thread(target=self._receive_replies, name="shard-replies", daemon=True).start()
+
+    def serve(self, bot):
+        # Цикл процесса-обработчика: обновления от диспетчера и команды других шардов
+        # Завершается, когда диспетчер присылает None
+        from telebot import types
+
+        inbox = self.inboxes[self.shard]
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            if item[0] == "update":
+                bot.process_new_updates([types.Update.de_json(item[1])])
+            else:
+                # Команда может ждать потока-писателя - выполняем ее в отдельном потоке,
+                # чтобы обновления этого шарда не стояли в очереди
+                threading.Thread(target=self._execute, args=item[1:], daemon=True).start()
+
+    def _execute(self, call_id, caller, name, args):
+        try:
+            reply = (call_id, True, self.commands[name](*args))
+        except Exception as error:
+            logger.exception("Ошибка команды %s от шарда %s", name, caller)
+            reply = (call_id, False, repr(error))
+        self.replies[caller].put(reply)
+
+    def _receive_replies(self):
+        while True:
+            call_id, ok, result = self.replies[self.shard].get()
+            with self.lock:
+                future = self.pending.pop(call_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Ошибка на другом шарде: {result}"))
+
+
+def worker(shard, shards, inboxes, replies, ready):
+    # Процесс-обработчик шарда: бот со своей базой, обновления - из очереди диспетчера
+    # Когда база подготовлена и бот готов, номер шарда кладется в очередь ready
+    os.environ[SHARD_ENV] = str(shard)
+    os.environ[SHARDS_ENV] = str(shards)
+    logging.basicConfig(level=logging.INFO, format="%(processName)s %(levelname)s %(message)s")
+    import Tg_Bot_Work as app
+    logger.info("Шард %s готов к работе за %s", shard, app.startup_report.summary())
+
+    # Метрики каждого шарда - на своем порту: METRICS_PORT + номер шарда
+    metrics_port = getattr(app.config, "METRICS_PORT", None)
+    if metrics_port:
+        app.metrics.start_server(getattr(app.config, "METRICS_HOST", "127.0.0.1"), metrics_port + shard)
+
+    app.cluster.connect(inboxes, replies)
+    ready.put(shard)
+    try:
+        app.cluster.serve(app.bot)
+    finally:
+        app.bot.stop_bot()
+        app.sender.close()
+        app.db_writer.close()
+
+
+class Dispatcher:
+    # Входной процесс: опрашивает Telegram и раздает обновления шардам
+    def __init__(self, token, shards):
+        self.token = token
+        self.shards = shards
+        # spawn: процессы начинают с чистого интерпретатора, без потоков и соединений диспетчера
+        context = multiprocessing.get_context("spawn")
+        self.inboxes = [context.Queue() for _ in range(shards)]
+        self.replies = [context.Queue() for _ in range(shards)]
+        self.ready = context.Queue()
+        self.processes = [context.Process(target=worker,
+                                          args=(shard, shards, self.inboxes, self.replies, self.ready),
+                                          name=f"shard-{shard}", daemon=True)
+                          for shard in range(shards)]
+        self.stopping = threading.Event()
+        self.routed = [0] * shards
+
+    def start(self, timeout=None):
+        # Запускаем процессы-обработчики и ждем, пока все будут готовы
+        # Возвращает время запуска в секундах
+        started = time.perf_counter()
+        for process in self.processes:
+            process.start()
+        for _ in self.processes:
+            shard = self.ready.get(timeout=timeout)
+            logger.info("Шард %s готов", shard)
+        return time.perf_counter() - started
+
+    def route(self, update):
+        # Передаем обновление шарду отправителя (без отправителя - шарду 0)
+        user_id = update_user_id(update)
+        shard = 0 if user_id is None else shard_of(user_id, self.shards)
+        self.routed[shard] += 1
+        self.inboxes[shard].put(("update", update))
+
+    def poll(self):
+        # Длинный опрос getUpdates до вызова stop()
+        from telebot import apihelper
+
+        offset = None
+        while not self.stopping.is_set():
+            try:
+                # timeout - время ожидания HTTP-ответа, long_polling_timeout - ожидание на стороне Telegram
+                updates = apihelper.get_updates(self.token, offset, POLL_LIMIT,
+                                                timeout=POLL_TIMEOUT + 10, long_polling_timeout=POLL_TIMEOUT)
+            except Exception:
+                logger.exception("Ошибка getUpdates, повтор через секунду")
+                time.sleep(1)
+                continue
+            for update in updates:
+                offset = update["update_id"] + 1
+                self.route(update)
+
+    def stop(self):
+        # Останавливаем опрос и процессы-обработчики (они дорабатывают свои очереди)
+        self.stopping.set()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join()
+
+
+def main():
+    import config
+
+    parser = argparse.ArgumentParser(description="Бот в нескольких процессах, у каждого свой файл базы")
+    parser.add_argument("--shards", type=int, default=getattr(config, "SHARDS", os.cpu_count()),
+                        help="количество процессов-обработчиков (по умолчанию SHARDS из config.py)")
+    parser.add_argument("--split", metavar="БАЗА",
+                        help="разделить существующую базу одного процесса на файлы шардов и выйти")
+    args = parser.parse_args()
+
+    if args.split:
+        archive_dir = getattr(config, "ARCHIVE_DIR", archive.ARCHIVE_DIR)
+        for path in split_database(args.split, args.shards, archive_dir):
+            print(path)
+        return
+
+    if getattr(config, "API_URL", None):
+        from telebot import apihelper
+        apihelper.API_URL = config.API_URL
+
+    logging.basicConfig(level=logging.INFO)
+    dispatcher = Dispatcher(config.TOKEN, args.shards)
+    logger.info("Запущено процессов: %s за %.1f с", args.shards, dispatcher.start())
+    try:
+        dispatcher.poll()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
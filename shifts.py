@@ -0,0 +1,140 @@
+# Модуль активных (незавершенных) смен
+# В памяти хранится словарь user_id -> (id смены, время начала в секундах epoch),
+# который заполняется из базы при запуске и обновляется при каждой записи
+# (если запись откатится, изменение словаря отменяется - см. writer.on_rollback).
+# Благодаря этому "Начать" и "Закончить" не делают SELECT по таблице work
+import threading
+
+import rates
+import rollups
+import schema
+import totals
+import writer
+
+
+# Частичный индекс только по открытым сменам (end_ts IS NULL)
+# Он остается маленьким, сколько бы завершенных смен ни было в базе
+INDEX_SQL = """CREATE INDEX IF NOT EXISTS idx_work_open_ts ON work (user_id) WHERE end_ts IS NULL"""
+
+# Активные смены: user_id -> (id смены, время начала в секундах epoch)
+active = {}
+
+# Блокировка словаря: смены открывает и закрывает поток-писатель,
+# а обработчики в своих потоках проверяют (get), есть ли у пользователя активная смена
+lock = threading.Lock()
+
+
+def create_index(cursor):
+    # Создаем частичный индекс по открытым сменам
+    cursor.execute(INDEX_SQL)
+
+
+def load(cursor):
+    # Заполняем словарь активных смен из базы (при запуске бота)
+    # Для каждого пользователя берем последнюю открытую смену
+    # hours IS NULL отсекает завершенные смены, у которых не удалось заполнить end_ts
+    cursor.execute("""
+        SELECT user_id, MAX(id), start_ts
+        FROM work
+        WHERE end_ts IS NULL AND hours IS NULL AND start_ts IS NOT NULL
+        GROUP BY user_id
+    """)
+    with lock:
+        active.clear()
+        for user_id, work_id, start_ts in cursor.fetchall():
+            active[user_id] = (work_id, start_ts)
+        return len(active)
+
+
+def get(user_id):
+    # Активная смена пользователя: (id смены, время начала) или None
+    with lock:
+        return active.get(user_id)
+
+
+def _restore(user_id, item):
+    # Возвращаем запись словаря к прежнему значению item (None - активной смены не было)
+    with lock:
+        if item is None:
+            active.pop(user_id, None)
+        else:
+            active[user_id] = item
+
+
+def open_shift(cursor, user_id, name, start_ts, start_time):
+    # Начинаем смену, если у пользователя еще нет активной
+    # start_ts - время начала в секундах epoch, start_time - та же строка для отображения
+    # Возвращает (id смены, время начала в секундах epoch, True если смена создана,
+    # True если это первая смена пользователя)
+    # Если смена уже идет - возвращает ее данные и False, без запросов к базе
+    with lock:
+        current = active.get(user_id)
+        if current:
+            return current[0], current[1], False, False
+
+        cursor.execute("""INSERT INTO work (user_id, name, start_time, start_ts) VALUES (?,?,?,?) """,
+                       (user_id, name, start_time, start_ts))
+        work_id = cursor.lastrowid
+        new_user = totals.ensure_user(cursor, user_id, name)
+        active[user_id] = (work_id, start_ts)
+        writer.on_rollback(lambda: _restore(user_id, None))
+        return work_id, start_ts, True, new_user
+
+
+def take(user_id):
+    # Забираем активную смену пользователя для завершения
+    # Возвращает (id смены, время начала) или None, если активной смены нет
+    # Две одновременные попытки завершить одну смену не получат ее обе
+    with lock:
+        item = active.pop(user_id, None)
+    if item is not None:
+        writer.on_rollback(lambda: _restore(user_id, item))
+    return item
+
+
+def close_shift(cursor, work_id, end_ts, end_time, hours, many):
+    # Завершаем смену одной записью в базу
+    # end_ts - время окончания в секундах epoch, end_time - та же строка для отображения
+    # Возвращает True, если смена действительно была открыта
+    cursor.execute("""UPDATE work SET end_ts = ?, end_time = ?, hours = ?, many = ?
+                      WHERE id = ? AND end_ts IS NULL""",
+                   (end_ts, end_time, hours, many, work_id))
+    return cursor.rowcount == 1
+
+
+def finish_shift(cursor, user_id, name, end_ts):
+    # Завершаем активную смену пользователя и обновляем его итоги в той же транзакции
+    # Возвращает (отработано часов, заработано рублей) или None, если активной смены нет
+    # (в том числе если смену уже нет в базе - например, пользователя удалили через /dell)
+    last_work = take(user_id)
+    if not last_work:
+        return None
+
+    work_id, start_ts = last_work
+
+    # Вычисляем разницу во времени в секундах
+    info_time = end_ts - start_ts
+    hours = round(info_time / 3600, 2)  # Округляем до 2 знаков
+
+    # Рассчитываем зарплату по точному времени, без округления часов,
+    # по ставке, действовавшей в начале смены
+    many = round(info_time / 3600 * rates.rate_for(user_id, start_ts), 2)
+
+    # Закрываем смену одной записью в базу и обновляем итоги (общие и по дням)
+    if not close_shift(cursor, work_id, end_ts, schema.to_str(end_ts), hours, many):
+        return None
+    totals.add_shift(cursor, user_id, name, hours, many, end_ts)
+    rollups.add_shift(cursor, user_id, start_ts, end_ts, hours, many)
+    return hours, many
+
+
+def forget(user_id):
+    # Убираем активную смену пользователя (при удалении пользователя)
+    # Выполняется в потоке-писателе в той же операции, что и удаление его смен из базы
+    take(user_id)
+
+
+def clear():
+    # Убираем все активные смены (при полной очистке базы)
+    with lock:
+        active.clear()
@@ -0,0 +1,134 @@
+# Модуль подготовки базы данных при запуске бота
+# Общий для обычного (Tg_Bot_Work.py) и асинхронного (async_bot.py) режимов.
+# Схема базы меняется версионными миграциями: номер последней выполненной
+# миграции хранится в заголовке файла базы (PRAGMA user_version), поэтому
+# каждая миграция выполняется один раз, а обычный перезапуск только сверяет номер.
+# Время каждого этапа запуска записывается в отчет (Report): сколько бот готовился к работе
+import time
+
+import archive
+import rates
+import rollups
+import schema
+import shifts
+import state
+import stats
+import totals
+
+
+def with_cursor(create):
+    # Миграция из функции, которой нужен только курсор
+    return lambda dp: create(dp.cursor())
+
+
+def retired(dp):
+    # Миграция, которая больше ничего не делает: ее место в списке сохраняется,
+    # потому что номера следующих миграций уже записаны в существующих базах
+    pass
+
+
+# Миграции по порядку: версия схемы базы = количество выполненных миграций.
+# Новая миграция добавляется только в конец списка.
+# Базы, созданные до появления версий (user_version = 0), проходят все миграции:
+# каждая проверяет, что уже сделано, и повторно ничего не меняет
+MIGRATIONS = [
+    # 1. Время смен в секундах (колонки start_ts/end_ts) и индексы по времени
+    ("время смен в секундах", schema.migrate),
+    # 2. Индекс по (user_id, end_ts) для статистики - больше не создается (удаляется миграцией 10)
+    ("индекс статистики", retired),
+    # 3. Таблица накопленных итогов (при создании заполняется из истории)
+    ("итоги пользователей", with_cursor(totals.create_table)),
+    # 4. Таблица итогов по дням (при создании заполняется из истории)
+    ("итоги по дням", with_cursor(rollups.create_table)),
+    # 5. Частичный индекс по открытым сменам
+    ("индекс открытых смен", with_cursor(shifts.create_index)),
+    # 6. Итоги закрытых расчетных периодов
+    ("расчетные периоды", with_cursor(archive.create_table)),
+    # 7. Ставки с датами начала действия
+    ("ставки", with_cursor(rates.create_table)),
+    # 8. Состояние диалогов (ввод после /dell, подтверждения)
+    ("состояние диалогов", with_cursor(state.create_table)),
+    # 9. Удаленные через /dell сотрудники (их архивные смены не попадают в итоги)
+    ("удаленные сотрудники", with_cursor(archive.create_removed_table)),
+    # 10. Удаление индекса статистики (статистика в боте читается из накопленных итогов)
+    ("удаление индекса статистики", with_cursor(stats.drop_index)),
+    # 11. Индекс смен по сотруднику и началу смены (пересчет личной ставки)
+    ("индекс смен сотрудника", with_cursor(rates.create_index)),
+]
+
+
+class Report:
+    # Время этапов запуска: от создания отчета до готовности бота
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (этап, секунды) по порядку выполнения
+        self.phases = []
+        # Миграции, выполненные при этом запуске
+        self.migrations = []
+        # Секунд от начала запуска до готовности (None - еще не готов)
+        self.ready_seconds = None
+
+    def phase(self, name, func, *args):
+        # Выполняем этап запуска func(*args) и запоминаем его время; возвращает результат func
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def ready(self):
+        # Бот готов принимать обновления; возвращает время запуска в секундах
+        self.ready_seconds = time.perf_counter() - self.started
+        return self.ready_seconds
+
+    def summary(self):
+        # Строка для журнала и /dbstats: "420 мс (миграции 12 мс, ...)"
+        total = self.ready_seconds if self.ready_seconds is not None else time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.phases)
+        text = f"{total * 1000:.0f} мс ({phases})"
+        if self.migrations:
+            text += f", миграции: {', '.join(self.migrations)}"
+        return text
+
+
+def schema_version(dp):
+    # Номер версии схемы базы (количество выполненных миграций)
+    return dp.execute("""PRAGMA user_version""").fetchone()[0]
+
+
+def migrate(dp):
+    # Выполняем миграции, которых еще не было в этой базе
+    # Номер версии записываем после каждой миграции: если запуск прервется,
+    # следующий продолжит с того же места. Возвращает имена выполненных миграций
+    version = schema_version(dp)
+    applied = []
+    for number, (name, migration) in enumerate(MIGRATIONS[version:], version + 1):
+        migration(dp)
+        dp.execute(f"""PRAGMA user_version = {number}""")
+        dp.commit()
+        applied.append(name)
+    return applied
+
+
+def load_state(dp):
+    # Удаляем просроченное состояние диалогов и загружаем действующее в память
+    cursor = dp.cursor()
+    state.expire(cursor)
+    dp.commit()
+    return state.load(cursor)
+
+
+def prepare_database(dp, report=None):
+    # Миграции схемы (только невыполненные) и загрузка в память того,
+    # что нужно обработчикам без запросов к базе
+    # Возвращает отчет о запуске (report или новый)
+    report = report or Report()
+    cursor = dp.cursor()
+
+    report.migrations = report.phase("миграции", migrate, dp)
+
+    # Загружаем активные смены, ставки и состояние диалогов в память
+    report.phase("активные смены", shifts.load, cursor)
+    report.phase("ставки", rates.load, cursor)
+    report.phase("состояние диалогов", load_state, dp)
+    return report
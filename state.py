@@ -0,0 +1,108 @@
+# Модуль состояния диалогов (таблица conversation_state)
+# Здесь хранится то, что бот ждет от пользователя: ввод ID после /dell
+# и нажатие кнопки подтверждения закрытия периода или удаления сотрудника.
+# Состояние записывается в базу, поэтому перезапуск бота (например, при
+# обновлении) не прерывает начатые действия администратора.
+# Копия состояния хранится в памяти (словарь (chat_id, вид) -> (данные, срок)),
+# поэтому проверка "ждем ли мы ввода" (waiting) не обращается к базе.
+# Если запись в базу откатится, изменение словаря отменяется (writer.on_rollback)
+import json
+import threading
+import time
+
+import writer
+
+# Виды состояния
+DELL_INPUT = "dell_input"  # ждем ID сотрудника для удаления (после /dell)
+CLOSE_PERIOD = "close_period"  # ждем подтверждения закрытия периода (после /sekret)
+REMOVE_USER = "remove_user"  # ждем подтверждения удаления сотрудника (данные - его ID)
+
+# Сколько секунд ждать ответа или подтверждения
+TTL = 3600
+
+# Одна строка на чат и вид состояния; payload - данные в JSON,
+# expires_ts - до какого момента (секунды epoch) состояние действует
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS conversation_state (
+    chat_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT,
+    expires_ts INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, kind)
+) WITHOUT ROWID"""
+
+# Состояние в памяти: (chat_id, вид) -> (данные, expires_ts)
+pending = {}
+
+# Блокировка словаря: состояние записывает и забирает поток-писатель (put, take),
+# а обработчики проверяют его (waiting) в своих потоках
+lock = threading.Lock()
+
+
+def create_table(cursor):
+    # Создаем таблицу состояния диалогов
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def load(cursor):
+    # Заполняем словарь из базы (при запуске бота), просроченное состояние пропускаем
+    # Возвращает количество действующих записей
+    cursor.execute("""SELECT chat_id, kind, payload, expires_ts FROM conversation_state WHERE expires_ts > ?""",
+                   (int(time.time()),))
+    with lock:
+        pending.clear()
+        for chat_id, kind, payload, expires_ts in cursor.fetchall():
+            pending[(chat_id, kind)] = (json.loads(payload), expires_ts)
+        return len(pending)
+
+
+def _restore(key, item):
+    # Возвращаем запись словаря к прежнему значению item (None - состояния не было)
+    with lock:
+        if item is None:
+            pending.pop(key, None)
+        else:
+            pending[key] = item
+
+
+def waiting(chat_id, kind):
+    # True, если бот ждет от чата chat_id ответа вида kind
+    with lock:
+        item = pending.get((chat_id, kind))
+    return item is not None and item[1] > time.time()
+
+
+def put(cursor, chat_id, kind, payload=None, ttl=TTL):
+    # Запоминаем состояние (заменяет прежнее того же вида)
+    # Выполняется в потоке-писателе
+    expires_ts = int(time.time()) + ttl
+    cursor.execute("""
+        INSERT INTO conversation_state (chat_id, kind, payload, expires_ts) VALUES (?, ?, ?, ?)
+        ON CONFLICT (chat_id, kind) DO UPDATE SET payload = excluded.payload, expires_ts = excluded.expires_ts
+    """, (chat_id, kind, json.dumps(payload), expires_ts))
+    key = (chat_id, kind)
+    with lock:
+        previous = pending.get(key)
+        pending[key] = (payload, expires_ts)
+    writer.on_rollback(lambda: _restore(key, previous))
+
+
+def take(cursor, chat_id, kind):
+    # Забираем состояние: удаляем его и возвращаем (True, данные),
+    # или (False, None), если его не ждали или срок истек
+    # Выполняется в потоке-писателе, поэтому два нажатия одной кнопки подтверждения
+    # не выполнят действие дважды
+    cursor.execute("""DELETE FROM conversation_state WHERE chat_id = ? AND kind = ?""", (chat_id, kind))
+    key = (chat_id, kind)
+    with lock:
+        item = pending.pop(key, None)
+    if item is not None:
+        writer.on_rollback(lambda: _restore(key, item))
+    if item is None or item[1] <= time.time():
+        return False, None
+    return True, item[0]
+
+
+def expire(cursor):
+    # Удаляем просроченное состояние из базы (при запуске бота)
+    cursor.execute("""DELETE FROM conversation_state WHERE expires_ts <= ?""", (int(time.time()),))
+    return cursor.rowcount
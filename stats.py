@@ -0,0 +1,50 @@
+# Модуль итогов по сотрудникам прямо по таблице смен: итоги ведомости /export
+# за любые даты, в том числе по архивам закрытых периодов.
+# Итоги считаются одним GROUP BY запросом, а не отдельным запросом на каждого пользователя.
+# Экраны статистики бота читают накопленные итоги (totals.py, rollups.py), а не этот модуль
+
+
+# Сессии, часы и деньги по каждому пользователю за один проход по таблице
+# MAX(id) нужен для того, чтобы name бралось из последней записи пользователя
+# +user_id - группировка без индекса по user_id: полный проход по таблице с сортировкой
+# быстрее, чем проход по индексу с чтением каждой строки из таблицы
+# COUNT(hours) считает только завершенные сессии (у незавершенных hours = NULL)
+USER_STATS_SQL = """
+    SELECT user_id,
+           name,
+           MAX(id),
+           COUNT(hours),
+           ROUND(COALESCE(SUM(ROUND(hours, 2)), 0), 2),
+           ROUND(COALESCE(SUM(ROUND(many, 2)), 0), 2)
+    FROM {table}
+    {where}
+    GROUP BY +user_id
+    ORDER BY user_id
+"""
+
+
+def drop_index(cursor):
+    # Удаляем индекс (user_id, end_ts, ...) прежних версий. Выгрузка за даты отбирает смены
+    # по индексу idx_work_end_ts, а полный проход по таблице без индекса быстрее, чем по
+    # индексу с чтением каждой строки из таблицы; при этом индекс обновлялся при каждой записи смены
+    cursor.execute("""DROP INDEX IF EXISTS idx_work_user_end_ts""")
+
+
+def all_users_stats(cursor, since=None, until=None, table="work"):
+    # Статистика по всем пользователям
+    # since/until - границы периода в секундах epoch по времени окончания смены
+    # (since включительно, until не включительно); None - без ограничения
+    # table - таблица смен (например, архив закрытого периода "period_1.work")
+    # Возвращает список кортежей (user_id, name, сессии, часы, деньги)
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("end_ts >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("end_ts < ?")
+        params.append(until)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    cursor.execute(USER_STATS_SQL.format(table=table, where=where), params)
+    return [(user_id, name, sessions, hours, money)
+            for user_id, name, _, sessions, hours, money in cursor.fetchall()]
@@ -0,0 +1,85 @@
+# Тесты расчетных периодов: объединение периодов шардов и общий номер периода
+# Запуск: python -m pytest tests
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive  # noqa: E402
+import startup  # noqa: E402
+
+
+def make_db(path):
+    # База шарда со всеми миграциями; соединение как у потока-писателя (isolation_level=None)
+    dp = sqlite3.connect(path, isolation_level=None)
+    startup.migrate(dp)
+    return dp
+
+
+def add_shift(dp, user_id, end_ts, hours, many):
+    # Завершенная смена пользователя user_id
+    dp.execute("""INSERT INTO work (user_id, name, start_ts, end_ts, hours, many) VALUES (?, ?, ?, ?, ?, ?)""",
+               (user_id, f"user{user_id}", end_ts - int(hours * 3600), end_ts, hours, many))
+
+
+def close_all(dps, archive_dirs, closed_ts):
+    # Закрываем период во всех шардах так же, как Tg_Bot_Work.on_close_period
+    period_id = max(archive.next_period_id(dp.cursor()) for dp in dps)
+    return [archive.close_period(dp, archive_dir, closed_ts, period_id)
+            for dp, archive_dir in zip(dps, archive_dirs)]
+
+
+class MergePeriodsTest(unittest.TestCase):
+    def test_sums_rows_with_same_number(self):
+        shard0 = [(2, 200, 150, 190, 2, 1, 3.0, 1200.0), (1, 100, 50, 90, 1, 1, 1.5, 600.0)]
+        shard1 = [(2, 210, 140, 180, 3, 2, 4.25, 1700.5)]
+        self.assertEqual(archive.merge_periods([shard0, shard1]),
+                         [(2, 210, 140, 190, 5, 3, 7.25, 2900.5), (1, 100, 50, 90, 1, 1, 1.5, 600.0)])
+
+    def test_empty_shard_period(self):
+        # У шарда без смен в периоде нулевая строка без границ по времени
+        shard0 = [(1, 100, 50, 90, 1, 1, 1.5, 600.0)]
+        shard1 = [(1, 100, None, None, 0, 0, 0.0, 0.0)]
+        self.assertEqual(archive.merge_periods([shard1, shard0]), [(1, 100, 50, 90, 1, 1, 1.5, 600.0)])
+
+    def test_newest_first_and_limit(self):
+        rows = [(period_id, period_id, None, None, 0, 0, 0.0, 0.0) for period_id in (1, 3, 2)]
+        self.assertEqual([row[0] for row in archive.merge_periods([rows], limit=2)], [3, 2])
+
+
+class ClosePeriodTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dps = [make_db(os.path.join(self.tmp.name, f"shard{shard}.db")) for shard in range(2)]
+        self.archive_dirs = [os.path.join(self.tmp.name, f"archive{shard}") for shard in range(2)]
+
+    def tearDown(self):
+        for dp in self.dps:
+            dp.close()
+        self.tmp.cleanup()
+
+    def test_shards_share_period_numbers(self):
+        # Первый период - смены только в шарде 0, второй - в обоих
+        add_shift(self.dps[0], 1, 1000, 1.5, 600.0)
+        first = close_all(self.dps, self.archive_dirs, 2000)
+        self.assertEqual([summary[:2] for summary in first], [(1, 1), (1, 0)])
+
+        add_shift(self.dps[0], 1, 3000, 2.0, 800.0)
+        add_shift(self.dps[1], 2, 3500, 1.0, 400.0)
+        close_all(self.dps, self.archive_dirs, 4000)
+
+        merged = archive.merge_periods([archive.periods(dp.cursor()) for dp in self.dps])
+        self.assertEqual(merged, [(2, 4000, 3000, 3500, 2, 2, 3.0, 1200.0),
+                                  (1, 2000, 1000, 1000, 1, 1, 1.5, 600.0)])
+
+    def test_own_number_without_shifts(self):
+        # Без общего номера база без завершенных смен период не закрывает
+        self.assertIsNone(archive.close_period(self.dps[0], self.archive_dirs[0], 2000))
+        self.assertEqual(archive.periods(self.dps[0].cursor()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
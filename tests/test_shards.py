@@ -0,0 +1,53 @@
+# Тесты разделения базы одного процесса на шарды (shards.py --split)
+# Запуск: python -m pytest tests
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive  # noqa: E402
+import shards  # noqa: E402
+from test_archive import add_shift, make_db  # noqa: E402
+
+
+class SplitDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmp.name, "bot.db")
+        self.archive_dir = os.path.join(self.tmp.name, "archive")
+        dp = make_db(self.base)
+        for user_id in range(1, 11):
+            add_shift(dp, user_id, 1000 + user_id, 1.0, 400.0)
+        archive.close_period(dp, self.archive_dir, 2000)
+        dp.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_archives_split_by_shard(self):
+        # Архив периода делится между шардами: у каждого только свои сотрудники,
+        # а сумма итогов периода по шардам равна итогу до разделения
+        shards.split_database(self.base, 3, self.archive_dir)
+        results = []
+        for shard in range(3):
+            dp = sqlite3.connect(shards.db_path(self.base, shard, 3))
+            (period_id, file), = dp.execute("""SELECT id, file FROM pay_periods""").fetchall()
+            self.assertEqual((period_id, file), (1, os.path.join(self.archive_dir, f"shard{shard}", "period_1.db")))
+            results.append(archive.periods(dp.cursor()))
+            dp.close()
+
+            copy = sqlite3.connect(file)
+            users = [user_id for user_id, in copy.execute("""SELECT user_id FROM work""")]
+            copy.close()
+            self.assertTrue(users)
+            self.assertTrue(all(shards.shard_of(user_id, 3) == shard for user_id in users))
+
+        merged, = archive.merge_periods(results)
+        self.assertEqual(merged[4:], (10, 10, 10.0, 4000.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
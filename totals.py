@@ -0,0 +1,222 @@
+# Модуль накопленных итогов по пользователям (таблица user_totals)
+# Итоги обновляются в той же транзакции, что и запись смены в work,
+# поэтому личная статистика - это один запрос по первичному ключу
+
+
+# Таблица итогов: одна строка на пользователя
+# last_shift - время окончания последней завершенной смены (секунды epoch)
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS user_totals (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    hours REAL NOT NULL DEFAULT 0,
+    money REAL NOT NULL DEFAULT 0,
+    last_shift INTEGER
+)"""
+
+# Индексы для постраничного вывода с сортировкой по часам и по деньгам
+INDEXES_SQL = [
+    """CREATE INDEX IF NOT EXISTS idx_totals_hours ON user_totals (hours, user_id)""",
+    """CREATE INDEX IF NOT EXISTS idx_totals_money ON user_totals (money, user_id)""",
+]
+
+# Варианты сортировки списка пользователей: код -> (колонка, по убыванию)
+# Код сортировки передается в callback_data, поэтому он из одной буквы
+SORTS = {
+    "i": ("user_id", False),
+    "h": ("hours", True),
+    "m": ("money", True),
+}
+
+# Сколько пользователей показывать на одной странице
+PAGE_SIZE = 10
+
+# Итоги, пересчитанные заново из таблицы work
+# Для last_shift берем самое позднее время окончания смены пользователя
+EXPECTED_SQL = """
+    SELECT user_id,
+           name,
+           MAX(id) AS max_id,
+           COUNT(hours) AS sessions,
+           ROUND(COALESCE(SUM(ROUND(hours, 2)), 0), 2) AS hours,
+           ROUND(COALESCE(SUM(ROUND(many, 2)), 0), 2) AS money,
+           (SELECT MAX(w.end_ts) FROM work w WHERE w.user_id = work.user_id) AS last_shift
+    FROM work
+    GROUP BY user_id
+"""
+
+# Допустимое расхождение при сверке (копейки и сотые доли часа)
+TOLERANCE = 0.005
+
+
+def create_table(cursor):
+    # Создаем таблицу итогов
+    # Если таблицы еще не было - сразу заполняем ее по истории из work
+    cursor.execute("""SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_totals'""")
+    existed = cursor.fetchone() is not None
+    cursor.execute(CREATE_TABLE_SQL)
+    for index_sql in INDEXES_SQL:
+        cursor.execute(index_sql)
+    if not existed:
+        rebuild(cursor)
+
+
+def ensure_user(cursor, user_id, name):
+    # Заводим строку итогов с нулями при первой смене пользователя,
+    # чтобы он сразу появлялся в общей статистике и в списке /dell
+    # Возвращает True, если пользователь добавлен впервые
+    cursor.execute("""INSERT OR IGNORE INTO user_totals (user_id, name) VALUES (?, ?)""",
+                   (user_id, name))
+    return cursor.rowcount == 1
+
+
+def add_shift(cursor, user_id, name, hours, money, end_ts):
+    # Добавляем завершенную смену к итогам пользователя
+    # Вызывается в той же транзакции, что и UPDATE work SET end_time...
+    cursor.execute("""
+        INSERT INTO user_totals (user_id, name, sessions, hours, money, last_shift)
+        VALUES (?, ?, 1, ROUND(?, 2), ROUND(?, 2), ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            name = excluded.name,
+            sessions = sessions + 1,
+            hours = ROUND(hours + excluded.hours, 2),
+            money = ROUND(money + excluded.money, 2),
+            last_shift = MAX(COALESCE(last_shift, 0), excluded.last_shift)
+    """, (user_id, name, hours, money, end_ts))
+
+
+def remove_user(cursor, user_id):
+    # Удаляем итоги пользователя (вместе с его записями в work)
+    cursor.execute("""DELETE FROM user_totals WHERE user_id = ?""", (user_id,))
+
+
+def clear(cursor):
+    # Удаляем итоги всех пользователей (при полной очистке базы)
+    cursor.execute("""DELETE FROM user_totals""")
+
+
+def get(cursor, user_id):
+    # Итоги одного пользователя по первичному ключу
+    # Возвращает кортеж (сессии, часы, деньги, последняя смена) или None
+    cursor.execute("""SELECT sessions, hours, money, last_shift FROM user_totals WHERE user_id = ?""",
+                   (user_id,))
+    return cursor.fetchone()
+
+
+def has_users(cursor):
+    # Есть ли в итогах хотя бы один пользователь
+    cursor.execute("""SELECT 1 FROM user_totals LIMIT 1""")
+    return cursor.fetchone() is not None
+
+
+def page(cursor, sort="i", key=None, backward=False, size=PAGE_SIZE):
+    # Одна страница списка пользователей (keyset-пагинация)
+    # sort - код из SORTS; key - (значение колонки сортировки, user_id) строки,
+    # от которой листаем: следующая страница начинается после нее,
+    # предыдущая (backward=True) заканчивается перед ней; None - первая страница.
+    # Читается только size + 1 строк, сколько бы пользователей ни было в базе.
+    # Возвращает (строки, есть ли предыдущая страница, есть ли следующая),
+    # строки - кортежи (user_id, name, сессии, часы, деньги)
+    column, descending = SORTS[sort]
+
+    # Для сортировки по user_id ключ - сам user_id, иначе пара (колонка, user_id)
+    if column == "user_id":
+        key_sql, key_params = "user_id", key[1:] if key else ()
+    else:
+        key_sql, key_params = f"({column}, user_id)", key or ()
+
+    # Листая назад, идем в обратном порядке и потом разворачиваем результат
+    reverse = descending != backward
+    order = "DESC" if reverse else "ASC"
+    order_sql = "user_id " + order if column == "user_id" else f"{column} {order}, user_id {order}"
+
+    where = ""
+    if key:
+        placeholders = "?" if column == "user_id" else "(?, ?)"
+        where = f"WHERE {key_sql} {'<' if reverse else '>'} {placeholders}"
+
+    cursor.execute(f"""
+        SELECT user_id, name, sessions, hours, money
+        FROM user_totals
+        {where}
+        ORDER BY {order_sql}
+        LIMIT ?
+    """, (*key_params, size + 1))
+    rows = cursor.fetchall()
+
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backward:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, key is not None, has_more
+
+
+def merge_pages(pages, sort, key=None, backward=False, size=PAGE_SIZE):
+    # Одна страница из страниц page() нескольких шардов (с теми же sort, key, backward, size)
+    # Пользователь хранится только в одном шарде, поэтому строки не повторяются
+    # Возвращает то же, что page()
+    _, descending = SORTS[sort]
+    rows = sorted((row for page_rows, _, _ in pages for row in page_rows),
+                  key=lambda row: sort_key(sort, row), reverse=descending)
+    if backward:
+        has_more = len(rows) > size or any(has_prev for _, has_prev, _ in pages)
+        return rows[-size:], has_more, True
+    has_more = len(rows) > size or any(has_next for _, _, has_next in pages)
+    return rows[:size], key is not None, has_more
+
+
+def sort_key(sort, row):
+    # Ключ keyset-пагинации для строки из page(): (значение колонки сортировки, user_id)
+    column, _ = SORTS[sort]
+    user_id, _, _, hours, money = row
+    return {"user_id": user_id, "hours": hours, "money": money}[column], user_id
+
+
+def rebuild(cursor):
+    # Пересчитываем итоги из таблицы work
+    # Строки пользователей, у которых в work не осталось смен (все перенесены в архив
+    # закрытого периода), не удаляются, а обнуляются: имя нужно статистике за неделю
+    # и месяц (итоги по дням сохраняются), а сотрудник остается в списке /dell
+    # Возвращает количество пользователей в итогах
+    cursor.execute("""UPDATE user_totals SET sessions = 0, hours = 0, money = 0""")
+    cursor.execute("""
+        INSERT INTO user_totals (user_id, name, sessions, hours, money, last_shift)
+        SELECT user_id, name, sessions, hours, money, last_shift
+        FROM (""" + EXPECTED_SQL + """)
+        WHERE true
+        ON CONFLICT (user_id) DO UPDATE SET
+            name = excluded.name,
+            sessions = excluded.sessions,
+            hours = excluded.hours,
+            money = excluded.money,
+            last_shift = COALESCE(excluded.last_shift, last_shift)
+    """)
+    cursor.execute("""SELECT COUNT(*) FROM user_totals""")
+    return cursor.fetchone()[0]
+
+
+def verify(cursor):
+    # Сверяем итоги с пересчетом по таблице work
+    # Возвращает список расхождений (user_id, name, ожидаемое, фактическое),
+    # где значения - кортежи (сессии, часы, деньги); None - строки нет
+    cursor.execute(EXPECTED_SQL)
+    expected = {row[0]: (row[1], (row[3], row[4], row[5])) for row in cursor.fetchall()}
+
+    cursor.execute("""SELECT user_id, name, sessions, hours, money FROM user_totals""")
+    actual = {row[0]: (row[1], (row[2], row[3], row[4])) for row in cursor.fetchall()}
+
+    drift = []
+    for user_id in sorted(set(expected) | set(actual)):
+        exp_name, exp = expected.get(user_id, (None, None))
+        act_name, act = actual.get(user_id, (None, None))
+        # Пользователь без завершенных смен может отсутствовать в итогах,
+        # а пользователь, все смены которого в архиве, - остаться в них с нулями
+        if act is None and exp is not None and exp[0] == 0:
+            continue
+        if exp is None and act is not None and act == (0, 0, 0):
+            continue
+        if exp is None or act is None or exp[0] != act[0] \
+                or abs(exp[1] - act[1]) > TOLERANCE or abs(exp[2] - act[2]) > TOLERANCE:
+            drift.append((user_id, exp_name or act_name, exp, act))
+    return drift
@@ -0,0 +1,197 @@
+# Модуль экранов бота: тексты сообщений и клавиатуры
+# Каждая функция возвращает пару (текст, клавиатура в JSON или None).
+# Постоянные клавиатуры берутся готовыми из keyboards.py.
+# Используется и обычным ботом (Tg_Bot_Work.py), и асинхронным (async_bot.py)
+from telebot import types
+
+import keyboards
+import rates
+import totals
+
+
+def start_screen(name):
+    # Приветствие по команде /start
+    text = (f"Здравствуйте, <b>{name}</b>.👋 \n\n"
+            f"Это бот для счета отработанных часов и зарплаты.\n\n"
+            f"Выберите действие:")
+    return text, keyboards.START
+
+
+def shift_started(start_time, created):
+    # Подтверждение начала смены (или сообщение, что смена уже идет)
+    if created:
+        text = (f"✅ <b>Работа начата!</b>\n\n"
+                f"🕐 {start_time}\n\n"
+                f"Не забудь нажать 'Закончить' когда закончите!")
+    else:
+        text = (f"⏳ <b>Смена уже идет!</b>\n\n"
+                f"🕐 Начата: {start_time}\n\n"
+                f"Не забудь нажать 'Закончить' когда закончите!")
+    return text, keyboards.END_ONLY
+
+
+def shift_ended(end_time, name, hours, many):
+    # Итог завершенной смены
+    text = (f"✅ <b>Работа завершена</b> в {end_time}!\n\n"
+            f"👤 Пользователь: <b>{name}</b>\n"
+            f"⏱️ Отработано: {hours} часов\n"
+            f"💰 Заработано: {many} руб.")
+    return text, keyboards.MENU_ONLY
+
+
+def no_active_shift(name):
+    # Если нет активной смены
+    text = (f"❌ <b>{name}</b>, у вас <b>нет активных смен!</b>\n"
+            "Нажми 'Начать' чтобы начать новую.")
+    return text, None
+
+
+def main_menu():
+    # Главное меню с подробным описанием функций бота
+    text = ("👷 <b>ГББ: Центр управления работой</b> 👷\n\n"
+            '"<b>Начать</b>" — Начинает новую рабочую смену.\n'
+            '"<b>Закончить</b>" — Завершает текущую активную смену.\n'
+            '"<b>Статистика</b>" — Показывает вашу персональную или общую статистику.\n\n'
+            'Выберите действия:')
+    return text, keyboards.MAIN_MENU
+
+
+def stats_menu():
+    # Меню выбора статистики (личная, общая и итоги за день, неделю и месяц)
+    return "Выбери подходящую статистику:", keyboards.STATS_MENU
+
+
+# Префикс callback_data кнопок статистики за период и их названия
+PERIOD_PREFIX = keyboards.PERIOD_PREFIX
+PERIOD_TITLES = keyboards.PERIOD_TITLES
+
+# Сколько пользователей показывать в статистике за период
+PERIOD_LIMIT = 30
+
+
+def period_stats(period, first_day, rows):
+    # Статистика всех пользователей за период; rows - из rollups.period_stats()
+    title = {"day": "сегодня", "week": "эту неделю", "month": "этот месяц"}[period]
+    text = f"📊 <b>Статистика за {title}</b> (с {first_day}):\n\n"
+    if not rows:
+        text += "Нет завершенных смен за этот период"
+
+    for user_id, user_name, summa_sessions, summa_hors, summa_money in rows[:PERIOD_LIMIT]:
+        text += (f"👤 <b>{user_name or user_id}</b>: {summa_hors:.2f} ч., "
+                 f"{summa_money:.2f} руб. (смен: {summa_sessions})\n")
+    if len(rows) > PERIOD_LIMIT:
+        text += f"\n…и еще {len(rows) - PERIOD_LIMIT} сотрудников"
+    return text, keyboards.BACK_TO_STATS
+
+
+def me_stats(name, user_totals, rate):
+    # Личная статистика; user_totals - кортеж из totals.get() или None, rate - текущая ставка
+    if user_totals:
+        summa_sessions, summa_hors, summa_money, _ = user_totals
+    else:
+        summa_sessions, summa_hors, summa_money = 0, 0, 0
+
+    # Формируем сообщение в зависимости от наличия данных
+    if summa_sessions > 0:
+        text = (
+            f'Статистика пользователя: <b>{name}</b>\n\n'
+            f'📅 Всего: {summa_hors:.2f} часов\n'
+            f'💰 Заработано: {summa_money:.2f} руб\n\n'
+            f'📋 Всего рабочих сессий: {summa_sessions}\n'
+            f'💵 Ставка: {rate:g} руб./час'
+        )
+    else:
+        text = (
+            f'📊 Статистика пользователя: {name}\n\n'
+            f'📅 Всего: 0 часов\n'
+            f'💰 Заработано: 0 руб\n\n'
+            f'📋 Всего рабочих сессий: 0\n'
+            f'💵 Ставка: {rate:g} руб./час'
+        )
+    return text, None
+
+
+# Префиксы callback_data постраничных списков: общая статистика и список /dell
+GLOBAL_STATS_PAGE = "gs"
+DELL_PAGE = "dl"
+
+# Названия кнопок сортировки
+SORT_TITLES = {"i": "🔢 По ID", "h": "⏱️ По часам", "m": "💰 По деньгам"}
+
+
+def page_callback(kind, sort, key=None, backward=False):
+    # callback_data для перехода на страницу списка
+    # Формат: "gs:h" - первая страница, "gs:h:n:12.5:123" - после строки (12.5, 123),
+    # "gs:h:p:12.5:123" - перед строкой (12.5, 123). Укладывается в 64 байта Telegram
+    if key is None:
+        return f"{kind}:{sort}"
+    value, user_id = key
+    return f"{kind}:{sort}:{'p' if backward else 'n'}:{value!r}:{user_id}"
+
+
+def parse_page_callback(data):
+    # Разбор callback_data из page_callback()
+    # Возвращает (вид списка, сортировка, ключ или None, назад ли)
+    parts = data.split(":")
+    kind, sort = parts[0], parts[1]
+    if len(parts) == 2:
+        return kind, sort, None, False
+    value = int(parts[3]) if sort == "i" else float(parts[3])
+    return kind, sort, (value, int(parts[4])), parts[2] == "p"
+
+
+def users_page(kind, sort, rows, has_prev, has_next, personal_rates=None):
+    # Страница общей статистики (kind=GLOBAL_STATS_PAGE) или списка /dell (kind=DELL_PAGE)
+    # rows - строки из totals.page(): (user_id, name, сессии, часы, деньги)
+    # personal_rates - личные ставки пользователей других шардов (user_id -> ставка),
+    # остальным ставка берется из памяти этого процесса
+    personal_rates = personal_rates or {}
+    if kind == GLOBAL_STATS_PAGE:
+        text = "📊 <b>Общая статистика:</b>\n\n"
+    else:
+        text = "📋 <b>Список пользователей:</b>\n\n"
+
+    if not rows:
+        text += "Нет данных о пользователях"
+
+    for user_id, user_name, summa_sessions, summa_hors, summa_money in rows:
+        if kind == GLOBAL_STATS_PAGE:
+            text += (
+                f"👤 <b>{user_name}</b>:\n"
+                f"   📅 Всего: {summa_hors:.2f} ч.\n"
+                f"   💰 Зарплата: {summa_money:.2f} руб.\n"
+                f"   📋 Всего рабочих сессий: {summa_sessions}\n"
+                f"   💵 Ставка: {personal_rates.get(user_id, rates.current(user_id)):g} руб./час\n\n"
+            )
+        else:
+            text += (
+                f"👤 <b>{user_name}</b>\n"
+                f"   🔢 ID: <code>{user_id}</code>\n"
+                f"   📊 Сессий: {summa_sessions}\n"
+                f"   ⏱️ Часов: {summa_hors:.2f}\n"
+                f"   💰 Заработано: {summa_money:.2f} руб.\n\n"
+            )
+
+    markup = types.InlineKeyboardMarkup()
+
+    # Кнопки листания: ключ берем из первой и последней строки страницы
+    nav = []
+    if has_prev and rows:
+        nav.append(types.InlineKeyboardButton(
+            "⬅️ Назад", callback_data=page_callback(kind, sort, totals.sort_key(sort, rows[0]), backward=True)))
+    if has_next and rows:
+        nav.append(types.InlineKeyboardButton(
+            "Вперед ➡️", callback_data=page_callback(kind, sort, totals.sort_key(sort, rows[-1]))))
+    if nav:
+        markup.row(*nav)
+
+    # Кнопки сортировки (текущая отмечена точкой)
+    markup.row(*[types.InlineKeyboardButton(("• " if code == sort else "") + title,
+                                            callback_data=page_callback(kind, code))
+                 for code, title in SORT_TITLES.items()])
+
+    if kind == DELL_PAGE:
+        # Добавляем инструкцию для администратора и кнопку отмены
+        text += "\n👇 <b>Введите ID пользователя для удаления:</b>"
+        markup.row(types.InlineKeyboardButton('❌ Отмена', callback_data='dell_no'))
+    return text, markup.to_json()
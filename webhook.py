@@ -0,0 +1,129 @@
+# Модуль приема обновлений Telegram через webhook
+# Встроенный HTTP-сервер принимает POST с обновлением, проверяет секретный токен
+# и кладет обновление в ограниченную очередь. Обновления разбирает пул потоков,
+# поэтому долгий обработчик не задерживает нажатия кнопок остальных пользователей.
+# Если очередь заполнена - сервер отвечает 503, и Telegram повторит запрос позже
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram присылает secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Максимальный размер одного обновления (байт)
+MAX_BODY_SIZE = 1024 * 1024
+
+# Сколько секунд ждать места в очереди, прежде чем ответить 503
+QUEUE_TIMEOUT = 1.0
+
+
+def make_handler(bot, updates, secret, path):
+    # Создаем класс обработчика HTTP-запросов для конкретного бота и очереди
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            # Принимаем только запросы на путь webhook
+            if self.path != path:
+                self.send_error(404)
+                return
+
+            # Проверяем секретный токен (сравнение за постоянное время)
+            token = self.headers.get(SECRET_HEADER, "")
+            if secret and not hmac.compare_digest(token, secret):
+                self.send_error(403)
+                return
+
+            # Читаем тело запроса с ограничением размера
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0 or length > MAX_BODY_SIZE:
+                self.send_error(413 if length > MAX_BODY_SIZE else 400)
+                return
+            body = self.rfile.read(length).decode("utf-8")
+
+            try:
+                json.loads(body)
+            except ValueError:
+                self.send_error(400)
+                return
+
+            # Ставим обновление в очередь; если она переполнена - просим повторить позже
+            try:
+                updates.put(body, timeout=QUEUE_TIMEOUT)
+            except queue.Full:
+                self.send_response(503)
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            # Пишем журнал запросов через logging, а не в stderr
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return WebhookHandler
+
+
+def worker(bot, updates):
+    # Поток-обработчик: берет обновления из очереди и передает их хендлерам бота
+    while True:
+        body = updates.get()
+        if body is None:
+            updates.task_done()
+            return
+        try:
+            update = types.Update.de_json(body)
+            bot.process_new_updates([update])
+        except Exception:
+            logger.exception("Ошибка при обработке обновления")
+        finally:
+            updates.task_done()
+
+
+def create_server(bot, host, port, secret, path="/webhook", workers=4, queue_size=100):
+    # Создаем HTTP-сервер и запускаем пул потоков-обработчиков
+    # Возвращает (сервер, очередь, список потоков)
+    updates = queue.Queue(maxsize=queue_size)
+    threads = []
+    for i in range(workers):
+        thread = threading.Thread(target=worker, args=(bot, updates), name=f"webhook-worker-{i}", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    server = ThreadingHTTPServer((host, port), make_handler(bot, updates, secret, path))
+    server.daemon_threads = True
+    return server, updates, threads
+
+
+def stop_server(server, updates, threads):
+    # Останавливаем сервер и дожидаемся обработки уже принятых обновлений
+    server.shutdown()
+    server.server_close()
+    for _ in threads:
+        updates.put(None)
+    for thread in threads:
+        thread.join()
+
+
+def run(bot, host, port, secret, url=None, path="/webhook", workers=4, queue_size=100):
+    # Запуск бота в режиме webhook
+    # Если указан url - регистрируем webhook в Telegram (адрес должен вести на этот сервер)
+    if url:
+        bot.remove_webhook()
+        bot.set_webhook(url=url, secret_token=secret, drop_pending_updates=False)
+
+    server, updates, threads = create_server(bot, host, port, secret, path, workers, queue_size)
+    logger.info("Webhook слушает %s:%s%s", host, port, path)
+    try:
+        server.serve_forever()
+    finally:
+        stop_server(server, updates, threads)
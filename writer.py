@@ -0,0 +1,237 @@
+# Модуль записи в базу через единственный поток-писатель (group commit)
+# Все изменения (начало и окончание смен, удаления) ставятся в очередь.
+# Поток-писатель собирает операции, накопившиеся за несколько миллисекунд,
+# и выполняет их одной транзакцией - один fsync на пачку вместо одного на нажатие.
+# Результат операции становится доступен только после того, как COMMIT записан на диск.
+# Операция, которая меняет данные в памяти (словари активных смен, ставок, состояния
+# диалогов), регистрирует отмену этих изменений через on_rollback: если операция
+# откатится или пачка не будет зафиксирована, память вернется к состоянию базы
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд собирать операции в одну пачку после первой
+BATCH_WINDOW = 0.005
+
+# Максимальное количество операций в одной транзакции
+MAX_BATCH = 256
+
+# Сколько секунд ждать, пока другое соединение держит блокировку записи
+BUSY_TIMEOUT = 30
+
+# Отмены изменений в памяти, зарегистрированные текущей операцией потока-писателя
+_undo = threading.local()
+
+
+def on_rollback(undo):
+    # Регистрируем undo() - отмену изменения в памяти, сделанного текущей операцией.
+    # Писатель вызовет ее, если операция откатится (ROLLBACK TO) или не выполнится COMMIT пачки.
+    # Вне операции писателя (при запуске бота, в бенчмарках) ничего не делает
+    undos = getattr(_undo, "current", None)
+    if undos is not None:
+        undos.append(undo)
+
+
+def _run_undos(undos):
+    # Отменяем изменения в памяти в обратном порядке
+    for undo in reversed(undos):
+        undo()
+
+
+def enable_wal(dp):
+    # Включаем журнал WAL: читатели не блокируют писателя и наоборот
+    # synchronous=FULL - COMMIT возвращается только после записи на диск
+    dp.execute("""PRAGMA journal_mode=WAL""")
+    dp.execute("""PRAGMA synchronous=FULL""")
+
+
+class Writer:
+    def __init__(self, path, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH, connect=sqlite3.connect):
+        self.path = path
+        # Функция открытия соединения (например, metrics.connect с замером запросов)
+        self.connect = connect
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.operations = queue.Queue()
+        # Монопольная операция, встреченная при сборе пачки, - выполняется следующей
+        self.deferred = None
+
+        # Статистика: количество пачек и операций, размеры пачек, время COMMIT
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.operations_done = 0
+        self.max_batch_size = 0
+        self.commit_time_total = 0.0
+        self.commit_time_max = 0.0
+        self.errors = 0
+
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):
+        # Поставить операцию func(cursor, *args) в очередь на запись
+        # Возвращает Future: результат func, доступный после COMMIT
+        future = Future()
+        self.operations.put((func, args, future, False))
+        return future
+
+    def execute(self, func, *args):
+        # Выполнить операцию и дождаться ее фиксации в базе
+        return self.submit(func, *args).result()
+
+    def execute_exclusive(self, func, *args):
+        # Выполнить func(dp, *args) отдельно от пачек и дождаться результата
+        # func получает соединение писателя (isolation_level=None) и сама управляет
+        # транзакциями - например, когда нужны ATTACH/DETACH или несколько COMMIT подряд
+        future = Future()
+        self.operations.put((func, args, future, True))
+        return future.result()
+
+    def close(self):
+        # Дожидаемся записи всех поставленных операций и останавливаем поток
+        self.operations.put(None)
+        self.thread.join()
+
+    def stats(self):
+        # Статистика писателя для мониторинга
+        with self.stats_lock:
+            return {
+                "batches": self.batches,
+                "operations": self.operations_done,
+                "avg_batch_size": self.operations_done / self.batches if self.batches else 0,
+                "max_batch_size": self.max_batch_size,
+                "avg_commit_ms": self.commit_time_total / self.batches * 1000 if self.batches else 0,
+                "max_commit_ms": self.commit_time_max * 1000,
+                "errors": self.errors,
+                "queued": self.operations.qsize(),
+            }
+
+    def _collect(self, first):
+        # Собираем пачку: первая операция плюс все, что придет за batch_window
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.operations.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Сигнал остановки - вернем его в очередь, чтобы обработать после пачки
+                self.operations.put(None)
+                break
+            if item[3]:
+                # Монопольную операцию выполним сразу после этой пачки
+                self.deferred = item
+                break
+            batch.append(item)
+        return batch
+
+    def _rollback(self, dp):
+        # Откатываем транзакцию, если она еще идет. Ошибку отката только записываем в журнал:
+        # поток-писатель должен продолжить работу, иначе все следующие execute() ждали бы вечно
+        if not dp.in_transaction:
+            return
+        try:
+            dp.execute("""ROLLBACK""")
+        except Exception:
+            logger.exception("Не удалось откатить транзакцию писателя")
+
+    def _run_exclusive(self, dp, item):
+        # Выполняем монопольную операцию вне пачки
+        func, args, future, _ = item
+        try:
+            result = func(dp, *args)
+        except Exception as error:
+            self._rollback(dp)
+            with self.stats_lock:
+                self.errors += 1
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _run_batch(self, dp, cursor, batch):
+        # Выполняем пачку одной транзакцией
+        # Каждая операция выполняется в своей точке сохранения:
+        # ошибка в одной операции не отменяет остальные операции пачки
+        # Возвращает ([(future, результат, ошибка)], время COMMIT в секундах)
+        results = []
+        # undos - отмены изменений в памяти операций пачки, которые выполнились без ошибки
+        undos = []
+        started = time.perf_counter()
+        try:
+            cursor.execute("""BEGIN IMMEDIATE""")
+            for func, args, future, _ in batch:
+                cursor.execute("""SAVEPOINT operation""")
+                _undo.current = []
+                try:
+                    result = func(cursor, *args)
+                except Exception as error:
+                    _run_undos(_undo.current)
+                    if not dp.in_transaction:
+                        # SQLite уже отменил всю транзакцию - пачка не выполнится
+                        raise
+                    cursor.execute("""ROLLBACK TO operation""")
+                    cursor.execute("""RELEASE operation""")
+                    results.append((future, None, error))
+                else:
+                    undos.extend(_undo.current)
+                    cursor.execute("""RELEASE operation""")
+                    results.append((future, result, None))
+                finally:
+                    _undo.current = None
+
+            started = time.perf_counter()
+            cursor.execute("""COMMIT""")
+        except Exception as error:
+            # Не удалось начать транзакцию (база занята дольше BUSY_TIMEOUT), зафиксировать ее,
+            # или SQLite уже отменил ее целиком (нет места на диске, ошибка ввода-вывода,
+            # нехватка памяти) и точки сохранения больше нет - ошибка для всех операций пачки
+            self._rollback(dp)
+            _run_undos(undos)
+            results = [(future, None, error) for _, _, future, _ in batch]
+        return results, time.perf_counter() - started
+
+    def _run(self):
+        # isolation_level=None - транзакциями управляем сами (BEGIN/COMMIT)
+        dp = self.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        enable_wal(dp)
+        cursor = dp.cursor()
+
+        while True:
+            if self.deferred is not None:
+                first, self.deferred = self.deferred, None
+            else:
+                first = self.operations.get()
+            if first is None:
+                break
+            if first[3]:
+                self._run_exclusive(dp, first)
+                continue
+            batch = self._collect(first)
+            results, commit_time = self._run_batch(dp, cursor, batch)
+
+            with self.stats_lock:
+                self.batches += 1
+                self.operations_done += len(batch)
+                self.max_batch_size = max(self.max_batch_size, len(batch))
+                self.commit_time_total += commit_time
+                self.commit_time_max = max(self.commit_time_max, commit_time)
+                self.errors += sum(1 for _, _, error in results if error is not None)
+
+            # Результаты отдаем только после COMMIT
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        dp.close()